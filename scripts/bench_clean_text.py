@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Set, Tuple
+
+from extract_text import clean_text, detect_boilerplate, strip_boilerplate_lines
+from page_store import intermediate_source_path, iter_manual_pages
+from utils import ManualConfig, filter_manuals, load_manuals_config
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark de clean_text contra la version anterior (y efecto del filtro de boilerplate).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        help="Filtra manuales por key/slug/nombre. Ej: --only model_y",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Repeticiones por funcion; se informa la mejor.",
+    )
+    parser.add_argument(
+        "--max-pages",
+        type=int,
+        default=0,
+        help="Limita las paginas leidas por manual (0 = todas).",
+    )
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    try:
+        manuals = filter_manuals(load_manuals_config(), args.only)
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+
+    corpus: Dict[str, List[str]] = {}
+    for manual in manuals:
+        pages = load_raw_pages(manual, args.max_pages)
+        if pages:
+            corpus[manual.slug] = pages
+    if not corpus:
+        print("[ERROR] No hay PDFs en data/raw ni JSON intermedios para medir.", file=sys.stderr)
+        return 1
+
+    all_pages = [page for pages in corpus.values() for page in pages]
+    mismatches = sum(1 for page in all_pages if clean_text(page) != legacy_clean_text(page))
+    if mismatches:
+        print(f"[WARN] {mismatches}/{len(all_pages)} paginas difieren de la version anterior")
+    else:
+        print(f"[OK] Salida identica a la version anterior en {len(all_pages)} paginas")
+
+    legacy = best_time(legacy_clean_text, all_pages, args.repeat)
+    current = best_time(clean_text, all_pages, args.repeat)
+    print(f"[INFO] legacy_clean_text: {legacy / len(all_pages) * 1e6:8.1f} us/pagina")
+    print(f"[INFO] clean_text:        {current / len(all_pages) * 1e6:8.1f} us/pagina ({legacy / current:.2f}x)")
+
+    for slug, pages in corpus.items():
+        plain = sum(len(text) for text in clean_pages(pages, strip_boilerplate=False)[0])
+        stripped_pages, boilerplate = clean_pages(pages, strip_boilerplate=True)
+        stripped = sum(len(text) for text in stripped_pages)
+        saved = (1 - stripped / plain) if plain else 0.0
+        print(f"[INFO] {slug}: {len(boilerplate)} lineas de boilerplate, {plain} -> {stripped} chars (-{saved:.1%})")
+        for key in boilerplate[:5]:
+            print(f"         {key!r}")
+    return 0
+
+
+def clean_pages(raw_pages: Sequence[str], strip_boilerplate: bool = True) -> Tuple[List[str], List[str]]:
+    """Limpia las paginas de un manual. Retorna (texto limpio por pagina, lineas de boilerplate quitadas)."""
+
+    boilerplate: Set[str] = detect_boilerplate(raw_pages) if strip_boilerplate else set()
+    if boilerplate:
+        raw_pages = [strip_boilerplate_lines(text, boilerplate) for text in raw_pages]
+    return [clean_text(text) for text in raw_pages], sorted(boilerplate)
+
+
+def load_raw_pages(manual: ManualConfig, max_pages: int = 0) -> List[str]:
+    """Texto crudo por pagina: del PDF si existe, o reconstruido desde las paginas intermedias."""
+
+    if manual.raw_pdf_path.exists():
+        from pypdf import PdfReader
+
+        reader = PdfReader(str(manual.raw_pdf_path))
+        pages = reader.pages if not max_pages else reader.pages[:max_pages]
+        return [read_page_text(page) for page in pages]
+
+    source = intermediate_source_path(manual)
+    if not source.exists():
+        return []
+    print(f"[WARN] {manual.slug}: sin PDF, se usa texto sintetico desde {source.name}")
+    pages = []
+    for page in iter_manual_pages(manual):
+        pages.append(_rewrap(page["text"]))
+        if max_pages and len(pages) >= max_pages:
+            break
+    return pages
+
+
+def read_page_text(page) -> str:
+    return page.extract_text() or ""
+
+
+def _rewrap(text: str, width: int = 90) -> str:
+    """Imita la salida cruda de pypdf: lineas cortas y algunas palabras cortadas con guion."""
+
+    lines: List[str] = []
+    for paragraph in text.split("\n\n"):
+        line = ""
+        for position, word in enumerate(paragraph.split(" ")):
+            if len(line) + len(word) < width:
+                line = f"{line} {word}" if line else word
+            elif len(word) > 6 and position % 7 == 0:
+                lines.append(f"{line} {word[:3]}-")
+                line = word[3:]
+            else:
+                lines.append(line)
+                line = word
+        lines.append(line)
+        lines.append("")
+    return "\n".join(lines)
+
+
+def best_time(function: Callable[[str], str], pages: Sequence[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        for page in pages:
+            function(page)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def legacy_clean_text(text: str) -> str:
+    """clean_text tal como estaba antes de precompilar sus patrones (referencia del benchmark)."""
+
+    text = text.replace("\r", "\n")
+    text = text.replace("\u00ad\n", "")
+    text = text.replace("\u00ad", "")
+
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
+
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text.strip())
+
+    text = re.sub(r"Pagina \d+ de \d+", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"Tesla,?\s+Inc\.", "", text)
+
+    return text.strip()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+from page_store import PageReader, PageWriter
+from pdf_backends import BACKEND_CHOICES, DEFAULT_BACKEND
+from utils import DATA_DIR, ManualConfig, ensure_directory, now_iso, peak_rss_mb
+
+BENCH_DIR = DATA_DIR / "bench"
+RESULTS_PATH = BENCH_DIR / "pipeline_results.json"
+BASELINE_PATH = BENCH_DIR / "pipeline_baseline.json"
+DEFAULT_SIZES = [100, 1000]
+
+_VOCABULARY = (
+    "el la los las de del en con para por un una vehiculo puerto carga neumaticos presion "
+    "consulte manual propietario pantalla tactil bateria frenos seguridad asiento cinturon "
+    "conductor pasajero volante espejo retrovisor climatizacion ventanilla maletero capó "
+    "autopiloto velocidad crucero camara sensor alerta mantenimiento recomendado revisar "
+    "kilómetros temperatura energía recuperación aplicación teléfono llave tarjeta acceso"
+).split()
+_SECTIONS = (
+    "Descripcion general", "Abrir y cerrar", "Asientos y dispositivos de seguridad", "Conduccion",
+    "Autopiloto", "Pantalla tactil", "Carga", "Mantenimiento", "Especificaciones", "Asistencia en carretera",
+)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Mide extract/chunk/compile sobre manuales sinteticos (throughput y RSS maximo por etapa).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--pages",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="Tamanios de manual sintetico a medir (paginas), p. ej. 100 1000 5000.",
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=["extract", "chunk", "compile"],
+        default=["extract", "chunk", "compile"],
+        help="Etapas a medir.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Semilla del generador sintetico.")
+    parser.add_argument(
+        "--backend",
+        choices=BACKEND_CHOICES,
+        default=DEFAULT_BACKEND,
+        help="Extractor de texto para la etapa extract (ver pdf_backends.py).",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=BENCH_DIR / "work",
+        help="Directorio para los PDFs/JSON sinteticos y las salidas de cada etapa.",
+    )
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH, help="JSON de resultados.")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="JSON de referencia para comparar.")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Guarda estos resultados como nueva referencia en --baseline.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Regresion permitida: throughput menor o RSS mayor que la referencia en mas de esta fraccion.",
+    )
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    results: List[dict] = []
+    for pages in args.pages:
+        manual = synthetic_manual(pages, args.seed, args.work_dir)
+        prepare_inputs(manual, pages, args.seed, args.stages)
+        for stage in args.stages:
+            result = run_isolated(stage, stage_manual(manual, stage), args.backend)
+            result.update(stage=stage, pages=pages)
+            results.append(result)
+            rss = f"{result['peak_rss_mb']:.0f} MB" if result["peak_rss_mb"] is not None else "n/d"
+            backend = f" [{result['backend']}]" if "backend" in result else ""
+            print(
+                f"[OK] {stage:<8} {pages:>5} pag{backend}: {result['throughput']:>10.1f} {result['unit']}/s "
+                f"({result['items']} en {result['seconds']:.2f}s, RSS max {rss})"
+            )
+
+    report = {
+        "generated_at": now_iso(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "results": results,
+    }
+    _write_json(args.output, report)
+    print(f"[OK] Resultados -> {args.output}")
+
+    if args.save_baseline:
+        _write_json(args.baseline, report)
+        print(f"[OK] Referencia guardada -> {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"[INFO] Sin referencia en {args.baseline}; usa --save-baseline para crearla.")
+        return 0
+
+    with args.baseline.open(encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_results(results, baseline.get("results", []), args.tolerance)
+    for message in regressions:
+        print(f"[WARN] Regresion: {message}")
+    if regressions:
+        return 1
+    print(f"[OK] Sin regresiones frente a {args.baseline.name} (tolerancia {args.tolerance:.0%})")
+    return 0
+
+
+def synthetic_manual(pages: int, seed: int, work_dir: Path) -> ManualConfig:
+    slug = f"synthetic_{pages}_{seed}"
+    return ManualConfig(
+        key=slug,
+        display_name=f"Sintetico {pages}",
+        slug=slug,
+        document_title=f"Manual sintetico de {pages} paginas",
+        pdf_url=f"https://example.invalid/{slug}.pdf",
+        source_url=None,
+        language="es",
+        region=None,
+        data_dir=work_dir,
+    )
+
+
+def stage_manual(manual: ManualConfig, stage: str) -> ManualConfig:
+    """La extraccion escribe en su propio directorio para no pisar el JSON sintetico de chunk."""
+
+    return replace(manual, data_dir=manual.data_dir / "extract") if stage == "extract" else manual
+
+
+def prepare_inputs(manual: ManualConfig, pages: int, seed: int, stages: Sequence[str]) -> None:
+    """Genera (una sola vez por tamanio y semilla) el PDF y las paginas intermedias sinteticas."""
+
+    pdf_path = stage_manual(manual, "extract").raw_pdf_path
+    if "extract" in stages and not pdf_path.exists():
+        write_synthetic_pdf(pdf_path, pages, seed)
+    if ("chunk" in stages or "compile" in stages) and not manual.intermediate_pages_path.exists():
+        write_synthetic_intermediate(manual, pages, seed)
+    if "compile" in stages and "chunk" not in stages and not manual.processed_jsonl_path.exists():
+        run_isolated("chunk", manual)
+
+
+def synthetic_page_lines(page_number: int, total_pages: int, rnd: random.Random) -> List[str]:
+    """Lineas de una pagina: encabezado, titulo de seccion, parrafos de ~12 palabras y pie."""
+
+    lines = ["MANUAL DEL PROPIETARIO", _SECTIONS[(page_number * len(_SECTIONS)) // (total_pages + 1)]]
+    for _ in range(rnd.randint(4, 7)):
+        for _ in range(rnd.randint(3, 8)):
+            lines.append(" ".join(rnd.choice(_VOCABULARY) for _ in range(12)))
+        lines[-1] += "."
+        lines.append("")
+    if rnd.random() < 0.3:
+        lines.append("Advertencia: " + " ".join(rnd.choice(_VOCABULARY) for _ in range(14)) + ".")
+    lines.append(f"Pagina {page_number} de {total_pages}")
+    return lines
+
+
+def write_synthetic_pdf(path: Path, pages: int, seed: int) -> None:
+    """PDF minimo valido (Helvetica, WinAnsi) con una pagina de texto por cada pagina pedida."""
+
+    rnd = random.Random(seed)
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # /Pages, se completa al final
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids: List[int] = []
+    for page_number in range(1, pages + 1):
+        shown = []
+        for line in synthetic_page_lines(page_number, pages, rnd):
+            escaped = line.encode("cp1252").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+            shown.append(b"(" + escaped + b") '")
+        content = b"BT /F1 9 Tf 40 810 Td 11 TL " + b" ".join(shown) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % kid for kid in kids) + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    ensure_directory(path)
+    path.write_bytes(bytes(out))
+
+
+def write_synthetic_intermediate(manual: ManualConfig, pages: int, seed: int) -> None:
+    """Paginas intermedias con el mismo formato que write_manual_output (texto ya limpio)."""
+
+    rnd = random.Random(seed)
+    with PageWriter(manual.intermediate_pages_path, manual.intermediate_index_path) as writer:
+        for page_number in range(1, pages + 1):
+            lines = synthetic_page_lines(page_number, pages, rnd)[1:-1]
+            text = "\n\n".join(paragraph.replace("\n", " ") for paragraph in "\n".join(lines).split("\n\n") if paragraph)
+            writer.add(page_number, text)
+        metadata = {
+            "model_key": manual.key,
+            "slug": manual.slug,
+            "display_name": manual.display_name,
+            "document_title": manual.document_title,
+            "pdf_source": manual.raw_pdf_path.name,
+            "total_pages": pages,
+            "extracted_pages": pages,
+            "extracted_at": now_iso(),
+        }
+        writer.finish(metadata, pages)
+
+
+def run_isolated(stage: str, manual: ManualConfig, backend: str = DEFAULT_BACKEND) -> dict:
+    """Ejecuta la etapa en un proceso nuevo (spawn) para que su RSS maximo sea solo suyo."""
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_run_stage, stage, manual, backend).result()
+
+
+def _run_stage(stage: str, manual: ManualConfig, backend: str = DEFAULT_BACKEND) -> dict:
+    os.environ["TQDM_DISABLE"] = "1"
+    baseline_rss = peak_rss_mb()
+    extra = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        if stage == "extract":
+            import extract_text
+
+            extra["backend"] = extract_text.resolve_backend(manual, backend)
+            extract_text.extract_manual(manual, backend=extra["backend"])
+            with PageReader(manual.intermediate_pages_path, manual.intermediate_index_path) as reader:
+                items, unit = reader.total_pages, "paginas"
+        elif stage == "chunk":
+            import chunk_manuals
+            from text_splitter import RecursiveTextSplitter
+
+            splitter = RecursiveTextSplitter(chunk_size=800, chunk_overlap=120, separators=chunk_manuals.CHUNK_SEPARATORS)
+            chunk_manuals.process_manual(manual, splitter)
+            items, unit = _count_lines(manual.processed_jsonl_path), "chunks"
+        elif stage == "compile":
+            import compile_dataset
+
+            output = manual.data_dir / "compiled" / f"{manual.slug}.jsonl"
+            items, unit = compile_dataset.concatenate_files([manual.processed_jsonl_path], output), "lineas"
+        else:
+            raise ValueError(f"Etapa desconocida: {stage}")
+        seconds = time.perf_counter() - started
+
+    peak = peak_rss_mb()
+    return {
+        "items": items,
+        "unit": unit,
+        "seconds": round(seconds, 4),
+        "throughput": round(items / seconds, 2) if seconds else 0.0,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "startup_rss_mb": round(baseline_rss, 1) if baseline_rss is not None else None,
+        **extra,
+    }
+
+
+def compare_results(results: Sequence[dict], baseline: Sequence[dict], tolerance: float) -> List[str]:
+    """Regresiones de throughput y RSS frente a la referencia, por (etapa, paginas, backend)."""
+
+    def key(item: dict) -> tuple:
+        return item["stage"], item["pages"], item.get("backend", DEFAULT_BACKEND if item["stage"] == "extract" else None)
+
+    reference: Dict[tuple, dict] = {key(item): item for item in baseline}
+    regressions: List[str] = []
+    for result in results:
+        previous = reference.get(key(result))
+        if previous is None:
+            continue
+        label = f"{result['stage']} {result['pages']} pag"
+        if result["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: {result['throughput']:.1f} {result['unit']}/s vs {previous['throughput']:.1f} de referencia"
+            )
+        if (
+            result.get("peak_rss_mb") is not None
+            and previous.get("peak_rss_mb") is not None
+            and result["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance)
+        ):
+            regressions.append(f"{label}: RSS max {result['peak_rss_mb']:.0f} MB vs {previous['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def _count_lines(path: Path) -> int:
+    with path.open("rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _write_json(path: Path, data: dict) -> None:
+    ensure_directory(path)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
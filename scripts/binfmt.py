@@ -0,0 +1,51 @@
+"""Piezas comunes de los archivos binarios de los indices (page_store, dataset_index, bm25_index,
+chunk_graph, sentence_index).
+
+Todos usan el mismo esquema: un header ``struct`` que empieza con magic (4 bytes) y version (u16),
+seguido de bloques little-endian con padding a 8 bytes para que los arreglos queden alineados.
+"""
+
+from __future__ import annotations
+
+import struct
+import sys
+from array import array
+from typing import Optional, Tuple
+
+
+def le_bytes(values: array) -> bytes:
+    """Bytes little-endian del arreglo, sin modificarlo."""
+
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def padding(size: int) -> int:
+    """Bytes de relleno hasta el siguiente multiplo de 8."""
+
+    return -size % 8
+
+
+def pad(blob: bytes) -> bytes:
+    return blob + b"\0" * padding(len(blob))
+
+
+def unpack_header(
+    header: struct.Struct, buffer, magic: bytes, version: int, label: str, name: Optional[str] = None
+) -> Tuple:
+    """Desempaqueta el header y valida plataforma, magic y version.
+
+    Los lectores ven los arreglos directamente sobre el buffer, por eso solo funcionan en
+    plataformas little-endian. ``label`` nombra el formato en los mensajes de error
+    ("indice de paginas") y ``name`` el archivo, si lo hay.
+    """
+
+    if sys.byteorder != "little":
+        raise RuntimeError(f"El {label} solo se puede leer en plataformas little-endian.")
+    fields = header.unpack_from(buffer, 0)
+    if fields[0] != magic or fields[1] != version:
+        source = f"{name} no es" if name else "No es"
+        raise ValueError(f"{source} un {label} valido (version {fields[1]}).")
+    return fields
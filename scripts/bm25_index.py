@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import mmap
+import struct
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple
+
+from binfmt import le_bytes, pad, padding, unpack_header
+from utils import STOPWORDS, ChunkIdAssigner, ensure_directory, extract_terms, to_words
+
+# Formato de un shard BM25 (.bm25), little-endian:
+#   header   <4sHBBIIdddII  magic, version, ancho doc id (2|4), reservado, n_docs, n_terms,
+#                           k1, b, escala de impacto, bytes de metadata JSON, bytes del vocabulario
+#   metadata JSON (model_slug, chunk_ids y chunk_index de cada doc), alineado a 8 bytes
+#   vocabulario: terminos UTF-8 ordenados separados por "\n", alineado a 8 bytes
+#   term_offsets u32[n_terms + 1]: rango de postings de cada termino
+#   postings doc u16|u32[n] e impacto u16[n]
+# El impacto es el aporte BM25 completo del termino al documento, cuantizado a u16:
+# una consulta solo suma impactos, sin leer largos de documento ni tf.
+SHARD_MAGIC = b"T3BM"
+SHARD_VERSION = 1
+_HEADER = struct.Struct("<4sHBBIIdddII")
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+
+class SearchHit(NamedTuple):
+    chunk_id: str
+    chunk_index: int
+    score: float
+
+
+def index_tokens(text: str) -> List[str]:
+    """Tokens indexados de un chunk: palabras de chat.ts sin stopwords."""
+
+    return [word for word in to_words(text) if word not in STOPWORDS]
+
+
+def encode_shard(
+    records: Iterable[dict],
+    model_slug: str,
+    k1: float = DEFAULT_K1,
+    b: float = DEFAULT_B,
+) -> bytes:
+    """Construye el shard BM25 de un manual a partir de sus registros JSONL."""
+
+    chunk_ids: List[str] = []
+    chunk_indexes: List[int] = []
+    doc_lengths: List[int] = []
+    term_postings: Dict[str, List[tuple]] = {}
+    fallback_ids = ChunkIdAssigner()
+
+    for doc, record in enumerate(records):
+        metadata = record.get("metadata", {})
+        chunk_ids.append(metadata.get("chunk_id") or fallback_ids.assign(model_slug, record.get("text", "")))
+        chunk_indexes.append(int(metadata.get("chunk_index", doc)))
+        tokens = index_tokens(record.get("text", ""))
+        doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_postings.setdefault(term, []).append((doc, tf))
+
+    n_docs = len(doc_lengths)
+    avgdl = (sum(doc_lengths) / n_docs) if n_docs else 0.0
+    terms = sorted(term_postings)
+
+    weights: List[float] = []
+    docs: List[int] = []
+    offsets = array("I", [0])
+    for term in terms:
+        postings = term_postings[term]
+        idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+        for doc, tf in postings:
+            norm = k1 * (1 - b + b * doc_lengths[doc] / avgdl) if avgdl else k1
+            weights.append(idf * tf * (k1 + 1) / (tf + norm))
+            docs.append(doc)
+        offsets.append(len(docs))
+
+    scale = (max(weights) / 65535) if weights else 1.0
+    impacts = array("H", (max(1, round(weight / scale)) for weight in weights))
+    doc_width = 2 if n_docs <= 0xFFFF else 4
+    doc_array = array("H" if doc_width == 2 else "I", docs)
+
+    metadata_blob = json.dumps(
+        {"model_slug": model_slug, "chunk_ids": chunk_ids, "chunk_indexes": chunk_indexes},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    vocab_blob = "\n".join(terms).encode("utf-8")
+
+    parts = [
+        _HEADER.pack(
+            SHARD_MAGIC, SHARD_VERSION, doc_width, 0, n_docs, len(terms), k1, b, scale,
+            len(metadata_blob), len(vocab_blob),
+        ),
+        pad(metadata_blob),
+        pad(vocab_blob),
+        pad(le_bytes(offsets)),
+        pad(le_bytes(doc_array)),
+        pad(le_bytes(impacts)),
+    ]
+    return b"".join(parts)
+
+
+def write_shard(path: Path, records: Iterable[dict], model_slug: str, k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> int:
+    """Escribe el shard en disco de forma atomica. Retorna la cantidad de documentos."""
+
+    blob = encode_shard(records, model_slug, k1=k1, b=b)
+    ensure_directory(path)
+    temp_path = path.with_suffix(".tmp")
+    temp_path.write_bytes(blob)
+    temp_path.replace(path)
+    return _HEADER.unpack_from(blob, 0)[4]
+
+
+class BM25Index:
+    """Shard BM25 de un manual, sobre un buffer en memoria o un archivo mapeado (mmap).
+
+    Al abrir solo se decodifican el vocabulario y la metadata; las postings se leen
+    directamente del buffer como arreglos u16/u32 sin copiarlas.
+    """
+
+    def __init__(self, buffer):
+        (_, _, doc_width, _, n_docs, n_terms, self.k1, self.b, self._scale,
+         metadata_bytes, vocab_bytes) = unpack_header(_HEADER, buffer, SHARD_MAGIC, SHARD_VERSION, "shard BM25")
+        self._buffer = buffer
+
+        view = self._view = memoryview(buffer)
+        cursor = _HEADER.size
+        metadata = json.loads(bytes(view[cursor : cursor + metadata_bytes]))
+        cursor += metadata_bytes + padding(metadata_bytes)
+        vocab = bytes(view[cursor : cursor + vocab_bytes]).decode("utf-8")
+        cursor += vocab_bytes + padding(vocab_bytes)
+
+        self.model_slug: str = metadata["model_slug"]
+        self.chunk_ids: List[str] = metadata["chunk_ids"]
+        self.chunk_indexes: List[int] = metadata["chunk_indexes"]
+        self._terms = {term: position for position, term in enumerate(vocab.split("\n"))} if n_terms else {}
+
+        size = (n_terms + 1) * 4
+        self._offsets = view[cursor : cursor + size].cast("I")
+        cursor += size + padding(size)
+        total = self._offsets[-1] if n_terms else 0
+        size = total * doc_width
+        self._docs = view[cursor : cursor + size].cast("H" if doc_width == 2 else "I")
+        cursor += size + padding(size)
+        self._impacts = view[cursor : cursor + total * 2].cast("H")
+        self._n_docs = n_docs
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict], model_slug: str, k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> "BM25Index":
+        return cls(encode_shard(records, model_slug, k1=k1, b=b))
+
+    @classmethod
+    def open(cls, path: Path) -> "BM25Index":
+        with path.open("rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer)
+
+    def __len__(self) -> int:
+        return self._n_docs
+
+    def close(self) -> None:
+        for name in ("_offsets", "_docs", "_impacts", "_view"):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+                setattr(self, name, None)
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def search(self, query: str, k: int = 6) -> List[SearchHit]:
+        """Top-k BM25 para una consulta normalizada igual que ``extractTerms`` en chat.ts."""
+
+        return self.search_terms(extract_terms(query), k)
+
+    def search_terms(self, terms: Iterable[str], k: int = 6) -> List[SearchHit]:
+        scores: Dict[int, int] = {}
+        get = scores.get
+        for term in terms:
+            position = self._terms.get(term)
+            if position is None:
+                continue
+            start, stop = self._offsets[position], self._offsets[position + 1]
+            for doc, impact in zip(self._docs[start:stop], self._impacts[start:stop]):
+                scores[doc] = get(doc, 0) + impact
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [
+            SearchHit(self.chunk_ids[doc], self.chunk_indexes[doc], impact * self._scale)
+            for doc, impact in top
+        ]
+
+
+class BM25Store:
+    """Abre perezosamente un shard por ``model_slug`` dentro de un directorio."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._shards: Dict[str, BM25Index] = {}
+
+    def shard(self, model_slug: str) -> BM25Index:
+        shard = self._shards.get(model_slug)
+        if shard is None:
+            path = self.directory / f"{model_slug}.bm25"
+            if not path.exists():
+                raise FileNotFoundError(f"No existe el shard BM25 {path}; ejecuta build_index.py.")
+            shard = self._shards[model_slug] = BM25Index.open(path)
+        return shard
+
+    def search(self, query: str, model_slug: str, k: int = 6) -> List[SearchHit]:
+        return self.shard(model_slug).search(query, k)
+
+    def close(self) -> None:
+        for shard in self._shards.values():
+            shard.close()
+        self._shards.clear()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Iterable
+
+from bm25_index import DEFAULT_B, DEFAULT_K1, write_shard
+from utils import (
+    BuildManifest,
+    ManualConfig,
+    filter_manuals,
+    fingerprint,
+    iter_jsonl,
+    load_manuals_config,
+    sha256_file,
+)
+
+STAGE = "index"
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Construye un indice invertido BM25 por manual a partir de data/processed/*.jsonl",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        help="Filtra manuales por key/slug/nombre. Ej: --only model_y",
+    )
+    parser.add_argument("--k1", type=float, default=DEFAULT_K1, help="Parametro k1 de BM25.")
+    parser.add_argument("--b", type=float, default=DEFAULT_B, help="Parametro b de BM25.")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Ignora el manifest de build y reconstruye todos los shards.",
+    )
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    try:
+        manuals = filter_manuals(load_manuals_config(), args.only)
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+
+    manifest = BuildManifest.load()
+    for manual in manuals:
+        try:
+            inputs = fingerprint(sha256_file(manual.processed_jsonl_path), args.k1, args.b)
+            if not args.force and manifest.is_fresh(STAGE, manual.slug, inputs):
+                print(f"[SKIP] {manual.display_name} sin cambios desde el ultimo indexado")
+                continue
+            index_manual(manual, k1=args.k1, b=args.b)
+            manifest.record(STAGE, manual.slug, inputs, [manual.bm25_index_path])
+        except FileNotFoundError:
+            print(
+                f"[ERROR] No se encontro el JSONL procesado para {manual.display_name} ({manual.processed_jsonl_path})",
+                file=sys.stderr,
+            )
+            return 1
+        except Exception as exc:
+            print(f"[ERROR] {manual.display_name}: {exc}", file=sys.stderr)
+            return 1
+
+    return 0
+
+
+def index_manual(manual: ManualConfig, k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> None:
+    path = manual.bm25_index_path
+    doc_count = write_shard(path, iter_jsonl(manual.processed_jsonl_path), manual.slug, k1=k1, b=b)
+    size_kb = path.stat().st_size / 1024
+    print(f"[OK] {manual.display_name}: {doc_count} chunks indexados ({size_kb:.0f} KB) -> {path.name}")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils import (
+    REPO_ROOT,
+    BuildManifest,
+    ChunkIdAssigner,
+    filter_manuals,
+    fingerprint,
+    iter_jsonl,
+    load_manuals_config,
+    sha256_file,
+)
+from vector_index import (
+    F16_FILENAME,
+    I8_FILENAME,
+    INDEX_FILENAME,
+    SCALES_FILENAME,
+    HashingEmbedder,
+    load_embeddings,
+    write_dense_index,
+)
+
+DENSE_INDEX_DIR = REPO_ROOT / "data" / "index" / "dense"
+STAGE = "dense_index"
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Construye un indice vectorial denso (mmap) particionado por manual.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        help="Filtra manuales por key/slug/nombre. Ej: --only model_y",
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--embeddings",
+        type=Path,
+        help="Embeddings por chunk_id: .npz (ids, embeddings) o JSONL ({chunk_id, embedding}).",
+    )
+    source.add_argument(
+        "--hashing-dim",
+        type=int,
+        help="Genera embeddings locales deterministas (HashingEmbedder) de esta dimension, para pruebas.",
+    )
+    parser.add_argument(
+        "--quantize",
+        choices=["float16", "int8"],
+        default="float16",
+        help="Formato de la matriz de busqueda (int8 agrega re-scoring exacto con float16).",
+    )
+    parser.add_argument("--output-dir", type=Path, default=DENSE_INDEX_DIR, help="Directorio del indice.")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Ignora el manifest de build y reconstruye el indice.",
+    )
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    try:
+        manuals = filter_manuals(load_manuals_config(), args.only)
+        processed = [manual.processed_jsonl_path for manual in manuals]
+        inputs = fingerprint(
+            [(path.name, sha256_file(path)) for path in processed],
+            sha256_file(args.embeddings) if args.embeddings else args.hashing_dim,
+            args.quantize,
+        )
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+
+    manifest = BuildManifest.load()
+    target = args.output_dir.name
+    if not args.force and manifest.is_fresh(STAGE, target, inputs):
+        print(f"[SKIP] Indice denso en {args.output_dir} ya esta al dia")
+        return 0
+
+    embeddings = load_embeddings(args.embeddings) if args.embeddings else None
+    embedder = HashingEmbedder(args.hashing_dim) if args.hashing_dim else None
+
+    partitions: Dict[str, Tuple[List[str], List[int], np.ndarray]] = {}
+    sections: Dict[str, List[List[str]]] = {}
+    for manual in manuals:
+        try:
+            *partition, sections[manual.slug] = load_partition(
+                manual.processed_jsonl_path, manual.slug, embeddings, embedder
+            )
+            partitions[manual.slug] = tuple(partition)
+        except Exception as exc:
+            print(f"[ERROR] {manual.display_name}: {exc}", file=sys.stderr)
+            return 1
+
+    total = write_dense_index(args.output_dir, partitions, quantize_int8=args.quantize == "int8", sections=sections)
+    outputs = [INDEX_FILENAME, F16_FILENAME] + ([I8_FILENAME, SCALES_FILENAME] if args.quantize == "int8" else [])
+    manifest.record(STAGE, target, inputs, [args.output_dir / name for name in outputs])
+    print(f"[OK] Indice denso con {total} vectores ({args.quantize}) -> {args.output_dir}")
+    return 0
+
+
+def load_partition(
+    path: Path,
+    model_slug: str,
+    embeddings: Optional[Dict[str, np.ndarray]],
+    embedder: Optional[HashingEmbedder],
+) -> Tuple[List[str], List[int], np.ndarray, List[List[str]]]:
+    """Reune chunk_ids, chunk_index, embeddings y section_path de un manual, en el orden del JSONL."""
+
+    fallback_ids = ChunkIdAssigner()
+    chunk_ids: List[str] = []
+    chunk_indexes: List[int] = []
+    texts: List[str] = []
+    sections: List[List[str]] = []
+    for record in iter_jsonl(path):
+        metadata = record.get("metadata", {})
+        chunk_ids.append(metadata.get("chunk_id") or fallback_ids.assign(model_slug, record.get("text", "")))
+        chunk_indexes.append(int(metadata.get("chunk_index", len(chunk_indexes))))
+        texts.append(record.get("text", ""))
+        sections.append(metadata.get("section_path") or [])
+
+    if embedder is not None:
+        return chunk_ids, chunk_indexes, embedder.embed(texts), sections
+
+    missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in embeddings]
+    if missing:
+        raise KeyError(f"faltan embeddings para {len(missing)} chunks (p. ej. {missing[0]})")
+    return chunk_ids, chunk_indexes, np.stack([embeddings[chunk_id] for chunk_id in chunk_ids]), sections
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
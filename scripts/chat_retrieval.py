@@ -0,0 +1,128 @@
+"""Port en Python de la recuperacion del backend (nomicClient.ts y routes/chat.ts).
+
+Lo usan las herramientas offline (``evaluate_retrieval.py``, ``query_cache.py``) para
+consultar ``/query/topk`` y filtrar chunks exactamente como lo hace el chat.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import List, Optional, Sequence
+
+from utils import CITATION_FIELDS, extract_terms, to_words
+
+# Constantes del backend (server/src/routes/chat.ts y config.ts).
+MIN_NORMALIZED_SCORE = 0.35
+DEFAULT_NOMIC_K = 6
+NOMIC_TIMEOUT_S = 20
+MODEL_ALIAS = {
+    "model_s": "model_s",
+    "models": "model_s",
+    "model-s": "model_s",
+    "modelx": "model_x",
+    "model_x": "model_x",
+    "model-x": "model_x",
+    "model3": "model_3",
+    "model_3": "model_3",
+    "model-3": "model_3",
+    "modely": "model_y",
+    "model_y": "model_y",
+    "model-y": "model_y",
+    "cybertruck": "cybertruck",
+}
+_SPACES_OR_DASHES = re.compile(r"[\s-]+")
+
+
+def normalize_model(value: str) -> Optional[str]:
+    """``normalizeModel`` de chat.ts: alias conocidos, con espacios o guiones como ``_``."""
+
+    cleaned = value.strip().lower()
+    return MODEL_ALIAS.get(cleaned) or MODEL_ALIAS.get(_SPACES_OR_DASHES.sub("_", cleaned))
+
+
+def search_topk(session, base_url: str, projection_id: str, query: str, model_slug: str, k: int) -> List[dict]:
+    """Equivalente a ``NomicClient.search``: pide 3*k, filtra por modelo y corta en k."""
+
+    response = session.post(
+        f"{base_url.rstrip('/')}/query/topk", json=topk_payload(projection_id, query, k), timeout=NOMIC_TIMEOUT_S
+    )
+    response.raise_for_status()
+    return parse_topk(response.json(), model_slug, k)
+
+
+def topk_payload(projection_id: str, query: str, k: int) -> dict:
+    return {"projection_id": projection_id, "k": k * 3, "query": query, "fields": ["text", "metadata"]}
+
+
+def parse_topk(data: dict, model_slug: str, k: int) -> List[dict]:
+    """Respuesta de ``/query/topk`` a chunks ``{text, metadata, score}`` del modelo, como nomicClient.ts."""
+
+    items = data.get("results") or data.get("matches") or data.get("data") or []
+
+    mapped = []
+    for item in items:
+        text = item.get("text") or (item.get("data") or {}).get("text")
+        if not isinstance(text, str) or not text:
+            continue
+        metadata = item.get("metadata") or (item.get("data") or {}).get("metadata") or {}
+        if isinstance(metadata, str):
+            try:
+                metadata = json.loads(metadata)
+            except ValueError:
+                metadata = {}
+        score = next((item[key] for key in ("score", "distance", "relevance", "_similarity") if isinstance(item.get(key), (int, float))), None)
+        mapped.append({"text": text, "metadata": metadata, "score": score})
+
+    filtered = []
+    for chunk in mapped:
+        metadata = metadata_for_model(chunk["metadata"], model_slug)
+        if metadata is not None:
+            filtered.append({**chunk, "metadata": metadata})
+    return (filtered or mapped)[:k]
+
+
+def metadata_for_model(metadata: dict, model_slug: str) -> Optional[dict]:
+    """``forModel`` de nomicClient.ts: None si el chunk no es del modelo.
+
+    Un chunk deduplicado que entra por ``model_slugs`` toma la cita (manual y paginas) de su
+    entrada en ``appears_in`` para ese modelo.
+    """
+
+    if model_slug in (metadata.get("model_slug"), metadata.get("model_key")):
+        return metadata
+    if model_slug not in (metadata.get("model_slugs") or []):
+        return None
+    occurrence = next(
+        (entry for entry in metadata.get("appears_in") or [] if isinstance(entry, dict) and entry.get("model_slug") == model_slug),
+        None,
+    )
+    if occurrence is None:
+        return metadata
+    return {**metadata, **{field: occurrence[field] for field in CITATION_FIELDS if occurrence.get(field) is not None}}
+
+
+def normalize_score(value) -> float:
+    """``normalizeScore`` de chat.ts: similitudes en [0, 1]; mayores que 1 son distancias."""
+
+    if not isinstance(value, (int, float)) or value != value or value in (float("inf"), float("-inf")):
+        return 0.0
+    if 0 <= value <= 1:
+        return float(value)
+    if value < 0:
+        return 0.0
+    return 1 / (1 + value)
+
+
+def select_relevant(question: str, chunks: Sequence[dict], min_score: float = MIN_NORMALIZED_SCORE) -> List[dict]:
+    """Filtro de chat.ts: puntaje normalizado suficiente y al menos un termino de la pregunta."""
+
+    terms = extract_terms(question)
+    relevant = []
+    for chunk in chunks:
+        if normalize_score(chunk["score"]) < min_score:
+            continue
+        if terms and not set(terms) & set(to_words(chunk["text"])):
+            continue
+        relevant.append(chunk)
+    return relevant
@@ -0,0 +1,296 @@
+"""Grafo de referencias cruzadas y vecinos entre los chunks de un manual.
+
+Los manuales remiten a otras secciones todo el tiempo (``consulte Camaras en la pagina 20``).
+Al chunkear, ``ChunkGraphBuilder`` extrae esas referencias del texto de cada chunk y las
+resuelve a los chunks que cubren la pagina citada (``source_pages`` o
+``page_start..page_end``). Si la referencia trae titulo, se prefieren los chunks de esa
+pagina que contienen sus terminos. El numero impreso en el manual no siempre coincide con la
+pagina del PDF (portada, indice), asi que el desfase se calibra por manual: se prueba cada
+desfase en ``[-MAX_PAGE_OFFSET, MAX_PAGE_OFFSET]`` y se usa el que hace coincidir mas titulos.
+
+Formato de ``{slug}.graph`` (little-endian), una fila por chunk en el orden del JSONL:
+    header <4sHHIIi  magic, version, reservado, n_chunks, n_referencias, desfase de paginas
+    chunk_ids u64[n] | edge_offsets u32[n+1] | targets u32[m] | pages u32[m] (+ padding a 8)
+``targets[edge_offsets[i]:edge_offsets[i+1]]`` son las filas que cita el chunk ``i`` y
+``pages`` la pagina impresa de cada referencia. Los vecinos anterior y siguiente no se
+guardan: son las filas contiguas.
+
+``ChunkGraph`` carga los grafos de varios manuales y expande los chunk_ids recuperados con
+sus referencias y vecinos en una sola consulta local, sin otra busqueda contra Nomic.
+"""
+
+from __future__ import annotations
+
+import inspect
+import re
+import struct
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+from binfmt import le_bytes, pad, padding, unpack_header
+from utils import ManualConfig, ensure_directory, extract_terms, fingerprint, normalize_plain
+
+GRAPH_MAGIC = b"T3CG"
+GRAPH_VERSION = 1
+_HEADER = struct.Struct("<4sHHIIi")
+MAX_PAGE_OFFSET = 10
+# Un rango "paginas 12-40" es casi siempre un error de extraccion; se limita a pocas paginas.
+MAX_REFERENCE_SPAN = 5
+
+# ``(?!\d)`` evita que ``\d{1,4}`` retroceda para esquivar el "de N" de un pie de pagina.
+_PAGE_REF = re.compile(r"\b(?:paginas?|pags?\.)\s*(\d{1,4})(?!\d)(?:\s*(?:-|–|a|y)\s*(\d{1,4})(?!\d))?(?!\s*de\s+\d)")
+_REF_TITLE = re.compile(r"(?:\(|consulte\s+|vea\s+|ver\s+)([^()]{2,80}?)\s+en\s+las?\s*$")
+
+
+@dataclass(frozen=True)
+class PageReference:
+    first: int
+    last: int
+    terms: Tuple[str, ...] = ()
+
+
+def extract_page_references(text: str) -> List[PageReference]:
+    """Referencias ``pagina N`` / ``paginas N-M`` del texto, con los terminos del titulo si lo hay.
+
+    Los pies de pagina ``pagina N de M`` no son referencias
+    (``python -m doctest scripts/chunk_graph.py``):
+
+    >>> extract_page_references("Pagina 12 de 120")
+    []
+    >>> extract_page_references("página 134 de 300. Consulte Camaras en la pagina 20")
+    [PageReference(first=20, last=20, terms=('camaras',))]
+    >>> extract_page_references("ver paginas 12-14")
+    [PageReference(first=12, last=14, terms=())]
+    """
+
+    plain = normalize_plain(text)
+    references = []
+    for match in _PAGE_REF.finditer(plain):
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        if not first or last < first or last - first >= MAX_REFERENCE_SPAN:
+            last = first
+        title = _REF_TITLE.search(plain, max(0, match.start() - 100), match.start())
+        terms = tuple(extract_terms(title.group(1))) if title else ()
+        references.append(PageReference(first, last, terms))
+    return references
+
+
+def graph_fingerprint() -> str:
+    """Hash de la extraccion y resolucion de referencias; cambia si se editan las reglas."""
+
+    rules = [extract_page_references, estimate_page_offset, ChunkGraphBuilder]
+    return fingerprint(
+        GRAPH_VERSION,
+        [inspect.getsource(rule) for rule in rules],
+        [_PAGE_REF.pattern, _REF_TITLE.pattern],
+        MAX_PAGE_OFFSET,
+        MAX_REFERENCE_SPAN,
+    )
+
+
+def estimate_page_offset(
+    references: Iterable[PageReference], page_terms: Dict[int, Set[str]], max_offset: int = MAX_PAGE_OFFSET
+) -> int:
+    """Desfase entre la pagina impresa y la del PDF que mas titulos de referencia hace coincidir.
+
+    Una referencia con titulo coincide con un desfase ``k`` si todos sus terminos aparecen en
+    los chunks de la pagina ``first + k``. A igualdad gana el desfase mas chico en valor
+    absoluto; sin referencias con titulo el desfase es 0.
+    """
+
+    titled = [reference for reference in references if reference.terms]
+    best, best_hits = 0, 0
+    for offset in sorted(range(-max_offset, max_offset + 1), key=abs):
+        hits = sum(
+            all(term in page_terms.get(reference.first + offset, ()) for term in reference.terms)
+            for reference in titled
+        )
+        if hits > best_hits:
+            best, best_hits = offset, hits
+    return best
+
+
+class ChunkGraphBuilder:
+    """Acumula los chunks de un manual a medida que se escriben; ``write`` resuelve y publica el grafo."""
+
+    def __init__(self) -> None:
+        self._chunk_ids = array("Q")
+        self._pages: List[Tuple[int, ...]] = []
+        self._terms: List[FrozenSet[str]] = []
+        self._references: List[List[PageReference]] = []
+
+    def __len__(self) -> int:
+        return len(self._chunk_ids)
+
+    def add(self, chunk_id: str, text: str, pages: Sequence[int]) -> None:
+        self._chunk_ids.append(int(chunk_id, 16))
+        self._pages.append(tuple(pages))
+        self._terms.append(frozenset(extract_terms(text)))
+        self._references.append(extract_page_references(text))
+
+    def resolve(self) -> Tuple[int, List[List[Tuple[int, int]]]]:
+        """(desfase de paginas, por fila las referencias resueltas como (fila destino, pagina impresa))."""
+
+        rows_by_page: Dict[int, List[int]] = defaultdict(list)
+        page_terms: Dict[int, Set[str]] = defaultdict(set)
+        for row, pages in enumerate(self._pages):
+            for page in pages:
+                rows_by_page[page].append(row)
+                page_terms[page] |= self._terms[row]
+        offset = estimate_page_offset(
+            (reference for references in self._references for reference in references), page_terms
+        )
+
+        edges: List[List[Tuple[int, int]]] = []
+        for row, references in enumerate(self._references):
+            targets: Dict[int, int] = {}
+            for reference in references:
+                candidates = [
+                    target
+                    for page in range(reference.first, reference.last + 1)
+                    for target in rows_by_page.get(page + offset, ())
+                    if target != row
+                ]
+                if reference.terms:
+                    titled = [target for target in candidates if self._terms[target].issuperset(reference.terms)]
+                    candidates = titled or candidates
+                for target in candidates:
+                    targets.setdefault(target, reference.first)
+            edges.append(sorted(targets.items()))
+        return offset, edges
+
+    def write(self, path: Path) -> Tuple[int, int]:
+        """Escribe ``{slug}.graph`` (via ``.tmp`` + rename). Retorna (referencias, desfase de paginas)."""
+
+        offset, edges = self.resolve()
+        edge_offsets = array("I", [0])
+        targets = array("I")
+        pages = array("I")
+        for row_edges in edges:
+            for target, page in row_edges:
+                targets.append(target)
+                pages.append(page)
+            edge_offsets.append(len(targets))
+
+        ensure_directory(path)
+        temp_path = path.with_name(path.name + ".tmp")
+        with temp_path.open("wb") as out:
+            out.write(pad(_HEADER.pack(GRAPH_MAGIC, GRAPH_VERSION, 0, len(self), len(targets), offset)))
+            for column in (self._chunk_ids, edge_offsets, targets, pages):
+                out.write(pad(le_bytes(column)))
+        temp_path.replace(path)
+        return len(targets), offset
+
+
+class _ManualGraph:
+    def __init__(self, path: Path):
+        blob = path.read_bytes()
+        _, _, _, count, edge_count, self.page_offset = unpack_header(
+            _HEADER, blob, GRAPH_MAGIC, GRAPH_VERSION, "grafo de chunks", path.name
+        )
+        cursor = _HEADER.size + padding(_HEADER.size)
+        columns = []
+        for typecode, width, length in (("Q", 8, count), ("I", 4, count + 1), ("I", 4, edge_count), ("I", 4, edge_count)):
+            column = array(typecode)
+            column.frombytes(blob[cursor : cursor + width * length])
+            columns.append(column)
+            cursor += width * length + padding(width * length)
+        self.chunk_ids, self.edge_offsets, self.targets, self.pages = columns
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+
+class ChunkGraph:
+    """Referencias y vecinos de los chunks de uno o varios manuales, por ``chunk_id``.
+
+    ``expand`` parte de los chunks recuperados y agrega, para cada uno y en su orden, los
+    chunks que cita y sus vecinos: todo sale de arreglos en memoria (~20 bytes por chunk y
+    12 por referencia), sin volver a consultar el indice vectorial.
+    """
+
+    def __init__(self, paths: Sequence[Path]):
+        self._graphs = [_ManualGraph(path) for path in paths]
+        self.page_offsets: Dict[str, int] = {path.stem: graph.page_offset for path, graph in zip(paths, self._graphs)}
+        self._rows: Dict[int, Tuple[int, int]] = {}
+        for position, graph in enumerate(self._graphs):
+            for row, value in enumerate(graph.chunk_ids):
+                self._rows[value] = (position, row)
+
+    @classmethod
+    def from_manuals(cls, manuals: Iterable[ManualConfig]) -> "ChunkGraph":
+        """Grafos de ``data/processed/{slug}.graph`` (los genera ``chunk_manuals.py``)."""
+
+        return cls([manual.chunk_graph_path for manual in manuals])
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return _chunk_key(chunk_id) in self._rows
+
+    def references(self, chunk_id: str) -> List[Tuple[str, int]]:
+        """Chunks citados por ``chunk_id`` como (chunk_id, pagina impresa), en orden del manual."""
+
+        location = self._rows.get(_chunk_key(chunk_id))
+        if location is None:
+            return []
+        graph = self._graphs[location[0]]
+        start, stop = graph.edge_offsets[location[1]], graph.edge_offsets[location[1] + 1]
+        return [(_chunk_label(graph.chunk_ids[graph.targets[edge]]), graph.pages[edge]) for edge in range(start, stop)]
+
+    def neighbors(self, chunk_id: str, distance: int = 1) -> List[str]:
+        """Hasta ``distance`` chunks antes y despues de ``chunk_id`` en el mismo manual, en orden."""
+
+        location = self._rows.get(_chunk_key(chunk_id))
+        if location is None:
+            return []
+        graph = self._graphs[location[0]]
+        row = location[1]
+        rows = range(max(0, row - distance), min(len(graph), row + distance + 1))
+        return [_chunk_label(graph.chunk_ids[other]) for other in rows if other != row]
+
+    def expand(
+        self,
+        chunk_ids: Sequence[str],
+        neighbors: int = 1,
+        references: bool = True,
+        limit: Optional[int] = None,
+    ) -> List[str]:
+        """``chunk_ids`` mas sus chunks enlazados, sin repetir y con los originales primero.
+
+        Los agregados siguen el orden de ``chunk_ids``: para cada uno, primero lo que cita y
+        despues sus vecinos. ``limit`` corta la lista final (los originales siempre entran).
+        Los ids que no estan en el grafo se conservan pero no agregan nada.
+        """
+
+        expanded = list(dict.fromkeys(chunk_ids))
+        seen = set(expanded)
+        for chunk_id in list(expanded):
+            linked = [target for target, _ in self.references(chunk_id)] if references else []
+            if neighbors:
+                linked += self.neighbors(chunk_id, neighbors)
+            for target in linked:
+                if target not in seen:
+                    seen.add(target)
+                    expanded.append(target)
+        if limit is not None:
+            expanded = expanded[: max(limit, len(set(chunk_ids)))]
+        return expanded
+
+
+def _chunk_key(chunk_id: str) -> Optional[int]:
+    """``chunk_id`` como entero, o None si no es hexadecimal (no puede estar en el grafo)."""
+
+    try:
+        return int(chunk_id, 16)
+    except (TypeError, ValueError):
+        return None
+
+
+def _chunk_label(value: int) -> str:
+    return f"{value:016x}"
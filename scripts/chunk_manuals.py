@@ -4,20 +4,35 @@ import argparse
 import json
 import sys
 from pathlib import Path
-from typing import Iterable, List
-
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from tqdm import tqdm
+from typing import Iterable, Iterator, List, Tuple
 
+from chunk_graph import ChunkGraphBuilder, graph_fingerprint
+from page_store import intermediate_source_path, iter_manual_pages
+from sentence_index import SentenceIndexBuilder, sentence_index_fingerprint
+from text_splitter import Document, RecursiveTextSplitter
+from token_counter import DEFAULT_TOKENIZER, Tokenizer, load_tokenizer
 from utils import (
+    BuildManifest,
+    ChunkIdAssigner,
     ManualConfig,
+    StageMetrics,
+    add_metrics_arguments,
+    build_timestamp,
+    count_items,
     ensure_directory,
     filter_manuals,
+    fingerprint,
     load_manuals_config,
-    now_iso,
+    manual_fingerprint,
+    sha256_file,
 )
 
 INTERMEDIATE_DIR = Path(__file__).resolve().parents[1] / "data" / "intermediate"
+STAGE = "chunk"
+CHUNK_SEPARATORS = ["\n\n", "\n", ". ", " "]
+LENGTH_UNITS = ("chars", "tokens")
+# Niveles del indice del PDF que cortan bloques (1 = solo capitulos); 0 ignora las secciones.
+DEFAULT_SECTION_DEPTH = 2
 
 
 def main(argv: Iterable[str] | None = None) -> int:
@@ -34,7 +49,7 @@ def main(argv: Iterable[str] | None = None) -> int:
         "--chunk-size",
         type=int,
         default=800,
-        help="Tamanio final de cada chunk en caracteres aproximado.",
+        help="Tamanio final de cada chunk, en la unidad de --length-unit.",
     )
     parser.add_argument(
         "--chunk-overlap",
@@ -42,6 +57,14 @@ def main(argv: Iterable[str] | None = None) -> int:
         default=120,
         help="Solapamiento entre chunks consecutivos.",
     )
+    add_tokenizer_arguments(parser)
+    add_section_arguments(parser)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Ignora el manifest de build y regenera todos los chunks.",
+    )
+    add_metrics_arguments(parser)
     args = parser.parse_args(list(argv) if argv is not None else None)
 
     try:
@@ -50,112 +73,269 @@ def main(argv: Iterable[str] | None = None) -> int:
         print(f"[ERROR] {exc}", file=sys.stderr)
         return 1
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=args.chunk_size,
-        chunk_overlap=args.chunk_overlap,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " "],
-    )
+    try:
+        tokenizer = load_tokenizer(args.tokenizer)
+    except (RuntimeError, ValueError) as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+    splitter = build_splitter(args.chunk_size, args.chunk_overlap, args.length_unit, tokenizer)
 
-    for manual in manuals:
-        try:
-            process_manual(manual, splitter)
-        except FileNotFoundError:
-            print(
-                f"[ERROR] No se encontro el archivo intermedio para {manual.display_name} ({manual.intermediate_json_path})",
-                file=sys.stderr,
-            )
-            return 1
-        except Exception as exc:
-            print(f"[ERROR] {manual.display_name}: {exc}", file=sys.stderr)
-            return 1
+    manifest = BuildManifest.load()
+    with StageMetrics.from_args(STAGE, args) as metrics:
+        for manual in manuals:
+            try:
+                with metrics.manual(manual.slug) as record:
+                    fresh = not chunk_if_stale(
+                        manual,
+                        splitter,
+                        manifest,
+                        force=args.force,
+                        tokenizer=tokenizer,
+                        length_unit=args.length_unit,
+                        section_depth=args.section_depth,
+                    )
+                    if fresh:
+                        record.status = "skip"
+            except FileNotFoundError:
+                print(
+                    f"[ERROR] No se encontro el archivo intermedio para {manual.display_name} ({manual.intermediate_pages_path})",
+                    file=sys.stderr,
+                )
+                return 1
+            except Exception as exc:
+                print(f"[ERROR] {manual.display_name}: {exc}", file=sys.stderr)
+                return 1
 
     return 0
 
 
-def process_manual(manual: ManualConfig, splitter: RecursiveCharacterTextSplitter) -> None:
-    with manual.intermediate_json_path.open(encoding="utf-8") as f:
-        intermediate = json.load(f)
+def add_tokenizer_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--length-unit",
+        choices=LENGTH_UNITS,
+        default="chars",
+        help="Unidad de --chunk-size/--chunk-overlap: caracteres o tokens de --tokenizer.",
+    )
+    parser.add_argument(
+        "--tokenizer",
+        default=DEFAULT_TOKENIZER,
+        help="Tokenizer local para token_count y --length-unit tokens: approx, tiktoken:<encoding> o hf:<tokenizer.json>.",
+    )
 
-    pages: List[dict] = intermediate["pages"]
-    if not pages:
-        raise ValueError("No hay paginas extraidas para este manual.")
 
-    documents = build_documents_from_pages(manual, pages)
+def build_splitter(
+    chunk_size: int,
+    chunk_overlap: int,
+    length_unit: str = "chars",
+    tokenizer: Tokenizer | None = None,
+) -> RecursiveTextSplitter:
+    """Splitter del chunking; con ``length_unit="tokens"`` mide los trozos con ``tokenizer``."""
+
+    if length_unit not in LENGTH_UNITS:
+        raise ValueError(f"Unidad de largo desconocida: {length_unit}")
+    return RecursiveTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=CHUNK_SEPARATORS,
+        length_function=(tokenizer or load_tokenizer()).count if length_unit == "tokens" else len,
+    )
+
+
+def chunk_inputs_fingerprint(
+    manual: ManualConfig,
+    chunk_size: int,
+    chunk_overlap: int,
+    length_unit: str = "chars",
+    tokenizer_name: str = DEFAULT_TOKENIZER,
+    section_depth: int = DEFAULT_SECTION_DEPTH,
+) -> str:
+    """Entradas del chunking: paginas extraidas, parametros del splitter y secciones, tokenizer,
+    reglas de segmentacion en oraciones y del grafo de referencias, y config del manual."""
+
+    return fingerprint(
+        sha256_file(intermediate_source_path(manual)),
+        chunk_size,
+        chunk_overlap,
+        length_unit,
+        tokenizer_name,
+        section_depth,
+        sentence_index_fingerprint(),
+        graph_fingerprint(),
+        manual_fingerprint(manual),
+    )
+
+
+def chunk_if_stale(
+    manual: ManualConfig,
+    splitter: RecursiveTextSplitter,
+    manifest: BuildManifest,
+    force: bool = False,
+    tokenizer: Tokenizer | None = None,
+    length_unit: str = "chars",
+    section_depth: int = DEFAULT_SECTION_DEPTH,
+) -> bool:
+    """Genera los chunks de un manual salvo que el manifest diga que estan al dia. Retorna False si se omitio."""
+
+    tokenizer = tokenizer or load_tokenizer()
+    inputs = chunk_inputs_fingerprint(
+        manual, splitter.chunk_size, splitter.chunk_overlap, length_unit, tokenizer.name, section_depth
+    )
+    if not force and manifest.is_fresh(STAGE, manual.slug, inputs):
+        print(f"[SKIP] {manual.display_name} sin cambios desde el ultimo chunking")
+        return False
+    process_manual(manual, splitter, tokenizer, section_depth)
+    outputs = [manual.processed_jsonl_path, manual.chunk_graph_path, manual.sentence_index_path]
+    manifest.record(STAGE, manual.slug, inputs, outputs)
+    return True
+
+
+def process_manual(
+    manual: ManualConfig,
+    splitter: RecursiveTextSplitter,
+    tokenizer: Tokenizer | None = None,
+    section_depth: int = DEFAULT_SECTION_DEPTH,
+) -> None:
+    pages = iter_manual_pages(manual)
+    documents = build_documents_from_pages(manual, pages, section_depth)
     split_docs = splitter.split_documents(documents)
 
     ensure_directory(manual.processed_jsonl_path)
-    chunk_count = write_jsonl(manual, split_docs)
+    graph = ChunkGraphBuilder()
+    sentences = SentenceIndexBuilder()
+    chunk_count, total_chars, total_tokens = write_jsonl(manual, split_docs, tokenizer, graph, sentences)
+    if chunk_count == 0:
+        raise ValueError("No hay paginas extraidas para este manual.")
+    references, page_offset = graph.write(manual.chunk_graph_path)
+    count_items("references", references)
+    count_items("sentences", sentences.write(manual.sentence_index_path))
 
-    avg_chars = sum(len(doc.page_content) for doc in split_docs) / max(chunk_count, 1)
     print(
-        f"[OK] {manual.display_name}: {chunk_count} chunks (promedio {avg_chars:.0f} chars) -> {manual.processed_jsonl_path.name}"
+        f"[OK] {manual.display_name}: {chunk_count} chunks (promedio {total_chars / chunk_count:.0f} chars, "
+        f"{total_tokens / chunk_count:.0f} tokens) -> {manual.processed_jsonl_path.name}"
     )
+    print(
+        f"[OK] {manual.display_name}: {references} referencias entre chunks (desfase de paginas {page_offset:+d}) "
+        f"-> {manual.chunk_graph_path.name}"
+    )
+
 
+# Agrupar en bloques de ~3200 caracteres para permitir overlap multi-pagina.
+MAX_BLOCK_LEN = 3200
+# Un bloque mas corto que esto no se corta al cambiar de seccion: se une con la siguiente.
+MIN_SECTION_BLOCK_LEN = 400
 
-def build_documents_from_pages(manual: ManualConfig, pages: List[dict]):
-    """Agrupa paginas contiguas en documentos base para permitir chunks multi-pagina."""
 
-    from langchain_core.documents import Document  # lazy import to avoid optional dependency at module import
+def build_documents_from_pages(
+    manual: ManualConfig,
+    pages: Iterable[dict],
+    section_depth: int = DEFAULT_SECTION_DEPTH,
+) -> Iterator[Document]:
+    """Agrupa paginas contiguas en documentos base para permitir chunks multi-pagina.
+
+    Si las paginas traen ``section_path`` (marcadores del PDF), un bloque tambien se corta
+    cuando cambian sus primeros ``section_depth`` niveles, asi un chunk no mezcla secciones.
+    """
 
-    # Agrupar en bloques de ~3200 caracteres para permitir overlap multi-pagina.
-    MAX_BLOCK_LEN = 3200
     buffer: List[str] = []
     buffer_pages: List[int] = []
-    documents: List[Document] = []
+    buffer_sections: List[List[str]] = []
+    buffer_len = 0
 
     for page in pages:
         text = page["text"].strip()
         if not text:
             continue
 
+        section = list(page.get("section_path") or [])[:section_depth]
+        if buffer and buffer_len >= MIN_SECTION_BLOCK_LEN and section != buffer_sections[-1]:
+            yield _block_document(manual, buffer, buffer_pages, buffer_sections)
+            buffer.clear()
+            buffer_pages.clear()
+            buffer_sections.clear()
+            buffer_len = 0
+
         buffer.append(text)
         buffer_pages.append(page["page_number"])
+        buffer_sections.append(section)
+        buffer_len += len(text)
 
-        buffer_len = sum(len(item) for item in buffer)
         if buffer_len >= MAX_BLOCK_LEN:
-            documents.append(
-                Document(
-                    page_content="\n\n".join(buffer),
-                    metadata={
-                        "page_start": buffer_pages[0],
-                        "page_end": buffer_pages[-1],
-                        "source_pages": buffer_pages.copy(),
-                        "model_key": manual.key,
-                        "slug": manual.slug,
-                        "document_title": manual.document_title,
-                    },
-                )
-            )
+            yield _block_document(manual, buffer, buffer_pages, buffer_sections)
             buffer.clear()
             buffer_pages.clear()
+            buffer_sections.clear()
+            buffer_len = 0
 
     if buffer:
-        documents.append(
-            Document(
-                page_content="\n\n".join(buffer),
-                metadata={
-                    "page_start": buffer_pages[0],
-                    "page_end": buffer_pages[-1],
-                    "source_pages": buffer_pages.copy(),
-                    "model_key": manual.key,
-                    "slug": manual.slug,
-                    "document_title": manual.document_title,
-                },
-            )
-        )
-
-    return documents
-
-
-def write_jsonl(manual: ManualConfig, documents) -> int:
-    import json
+        yield _block_document(manual, buffer, buffer_pages, buffer_sections)
+
+
+def _block_document(
+    manual: ManualConfig,
+    buffer: List[str],
+    buffer_pages: List[int],
+    buffer_sections: List[List[str]],
+) -> Document:
+    # Seccion del bloque: el prefijo comun de las secciones de sus paginas.
+    section_path = buffer_sections[0]
+    for section in buffer_sections[1:]:
+        common = 0
+        while common < min(len(section_path), len(section)) and section_path[common] == section[common]:
+            common += 1
+        section_path = section_path[:common]
+    return Document(
+        page_content="\n\n".join(buffer),
+        metadata={
+            "page_start": buffer_pages[0],
+            "page_end": buffer_pages[-1],
+            "source_pages": buffer_pages.copy(),
+            "section_path": list(section_path),
+            "model_key": manual.key,
+            "slug": manual.slug,
+            "document_title": manual.document_title,
+        },
+    )
+
+
+def add_section_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--section-depth",
+        type=int,
+        default=DEFAULT_SECTION_DEPTH,
+        help="Niveles del indice (marcadores) del PDF que separan chunks; 0 ignora las secciones.",
+    )
+
+
+def write_jsonl(
+    manual: ManualConfig,
+    documents: Iterable[Document],
+    tokenizer: Tokenizer | None = None,
+    graph: ChunkGraphBuilder | None = None,
+    sentences: SentenceIndexBuilder | None = None,
+) -> Tuple[int, int, int]:
+    """Escribe los chunks a medida que llegan; retorna (cantidad, caracteres totales, tokens totales).
+
+    Con ``graph`` cada chunk se agrega tambien al grafo de referencias (ver ``chunk_graph.py``)
+    y con ``sentences`` al indice de oraciones (ver ``sentence_index.py``). Se escribe en un
+    ``.tmp`` que reemplaza al JSONL solo si salio al menos un chunk: un manual sin paginas
+    extraidas no pisa el ultimo JSONL bueno.
+    """
 
     output_path = manual.processed_jsonl_path
+    temp_path = output_path.with_suffix(".tmp")
+    tokenizer = tokenizer or load_tokenizer()
     count = 0
-    with output_path.open("w", encoding="utf-8") as f:
+    total_chars = 0
+    total_tokens = 0
+    chunk_ids = ChunkIdAssigner()
+    # Un solo timestamp por manual: con SOURCE_DATE_EPOCH el JSONL sale identico en cada build.
+    generated_at = build_timestamp()
+    with temp_path.open("w", encoding="utf-8") as f:
         for idx, doc in enumerate(documents):
+            text = doc.page_content.strip()
+            token_count = tokenizer.count(text)
             metadata = {
+                "chunk_id": chunk_ids.assign(manual.slug, text),
                 "model_key": manual.key,
                 "model_slug": manual.slug,
                 "model_name": manual.display_name,
@@ -164,15 +344,34 @@ def write_jsonl(manual: ManualConfig, documents) -> int:
                 "page_start": doc.metadata.get("page_start"),
                 "page_end": doc.metadata.get("page_end"),
                 "source_pages": doc.metadata.get("source_pages"),
+                "section_title": (doc.metadata.get("section_path") or [None])[-1],
+                "section_path": doc.metadata.get("section_path") or [],
                 "chunk_index": idx,
                 "char_count": len(doc.page_content),
-                "generated_at": now_iso(),
+                "token_count": token_count,
+                "tokenizer": tokenizer.name,
+                "generated_at": generated_at,
             }
-            record = {"text": doc.page_content.strip(), "metadata": metadata}
+            record = {"text": text, "metadata": metadata}
+            if graph is not None:
+                start, end = metadata["page_start"], metadata["page_end"]
+                pages = metadata["source_pages"] or (range(start, end + 1) if start and end else ())
+                graph.add(metadata["chunk_id"], text, pages)
+            if sentences is not None:
+                sentences.add(metadata["chunk_id"], text)
             json.dump(record, f, ensure_ascii=False)
             f.write("\n")
             count += 1
-    return count
+            total_chars += len(doc.page_content)
+            total_tokens += token_count
+    if count:
+        temp_path.replace(output_path)
+    else:
+        temp_path.unlink()
+    count_items("chunks", count)
+    count_items("chars", total_chars)
+    count_items("tokens", total_tokens)
+    return count, total_chars, total_tokens
 
 
 if __name__ == "__main__":
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils import ChunkIdAssigner, ManualConfig, iter_jsonl
+
+# Columnas en memoria (una fila por chunk, en el orden de los JSONL):
+#   text        un solo buffer UTF-8; text_offsets int64[n+1] delimita cada chunk
+#   slug        uint16, codigo en ``slugs``          chunk_index  int32
+#   page_start  int32 (-1 si falta)                  page_end     int32 (-1 si falta)
+#   token_count int32 (-1 si falta)                  chunk_id     uint64
+#   section     int32, codigo en ``sections`` (-1 si el registro no trae ``section_path``)
+#   source_pages en CSR: pages_offsets int64[n+1] | pages int32
+# La metadata que se repite en todo un manual (model_name, document_title, ...) se guarda
+# una vez por slug, y cada ``section_path`` distinto una vez en ``sections`` (``section_title``
+# es su ultimo elemento, como en chunk_manuals.py). Por slug hay ademas un indice de intervalos: filas ordenadas por
+# page_start y el maximo acumulado de page_end, ambos buscables con biseccion.
+SHARED_FIELDS = ("model_key", "model_name", "document_title", "source_file", "tokenizer", "generated_at")
+MISSING = -1
+
+
+class ChunkStore:
+    """Chunks procesados o compilados en columnas numpy, con busqueda por pagina y por modelo.
+
+    Ocupa el tamanio del texto en UTF-8 mas ~80 bytes por chunk, en vez de un dict de
+    Python (~1 KB de overhead) por registro. ``overlapping(slug, a, b)`` encuentra los
+    chunks que cubren las paginas ``a..b`` en tiempo logaritmico; ``model_mask`` y ``rows``
+    filtran de forma vectorizada.
+    """
+
+    def __init__(self, records: Iterable[dict]):
+        text = bytearray()
+        text_offsets = array("q", [0])
+        pages = array("i")
+        pages_offsets = array("q", [0])
+        slug_codes, chunk_index, page_start, page_end, token_count, section_codes = (array("i") for _ in range(6))
+        chunk_ids = array("Q")
+        self.slugs: List[str] = []
+        self.shared: Dict[str, dict] = {}
+        self.sections: List[Tuple[str, ...]] = []
+        codes: Dict[str, int] = {}
+        section_ids: Dict[Tuple[str, ...], int] = {}
+        fallback_ids = ChunkIdAssigner()
+
+        for record in records:
+            metadata = record.get("metadata", {})
+            slug = metadata.get("model_slug") or metadata.get("model_key") or ""
+            if slug not in codes:
+                codes[slug] = len(self.slugs)
+                self.slugs.append(slug)
+                self.shared[slug] = {key: metadata[key] for key in SHARED_FIELDS if key in metadata}
+            body = record.get("text", "")
+            text += body.encode("utf-8")
+            text_offsets.append(len(text))
+            slug_codes.append(codes[slug])
+            chunk_index.append(_int_or_missing(metadata.get("chunk_index")))
+            page_start.append(_int_or_missing(metadata.get("page_start")))
+            page_end.append(_int_or_missing(metadata.get("page_end")))
+            token_count.append(_int_or_missing(metadata.get("token_count")))
+            chunk_ids.append(int(metadata.get("chunk_id") or fallback_ids.assign(slug, body), 16))
+            if "section_path" in metadata:
+                section = tuple(metadata["section_path"] or ())
+                if section not in section_ids:
+                    section_ids[section] = len(self.sections)
+                    self.sections.append(section)
+                section_codes.append(section_ids[section])
+            else:
+                section_codes.append(MISSING)
+            pages.extend(metadata.get("source_pages") or ())
+            pages_offsets.append(len(pages))
+
+        if len(self.slugs) > np.iinfo(np.uint16).max:
+            raise ValueError(f"Demasiados manuales para ChunkStore: {len(self.slugs)}")
+        self._text = bytes(text)
+        self.text_offsets = np.frombuffer(text_offsets, dtype=np.int64)
+        self.slug = np.frombuffer(slug_codes, dtype=np.int32).astype(np.uint16)
+        self.chunk_index = np.frombuffer(chunk_index, dtype=np.int32)
+        self.page_start = np.frombuffer(page_start, dtype=np.int32)
+        self.page_end = np.frombuffer(page_end, dtype=np.int32)
+        self.token_count = np.frombuffer(token_count, dtype=np.int32)
+        self.chunk_id = np.frombuffer(chunk_ids, dtype=np.uint64)
+        self.section = np.frombuffer(section_codes, dtype=np.int32)
+        self.pages = np.frombuffer(pages, dtype=np.int32)
+        self.pages_offsets = np.frombuffer(pages_offsets, dtype=np.int64)
+        self._codes = codes
+        self._build_indexes()
+
+    @classmethod
+    def from_jsonl(cls, paths: Union[Path, Sequence[Path]]) -> "ChunkStore":
+        """Desde uno o varios JSONL (``data/processed/*.jsonl`` o el compilado)."""
+
+        paths = [paths] if isinstance(paths, Path) else list(paths)
+        return cls(record for path in paths for record in iter_jsonl(path))
+
+    @classmethod
+    def from_manuals(cls, manuals: Iterable[ManualConfig], source: str = "processed") -> "ChunkStore":
+        """Desde los JSONL de cada manual; ``source="deduped"`` usa la salida de dedup_chunks.py."""
+
+        return cls.from_jsonl(
+            [manual.deduped_jsonl_path if source == "deduped" else manual.processed_jsonl_path for manual in manuals]
+        )
+
+    @classmethod
+    def from_compact(cls, directory: Path) -> "ChunkStore":
+        """Desde un dataset ``.compact`` (compile_dataset.py --format compact)."""
+
+        from compact_dataset import CompactDataset
+
+        return cls(CompactDataset(directory))
+
+    def __len__(self) -> int:
+        return len(self.slug)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes ocupados por el texto y las columnas."""
+
+        columns = (
+            self.text_offsets,
+            self.slug,
+            self.chunk_index,
+            self.page_start,
+            self.page_end,
+            self.token_count,
+            self.chunk_id,
+            self.section,
+            self.pages,
+            self.pages_offsets,
+            self._by_start,
+            self._max_end,
+            self._id_order,
+        )
+        return len(self._text) + sum(column.nbytes for column in columns)
+
+    def text(self, row: int) -> str:
+        return self._text[self.text_offsets[row] : self.text_offsets[row + 1]].decode("utf-8")
+
+    def source_pages(self, row: int) -> List[int]:
+        return self.pages[self.pages_offsets[row] : self.pages_offsets[row + 1]].tolist()
+
+    def model_slug(self, row: int) -> str:
+        return self.slugs[self.slug[row]]
+
+    def section_path(self, row: int) -> Optional[List[str]]:
+        code = self.section[row]
+        return None if code == MISSING else list(self.sections[code])
+
+    def record(self, row: int) -> dict:
+        """Registro con la forma de ``data/processed``; la metadata compartida es la del manual."""
+
+        slug = self.model_slug(row)
+        shared = self.shared[slug]
+        body = self.text(row)
+        metadata = {
+            "chunk_id": f"{int(self.chunk_id[row]):016x}",
+            "model_key": shared.get("model_key", slug),
+            "model_slug": slug,
+            **{key: shared[key] for key in ("model_name", "document_title", "source_file") if key in shared},
+            "page_start": _value_or_none(self.page_start[row]),
+            "page_end": _value_or_none(self.page_end[row]),
+            "source_pages": self.source_pages(row),
+        }
+        section_path = self.section_path(row)
+        if section_path is not None:
+            metadata["section_title"] = section_path[-1] if section_path else None
+            metadata["section_path"] = section_path
+        metadata["chunk_index"] = _value_or_none(self.chunk_index[row])
+        metadata["char_count"] = len(body)
+        if self.token_count[row] != MISSING:
+            metadata["token_count"] = int(self.token_count[row])
+        metadata.update({key: shared[key] for key in ("tokenizer", "generated_at") if key in shared})
+        return {"text": body, "metadata": metadata}
+
+    def records(self, rows: Iterable[int]) -> Iterator[dict]:
+        for row in rows:
+            yield self.record(int(row))
+
+    def row_for_id(self, chunk_id: str) -> Optional[int]:
+        """Fila del ``chunk_id`` (biseccion sobre los ids ordenados) o None."""
+
+        value = np.uint64(int(chunk_id, 16))
+        position = int(np.searchsorted(self.chunk_id, value, sorter=self._id_order))
+        if position < len(self) and self.chunk_id[self._id_order[position]] == value:
+            return int(self._id_order[position])
+        return None
+
+    def model_mask(self, slugs: Union[str, Iterable[str]]) -> np.ndarray:
+        """Mascara booleana de las filas de uno o varios manuales."""
+
+        slugs = [slugs] if isinstance(slugs, str) else list(slugs)
+        codes = [self._codes[slug] for slug in slugs if slug in self._codes]
+        return np.isin(self.slug, np.asarray(codes, dtype=np.uint16))
+
+    def rows(self, model_slug: Optional[Union[str, Iterable[str]]] = None, min_tokens: int = 0) -> np.ndarray:
+        """Filas (en orden) que cumplen los filtros."""
+
+        mask = np.ones(len(self), dtype=bool) if model_slug is None else self.model_mask(model_slug)
+        if min_tokens:
+            mask &= self.token_count >= min_tokens
+        return np.flatnonzero(mask)
+
+    def overlapping(self, model_slug: str, first_page: int, last_page: Optional[int] = None) -> np.ndarray:
+        """Filas del manual cuyo rango ``page_start..page_end`` toca ``first_page..last_page``, en orden."""
+
+        last_page = first_page if last_page is None else last_page
+        code = self._codes.get(model_slug)
+        if code is None or last_page < first_page:
+            return np.zeros(0, dtype=np.int64)
+        lo, hi = self._partitions[code]
+        starts = self.page_start[self._by_start[lo:hi]]
+        # Ninguna fila antes de ``begin`` termina en first_page o despues (maximo acumulado).
+        begin = int(np.searchsorted(self._max_end[lo:hi], first_page, side="left"))
+        end = int(np.searchsorted(starts, last_page, side="right"))
+        candidates = self._by_start[lo + begin : lo + end]
+        ends = np.maximum(self.page_end[candidates], self.page_start[candidates])
+        return np.sort(candidates[ends >= first_page])
+
+    def covering(self, model_slug: str, page: int) -> np.ndarray:
+        return self.overlapping(model_slug, page, page)
+
+    def _build_indexes(self) -> None:
+        self._id_order = np.argsort(self.chunk_id, kind="stable")
+        located = np.flatnonzero(self.page_start != MISSING)
+        order = located[np.lexsort((self.page_start[located], self.slug[located]))]
+        ends = np.where(self.page_end[order] == MISSING, self.page_start[order], self.page_end[order])
+        self._by_start = order.astype(np.int64)
+        self._max_end = np.empty(len(order), dtype=np.int32)
+        self._partitions: Dict[int, tuple] = {}
+        slugs_sorted = self.slug[order]
+        for code in range(len(self.slugs)):
+            lo, hi = (int(bound) for bound in np.searchsorted(slugs_sorted, [code, code + 1]))
+            self._partitions[code] = (lo, hi)
+            if hi > lo:
+                self._max_end[lo:hi] = np.maximum.accumulate(ends[lo:hi])
+
+
+def _int_or_missing(value) -> int:
+    return value if isinstance(value, int) else MISSING
+
+
+def _value_or_none(value) -> Optional[int]:
+    return None if value == MISSING else int(value)
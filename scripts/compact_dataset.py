@@ -0,0 +1,349 @@
+"""Dataset compacto: JSONL de chunks normalizado y comprimido con zstd + diccionario entrenado.
+
+Estructura de ``{nombre}.compact/``:
+
+- ``header.json``: version, grupos de metadata compartida y lista de shards con sus hashes.
+- ``dictionary.zdict``: diccionario zstd entrenado sobre los propios registros (opcional).
+- ``shard-00000.jsonl.zst``, ...: ``shard_records`` registros por shard, cada uno en una linea
+  ``[grupo, valores..., texto]``.
+
+Un grupo reune los registros de un manual con las mismas claves de metadata. Las claves cuyo
+valor es igual en todo el grupo (``model_name``, ``document_title``, ``source_file``,
+``tokenizer``, ``generated_at``, ...) se guardan una sola vez en el header; cada linea guarda
+solo el resto, en el orden de ``keys``. ``CompactDataset`` reconstruye los registros con la
+misma forma ``{"text", "metadata"}`` y el mismo orden de claves que ``chunk_manuals.py``.
+
+Con las mismas entradas y parametros la salida es identica byte a byte: el diccionario se
+entrena con parametros fijos (sin busqueda aleatoria) y no se guardan fechas propias.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from utils import ChunkIdAssigner, iter_jsonl, sha256_file
+
+COMPACT_FORMAT = "t3-compact"
+COMPACT_VERSION = 1
+HEADER_NAME = "header.json"
+DICTIONARY_NAME = "dictionary.zdict"
+DEFAULT_SHARD_RECORDS = 256
+DEFAULT_LEVEL = 19
+DEFAULT_DICT_SIZE = 112_640
+# Tope de bytes de muestra para entrenar el diccionario (zstd recomienda ~100x su tamanio).
+DICT_SAMPLE_BYTES = 16 * 1024 * 1024
+# Parametros fijos de fastcover: sin ellos zstd prueba combinaciones y el resultado puede variar.
+DICT_K = 1024
+DICT_D = 8
+
+
+@dataclass
+class Group:
+    model_slug: str
+    keys: List[str]
+    shared: Dict[str, object]
+
+    @property
+    def per_record(self) -> List[str]:
+        return [key for key in self.keys if key not in self.shared]
+
+
+def compact_path_for(jsonl_path: Path) -> Path:
+    return jsonl_path.with_suffix(".compact")
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError("Instala zstandard para usar el dataset compacto (pip install zstandard).") from exc
+    return zstandard
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _group_key(record: dict) -> Tuple[str, Tuple[str, ...]]:
+    if set(record) != {"text", "metadata"}:
+        raise ValueError(f"Registro con claves inesperadas: {sorted(record)}")
+    metadata = record["metadata"]
+    slug = metadata.get("model_slug") or metadata.get("model_key") or ""
+    return slug, tuple(metadata)
+
+
+def _iter_records(files: Sequence[Path]) -> Iterator[dict]:
+    fallback_ids = ChunkIdAssigner()
+    for path in files:
+        for record in iter_jsonl(path):
+            metadata = record.get("metadata", {})
+            if "chunk_id" not in metadata:
+                # Registros anteriores a chunk_id: se agrega al frente, como lo escribe chunk_manuals.py.
+                slug = metadata.get("model_slug") or metadata.get("model_key") or ""
+                record["metadata"] = {"chunk_id": fallback_ids.assign(slug, record.get("text", "")), **metadata}
+            yield record
+
+
+def scan_groups(files: Sequence[Path]) -> List[Group]:
+    """Primera pasada: grupos (manual, claves) y que valores son constantes dentro de cada grupo."""
+
+    groups: Dict[Tuple[str, Tuple[str, ...]], Group] = {}
+    for record in _iter_records(files):
+        key = _group_key(record)
+        metadata = record["metadata"]
+        group = groups.get(key)
+        if group is None:
+            groups[key] = Group(model_slug=key[0], keys=list(key[1]), shared=dict(metadata))
+            continue
+        for name in [name for name, value in group.shared.items() if _dumps(metadata[name]) != _dumps(value)]:
+            del group.shared[name]
+    return list(groups.values())
+
+
+def _encode(record: dict, group_index: int, group: Group) -> bytes:
+    metadata = record["metadata"]
+    return _dumps([group_index, *(metadata[key] for key in group.per_record), record["text"]]) + b"\n"
+
+
+def write_compact(
+    files: Sequence[Path],
+    output_dir: Path,
+    shard_records: int = DEFAULT_SHARD_RECORDS,
+    level: int = DEFAULT_LEVEL,
+    dict_size: int = DEFAULT_DICT_SIZE,
+) -> int:
+    """Escribe los JSONL ``files`` como dataset compacto en ``output_dir``. Retorna la cantidad de registros.
+
+    Lee las entradas tres veces (grupos, muestras del diccionario, shards) en vez de cargarlas
+    en memoria. ``dict_size=0`` desactiva el diccionario.
+    """
+
+    zstd = _zstd()
+    groups = scan_groups(files)
+    group_index = {(group.model_slug, tuple(group.keys)): index for index, group in enumerate(groups)}
+
+    dictionary = None
+    if dict_size:
+        samples: List[bytes] = []
+        sampled = 0
+        for record in _iter_records(files):
+            index = group_index[_group_key(record)]
+            line = _encode(record, index, groups[index])
+            samples.append(line)
+            sampled += len(line)
+            if sampled >= DICT_SAMPLE_BYTES:
+                break
+        try:
+            dictionary = zstd.train_dictionary(dict_size, samples, k=DICT_K, d=DICT_D, level=level)
+        except zstd.ZstdError as exc:
+            # Pocos registros: el diccionario no aporta y zstd se niega a entrenarlo.
+            print(f"[WARN] Sin diccionario zstd ({exc}); se comprime sin el.")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for stale in output_dir.glob("shard-*.jsonl.zst"):
+        stale.unlink()
+    dictionary_path = output_dir / DICTIONARY_NAME
+    if dictionary is not None:
+        dictionary_path.write_bytes(dictionary.as_bytes())
+    else:
+        dictionary_path.unlink(missing_ok=True)
+
+    compressor = zstd.ZstdCompressor(level=level, dict_data=dictionary, write_checksum=True)
+    shards: List[dict] = []
+    buffer = io.BytesIO()
+    count = 0
+
+    def flush() -> None:
+        data = buffer.getvalue()
+        if not data:
+            return
+        path = output_dir / f"shard-{len(shards):05d}.jsonl.zst"
+        path.write_bytes(compressor.compress(data))
+        shards.append(
+            {
+                "file": path.name,
+                "first_record": count - data.count(b"\n"),
+                "records": data.count(b"\n"),
+                "sha256": sha256_file(path),
+                "content_sha256": hashlib.sha256(data).hexdigest(),
+            }
+        )
+        buffer.seek(0)
+        buffer.truncate()
+
+    for record in _iter_records(files):
+        index = group_index[_group_key(record)]
+        buffer.write(_encode(record, index, groups[index]))
+        count += 1
+        if count % shard_records == 0:
+            flush()
+    flush()
+
+    header = {
+        "format": COMPACT_FORMAT,
+        "version": COMPACT_VERSION,
+        "records": count,
+        "compression_level": level,
+        "dictionary": None
+        if dictionary is None
+        else {"file": DICTIONARY_NAME, "size": len(dictionary.as_bytes()), "sha256": sha256_file(dictionary_path)},
+        "groups": [{"model_slug": group.model_slug, "keys": group.keys, "shared": group.shared} for group in groups],
+        "shards": shards,
+    }
+    with (output_dir / HEADER_NAME).open("w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    return count
+
+
+def compact_outputs(output_dir: Path) -> List[Path]:
+    """Archivos de un dataset compacto ya escrito (para el manifest de build)."""
+
+    with (output_dir / HEADER_NAME).open(encoding="utf-8") as f:
+        header = json.load(f)
+    paths = [output_dir / HEADER_NAME]
+    if header.get("dictionary"):
+        paths.append(output_dir / header["dictionary"]["file"])
+    paths.extend(output_dir / shard["file"] for shard in header["shards"])
+    return paths
+
+
+class CompactDataset:
+    """Lectura en streaming de un dataset compacto, shard por shard.
+
+    Iterar entrega los registros con la forma de ``data/processed/*.jsonl``; ``get(n)`` solo
+    descomprime el shard que contiene el registro ``n``.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with (path / HEADER_NAME).open(encoding="utf-8") as f:
+            self.header = json.load(f)
+        if self.header.get("format") != COMPACT_FORMAT or self.header.get("version") != COMPACT_VERSION:
+            raise ValueError(f"{path} no es un dataset compacto valido (version {self.header.get('version')}).")
+        self.groups = [Group(**group) for group in self.header["groups"]]
+        self._per_record = [group.per_record for group in self.groups]
+        zstd = _zstd()
+        dictionary = None
+        if self.header["dictionary"]:
+            dictionary = zstd.ZstdCompressionDict((path / self.header["dictionary"]["file"]).read_bytes())
+        self._decompressor = zstd.ZstdDecompressor(dict_data=dictionary)
+
+    def __len__(self) -> int:
+        return self.header["records"]
+
+    def __iter__(self) -> Iterator[dict]:
+        for shard in range(len(self.header["shards"])):
+            yield from self.iter_shard(shard)
+
+    def iter_shard(self, shard: int) -> Iterator[dict]:
+        with (self.path / self.header["shards"][shard]["file"]).open("rb") as f:
+            reader = io.TextIOWrapper(self._decompressor.stream_reader(f), encoding="utf-8")
+            for line in reader:
+                yield self.decode(line)
+
+    def get(self, position: int) -> dict:
+        shards = self.header["shards"]
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        shard = next(index for index, entry in enumerate(shards) if position < entry["first_record"] + entry["records"])
+        for offset, record in enumerate(self.iter_shard(shard)):
+            if offset == position - shards[shard]["first_record"]:
+                return record
+        raise IndexError(position)
+
+    def decode(self, line: str) -> dict:
+        group_index, *values = json.loads(line)
+        group = self.groups[group_index]
+        own = dict(zip(self._per_record[group_index], values))
+        metadata = {key: group.shared[key] if key in group.shared else own[key] for key in group.keys}
+        return {"text": values[-1], "metadata": metadata}
+
+    def verify(self) -> List[str]:
+        """Shards cuyo archivo o contenido no coincide con los hashes del header."""
+
+        failures = []
+        for entry in self.header["shards"]:
+            path = self.path / entry["file"]
+            if not path.exists() or sha256_file(path) != entry["sha256"]:
+                failures.append(entry["file"])
+                continue
+            with path.open("rb") as f:
+                content = self._decompressor.stream_reader(f).read()
+            if hashlib.sha256(content).hexdigest() != entry["content_sha256"]:
+                failures.append(entry["file"])
+        return failures
+
+
+def expand(dataset: CompactDataset, output: Path) -> int:
+    """Reescribe el dataset compacto como JSONL (mismo formato que compile_dataset.py --format jsonl)."""
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with output.open("w", encoding="utf-8") as f:
+        for record in dataset:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    from compile_dataset import COMPILED_PATH
+
+    parser = argparse.ArgumentParser(
+        description="Inspecciona, verifica o expande a JSONL un dataset compacto.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--dataset",
+        type=Path,
+        default=compact_path_for(COMPILED_PATH),
+        help="Directorio del dataset compacto.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("info", help="Muestra registros, grupos, shards y tamanios.")
+    subparsers.add_parser("verify", help="Comprueba los hashes de cada shard.")
+    expand_parser = subparsers.add_parser("expand", help="Reconstruye el JSONL completo.")
+    expand_parser.add_argument("--output", type=Path, required=True, help="Ruta del JSONL de salida.")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    try:
+        dataset = CompactDataset(args.dataset)
+    except FileNotFoundError:
+        print(f"[ERROR] No existe {args.dataset / HEADER_NAME}; compila con --format compact.", file=sys.stderr)
+        return 1
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+
+    if args.command == "info":
+        size = sum(path.stat().st_size for path in compact_outputs(args.dataset))
+        dictionary = dataset.header["dictionary"]
+        print(f"[INFO] {len(dataset)} registros en {len(dataset.header['shards'])} shards, {len(dataset.groups)} grupos")
+        print(f"[INFO] Diccionario: {dictionary['size'] if dictionary else 0} bytes")
+        print(f"[INFO] Tamanio total: {size / 1024:.1f} KiB")
+        return 0
+
+    if args.command == "verify":
+        failures = dataset.verify()
+        for name in failures:
+            print(f"[ERROR] {name} no coincide con header.json", file=sys.stderr)
+        if failures:
+            return 1
+        print(f"[OK] {len(dataset.header['shards'])} shards verificados")
+        return 0
+
+    count = expand(dataset, args.output)
+    print(f"[OK] {count} registros -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
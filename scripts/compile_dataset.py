@@ -6,10 +6,30 @@ import sys
 from pathlib import Path
 from typing import Iterable, List
 
-from utils import filter_manuals, load_manuals_config
+from compact_dataset import (
+    DEFAULT_DICT_SIZE,
+    DEFAULT_LEVEL,
+    DEFAULT_SHARD_RECORDS,
+    compact_outputs,
+    compact_path_for,
+    write_compact,
+)
+from dataset_index import build_index, index_path_for
+from utils import (
+    BuildManifest,
+    StageMetrics,
+    add_metrics_arguments,
+    count_items,
+    filter_manuals,
+    fingerprint,
+    load_manuals_config,
+    sha256_file,
+)
 
 PROCESSED_DIR = Path(__file__).resolve().parents[1] / "data" / "processed"
 COMPILED_PATH = Path(__file__).resolve().parents[1] / "data" / "compiled" / "manuales_compilados.jsonl"
+STAGE = "compile"
+FORMATS = ("jsonl", "compact")
 
 
 def main(argv: Iterable[str] | None = None) -> int:
@@ -28,6 +48,37 @@ def main(argv: Iterable[str] | None = None) -> int:
         nargs="+",
         help="Limita la compilacion a ciertos manuales.",
     )
+    parser.add_argument(
+        "--source",
+        choices=["processed", "deduped"],
+        default="processed",
+        help="Compila desde data/processed o desde la salida de dedup_chunks.py (data/deduped).",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="jsonl",
+        help="jsonl: archivo para Nomic + indice .idx; compact: directorio {output}.compact con shards zstd.",
+    )
+    parser.add_argument(
+        "--shard-records",
+        type=int,
+        default=DEFAULT_SHARD_RECORDS,
+        help="Registros por shard del formato compacto.",
+    )
+    parser.add_argument("--level", type=int, default=DEFAULT_LEVEL, help="Nivel de compresion zstd (formato compacto).")
+    parser.add_argument(
+        "--dict-size",
+        type=int,
+        default=DEFAULT_DICT_SIZE,
+        help="Bytes del diccionario zstd entrenado (0 lo desactiva).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Ignora el manifest de build y recompila aunque no haya cambios.",
+    )
+    add_metrics_arguments(parser)
     args = parser.parse_args(list(argv) if argv is not None else None)
 
     try:
@@ -38,7 +89,7 @@ def main(argv: Iterable[str] | None = None) -> int:
 
     processed_files: List[Path] = []
     for manual in manuals:
-        path = manual.processed_jsonl_path
+        path = manual.deduped_jsonl_path if args.source == "deduped" else manual.processed_jsonl_path
         if not path.exists():
             print(f"[WARN] No existe {path}, omitiendo {manual.display_name}")
             continue
@@ -48,11 +99,66 @@ def main(argv: Iterable[str] | None = None) -> int:
         print("[ERROR] No se encontraron archivos procesados para compilar.", file=sys.stderr)
         return 1
 
-    total_lines = concatenate_files(processed_files, args.output)
-    print(f"[OK] Dataset compilado con {total_lines} lineas -> {args.output}")
+    with StageMetrics.from_args(STAGE, args) as metrics, metrics.manual(args.output.name) as record:
+        if not compile_files(
+            processed_files,
+            args.output,
+            BuildManifest.load(),
+            force=args.force,
+            output_format=args.format,
+            shard_records=args.shard_records,
+            level=args.level,
+            dict_size=args.dict_size,
+        ):
+            record.status = "skip"
     return 0
 
 
+def compile_files(
+    files: List[Path],
+    output: Path,
+    manifest: BuildManifest,
+    force: bool = False,
+    output_format: str = "jsonl",
+    shard_records: int = DEFAULT_SHARD_RECORDS,
+    level: int = DEFAULT_LEVEL,
+    dict_size: int = DEFAULT_DICT_SIZE,
+) -> bool:
+    """Concatena ``files`` en ``output`` y escribe su indice. Retorna False si ya estaba al dia.
+
+    Con ``output_format="compact"`` escribe en cambio el directorio ``{output}.compact``.
+    """
+
+    sources = [(path.parent.name, path.name, sha256_file(path)) for path in files]
+    if output_format == "compact":
+        inputs = fingerprint(sources, output_format, shard_records, level, dict_size)
+        target = compact_path_for(output).name
+    else:
+        inputs = fingerprint(sources)
+        target = output.name
+    if not force and manifest.is_fresh(STAGE, target, inputs):
+        print(f"[SKIP] {target} ya esta al dia con los JSONL procesados")
+        return False
+
+    if output_format == "compact":
+        output_dir = compact_path_for(output)
+        total_records = write_compact(files, output_dir, shard_records, level, dict_size)
+        outputs = compact_outputs(output_dir)
+        manifest.record(STAGE, target, inputs, outputs)
+        count_items("lines", total_records)
+        size = sum(path.stat().st_size for path in outputs)
+        print(f"[OK] Dataset compacto con {total_records} registros ({size / 1024:.1f} KiB) -> {output_dir}")
+        return True
+
+    total_lines = concatenate_files(files, output)
+    index_path = index_path_for(output)
+    build_index(output, index_path)
+    manifest.record(STAGE, target, inputs, [output, index_path])
+    print(f"[OK] Dataset compilado con {total_lines} lineas -> {output}")
+    print(f"[OK] Indice de offsets por chunk_id -> {index_path}")
+    return True
+
+
 def concatenate_files(files: List[Path], output: Path) -> int:
     output.parent.mkdir(parents=True, exist_ok=True)
     total_lines = 0
@@ -66,6 +172,7 @@ def concatenate_files(files: List[Path], output: Path) -> int:
                     out_f.write(line.rstrip("\n") + "\n")
                     total_lines += 1
 
+    count_items("lines", total_lines)
     return total_lines
 
 
@@ -0,0 +1,123 @@
+"""Empaquetado del contexto del chat dentro de un presupuesto de tokens.
+
+``build_prompt`` reproduce el texto de ``buildPrompt`` (server/src/services/promptBuilder.ts).
+``pack_context`` elige, entre los chunks recuperados, el subconjunto de mayor valor cuyo
+prompt completo cabe en ``budget`` tokens (mochila 0/1 exacta), usando el ``token_count``
+guardado por ``chunk_manuals.py`` cuando fue calculado con el mismo tokenizer.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from token_counter import Tokenizer
+
+NO_CONTEXT = "No se entrego contexto relevante."
+
+
+@dataclass
+class PackedContext:
+    chunks: List[dict]
+    prompt_tokens: int
+    dropped: int
+
+
+def build_prompt(question: str, chunks: Sequence[dict]) -> str:
+    """Mismo texto que ``buildPrompt`` (promptBuilder.ts)."""
+
+    blocks = [context_block(chunk, index) for index, chunk in enumerate(chunks, start=1)]
+    return "\n".join(
+        [
+            "Eres un asistente de soporte de Tesla.",
+            "Tu tarea es responder preguntas de los usuarios de manera clara, precisa yamigable, como lo haría una persona experta.",
+            "No muestres directamente los fragmentos de los manuales, pero utiliza su información como contexto para elaborar la respuesta.",
+            "Contexto:",
+            "\n\n".join(blocks) or NO_CONTEXT,
+            "",
+            f"Pregunta: {question}",
+        ]
+    )
+
+
+def context_block(chunk: dict, index: int) -> str:
+    return f"{context_header(chunk['metadata'], index)}\n{chunk['text'].strip()}"
+
+
+def context_header(metadata: dict, index: int) -> str:
+    model_name = metadata.get("model_name") or metadata.get("model_slug") or "Manual Tesla"
+    document_title = metadata.get("document_title") or model_name
+    pages = page_range_label(metadata.get("page_start"), metadata.get("page_end"))
+    label = f"{document_title} ({pages})" if pages else document_title
+    return f"(R{index}) {label}"
+
+
+def page_range_label(start, end) -> Optional[str]:
+    if isinstance(start, int) and isinstance(end, int):
+        return f"pag. {start}" if start == end else f"pags. {start}-{end}"
+    if isinstance(start, int):
+        return f"pag. {start}"
+    if isinstance(end, int):
+        return f"pag. {end}"
+    return None
+
+
+def chunk_tokens(chunk: dict, tokenizer: Tokenizer) -> int:
+    """Tokens del texto del chunk; reutiliza ``token_count`` si lo conto el mismo tokenizer."""
+
+    metadata = chunk.get("metadata", {})
+    if metadata.get("tokenizer") == tokenizer.name and isinstance(metadata.get("token_count"), int):
+        return metadata["token_count"]
+    return tokenizer.count(chunk["text"].strip())
+
+
+def pack_context(
+    question: str,
+    chunks: Sequence[dict],
+    budget: int,
+    tokenizer: Tokenizer,
+    values: Optional[Sequence[float]] = None,
+) -> PackedContext:
+    """Subconjunto de ``chunks`` (en su orden original) que maximiza ``values`` sin pasar ``budget``.
+
+    ``values`` por defecto premia el orden de recuperacion (1, 1/2, 1/3, ...). El costo de
+    cada chunk incluye su encabezado ``(Rn) titulo (pags.)`` con el n de su posicion
+    original, que es una cota superior del que tendra en el prompt final.
+    """
+
+    fixed = tokenizer.count(build_prompt(question, [])) - tokenizer.count(NO_CONTEXT)
+    separator = tokenizer.count("\n\n")
+    costs = [
+        tokenizer.count(context_header(chunk["metadata"], position) + "\n") + chunk_tokens(chunk, tokenizer) + separator
+        for position, chunk in enumerate(chunks, start=1)
+    ]
+    if values is None:
+        values = [1 / position for position in range(1, len(chunks) + 1)]
+
+    picked = knapsack(costs, values, budget - fixed)
+    selected = [chunks[index] for index in picked]
+    return PackedContext(
+        chunks=selected,
+        prompt_tokens=tokenizer.count(build_prompt(question, selected)),
+        dropped=len(chunks) - len(selected),
+    )
+
+
+def knapsack(costs: Sequence[int], values: Sequence[float], capacity: int) -> Tuple[int, ...]:
+    """Mochila 0/1 exacta con frontera de Pareto (costo, valor); retorna los indices elegidos.
+
+    Con los ~10-30 chunks de una consulta la frontera es chica, asi que no depende del
+    tamanio del presupuesto como la tabla clasica de programacion dinamica.
+    """
+
+    states: List[Tuple[int, float, Tuple[int, ...]]] = [(0, 0.0, ())]
+    for index, (cost, value) in enumerate(zip(costs, values)):
+        if cost > capacity or value <= 0:
+            continue
+        extended = [(used + cost, total + value, picked + (index,)) for used, total, picked in states if used + cost <= capacity]
+        frontier: List[Tuple[int, float, Tuple[int, ...]]] = []
+        for state in sorted(states + extended, key=lambda item: (item[0], -item[1])):
+            if not frontier or state[1] > frontier[-1][1]:
+                frontier.append(state)
+        states = frontier
+    return states[-1][2]
@@ -0,0 +1,132 @@
+"""Recorte del contexto del chat a las oraciones que tocan la pregunta.
+
+``chunk_manuals.py`` guarda, por manual, los limites de las oraciones de cada chunk y sus
+terminos normalizados (mismos ``extract_terms`` que chat.ts) en ``{slug}.sentences`` (ver
+``sentence_index.py``). ``trim_context`` cruza esos terminos con los de la pregunta y deja,
+de cada chunk, las oraciones que comparten algun termino mas ``neighbors`` oraciones a cada
+lado, sin volver a segmentar ni normalizar el texto. Los chunks que no estan en el indice
+(o cuyo texto no coincide) se segmentan al vuelo.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+from sentence_index import SentenceIndex
+from text_splitter import sentence_bounds, sentence_terms
+from utils import extract_terms
+
+GAP = " [...] "
+DEFAULT_NEIGHBORS = 1
+# Campos que dejan de corresponder al texto recortado.
+STALE_FIELDS = ("token_count",)
+
+
+@dataclass
+class TrimmedContext:
+    chunks: List[dict]
+    chars_before: int
+    chars_after: int
+    sentences_kept: int
+    sentences_total: int
+
+
+def chunk_sentences(chunk: dict, index: Optional[SentenceIndex] = None) -> Tuple[List[int], List[FrozenSet[str]]]:
+    """Limites y terminos de las oraciones del chunk; usa ``index`` si tiene el chunk y corresponde al texto."""
+
+    text = chunk["text"]
+    chunk_id = chunk.get("metadata", {}).get("chunk_id")
+    stored = index.get(chunk_id) if index is not None and isinstance(chunk_id, str) else None
+    if stored is not None and stored[0][:1] == [0] and stored[0][-1] == len(text):
+        return stored
+    bounds = sentence_bounds(text)
+    return bounds, [frozenset(item.split()) for item in sentence_terms(text, bounds)]
+
+
+def trim_context(
+    question: str,
+    chunks: Sequence[dict],
+    max_chars: int = 0,
+    neighbors: int = DEFAULT_NEIGHBORS,
+    index: Optional[SentenceIndex] = None,
+) -> TrimmedContext:
+    """Deja de cada chunk las oraciones con terminos de la pregunta y sus vecinas.
+
+    Con ``max_chars`` > 0 las oraciones conservadas (sumando todos los chunks, sin contar
+    los marcadores ``GAP``) no pasan de ese largo: se toman primero las oraciones con mas
+    terminos en comun y, a igualdad, las de chunks mejor ubicados; si la ventana completa
+    no cabe se intenta solo la oracion. Los chunks sin oraciones con terminos en comun se
+    descartan; con ``max_chars`` el presupuesto que sobra puede ir a su primera oracion.
+    Cada chunk mantiene el orden original de sus oraciones y los saltos se marcan con
+    ``GAP``; los que se quedan sin oraciones se descartan. ``index`` (ver
+    ``SentenceIndex.from_manuals``) evita segmentar los chunks de ``data/processed``.
+    """
+
+    terms = set(extract_terms(question))
+    if not terms:
+        size = sum(len(chunk["text"]) for chunk in chunks)
+        return TrimmedContext(list(chunks), size, size, 0, 0)
+
+    sentences = [chunk_sentences(chunk, index) for chunk in chunks]
+    # Cola de candidatos: (terminos en comun, posicion del chunk, oracion) -> ventana a agregar.
+    queue: List[Tuple[Tuple[int, int, int], List[int]]] = []
+    for position, (bounds, sentence_sets) in enumerate(sentences):
+        total = len(sentence_sets)
+        matched = [sentence for sentence, words in enumerate(sentence_sets) if words & terms]
+        for sentence in matched:
+            window = list(range(max(0, sentence - neighbors), min(total, sentence + neighbors + 1)))
+            queue.append(((-len(sentence_sets[sentence] & terms), position, sentence), window))
+        if not matched and total and max_chars:
+            queue.append(((1, position, 0), [0]))
+    queue.sort(key=lambda item: item[0])
+
+    kept: Dict[int, Set[int]] = {position: set() for position in range(len(chunks))}
+    used = 0
+    for (_, position, sentence), window in queue:
+        bounds = sentences[position][0]
+        text = chunks[position]["text"]
+        for candidate in (window, [sentence]):
+            missing = [item for item in candidate if item not in kept[position]]
+            cost = sum(len(text[bounds[item] : bounds[item + 1]].strip()) + 1 for item in missing)
+            if not max_chars or used + cost <= max_chars:
+                kept[position].update(missing)
+                used += cost
+                break
+    if not any(kept.values()) and queue:
+        # Ni la mejor oracion cabe en el presupuesto: se conserva igual para no dejar el prompt vacio.
+        _, position, sentence = queue[0][0]
+        kept[position].add(sentence)
+
+    trimmed: List[dict] = []
+    for position, chunk in enumerate(chunks):
+        if not kept[position]:
+            continue
+        bounds = sentences[position][0]
+        text = trim_text(chunk["text"], bounds, sorted(kept[position]))
+        metadata = {key: value for key, value in chunk.get("metadata", {}).items() if key not in STALE_FIELDS}
+        metadata["char_count"] = len(text)
+        trimmed.append({**chunk, "text": text, "metadata": metadata})
+
+    return TrimmedContext(
+        chunks=trimmed,
+        chars_before=sum(len(chunk["text"]) for chunk in chunks),
+        chars_after=sum(len(chunk["text"]) for chunk in trimmed),
+        sentences_kept=sum(len(indexes) for indexes in kept.values()),
+        sentences_total=sum(len(bounds) - 1 for bounds, _ in sentences),
+    )
+
+
+def trim_text(text: str, bounds: Sequence[int], indexes: Sequence[int]) -> str:
+    """Oraciones ``indexes`` (ordenadas) de ``text``; los tramos consecutivos se copian tal cual."""
+
+    runs: List[Tuple[int, int]] = []
+    for index in indexes:
+        if runs and runs[-1][1] == index:
+            runs[-1] = (runs[-1][0], index + 1)
+        else:
+            runs.append((index, index + 1))
+    pieces = [text[bounds[first] : bounds[last]].strip() for first, last in runs]
+    prefix = GAP.lstrip() if runs[0][0] > 0 else ""
+    suffix = GAP.rstrip() if runs[-1][1] < len(bounds) - 1 else ""
+    return prefix + GAP.join(pieces) + suffix
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from binfmt import le_bytes, pad, padding, unpack_header
+from utils import ChunkIdAssigner, ensure_directory
+
+# Formato del indice (.idx), todo en little-endian:
+#   header   <4sHHQQII  magic, version, reservado, n_registros, bytes del JSONL, bytes tabla slugs, padding
+#   slugs    nombres UTF-8 separados por "\n" (posicion = codigo de slug), alineado a 8 bytes
+#   columnas ordenadas por chunk_id:
+#            ids u64[n] | offsets u64[n] | lengths u32[n] | chunk_index u32[n] | slug u16[n] (+ padding)
+#   posiciones u32[n]: permutacion de las filas ordenada por (slug, chunk_index)
+INDEX_MAGIC = b"T3CI"
+INDEX_VERSION = 1
+_HEADER = struct.Struct("<4sHHQQII")
+
+
+def index_path_for(jsonl_path: Path) -> Path:
+    return jsonl_path.with_suffix(".idx")
+
+
+def build_index(jsonl_path: Path, index_path: Optional[Path] = None) -> int:
+    """Recorre el JSONL compilado y escribe el indice binario de offsets. Retorna la cantidad de registros."""
+
+    index_path = index_path or index_path_for(jsonl_path)
+    rows: List[Tuple[int, int, int, int, int]] = []
+    slug_codes: Dict[str, int] = {}
+    fallback_ids = ChunkIdAssigner()
+
+    offset = 0
+    with jsonl_path.open("rb") as f:
+        for line in f:
+            length = len(line.rstrip(b"\r\n"))
+            if line.strip():
+                record = json.loads(line)
+                metadata = record.get("metadata", {})
+                slug = metadata.get("model_slug") or metadata.get("model_key") or ""
+                chunk_id = metadata.get("chunk_id") or fallback_ids.assign(slug, record.get("text", ""))
+                code = slug_codes.setdefault(slug, len(slug_codes))
+                rows.append((int(chunk_id, 16), offset, length, int(metadata.get("chunk_index", 0)), code))
+            offset += len(line)
+    data_size = offset
+
+    rows.sort()
+    for previous, current in zip(rows, rows[1:]):
+        if previous[0] == current[0]:
+            raise ValueError(f"chunk_id duplicado en {jsonl_path.name}: {current[0]:016x}")
+
+    positions = sorted(range(len(rows)), key=lambda row: (rows[row][4], rows[row][3]))
+    slug_table = "\n".join(sorted(slug_codes, key=slug_codes.get)).encode("utf-8")
+
+    ensure_directory(index_path)
+    temp_path = index_path.with_suffix(".idx.tmp")
+    with temp_path.open("wb") as out:
+        out.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, len(rows), data_size, len(slug_table), 0))
+        out.write(pad(slug_table))
+        for column, typecode in ((0, "Q"), (1, "Q"), (2, "I"), (3, "I"), (4, "H")):
+            out.write(pad(le_bytes(array(typecode, (row[column] for row in rows)))))
+        out.write(pad(le_bytes(array("I", positions))))
+    temp_path.replace(index_path)
+    return len(rows)
+
+
+class CompiledDataset:
+    """Acceso aleatorio al JSONL compilado a traves del indice binario (ambos via mmap).
+
+    Solo se parsean los registros pedidos: ``get`` busca el chunk_id por biseccion,
+    ``get_by_position`` busca ``(model_slug, chunk_index)`` y ``get_many`` lee los
+    registros en orden de offset para aprovechar lecturas secuenciales.
+    """
+
+    def __init__(self, jsonl_path: Path, index_path: Optional[Path] = None):
+        self.jsonl_path = jsonl_path
+        self.index_path = index_path or index_path_for(jsonl_path)
+
+        self._index_file = self.index_path.open("rb")
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _, _, _, count, data_size, slug_bytes, _ = unpack_header(
+                _HEADER, self._index, INDEX_MAGIC, INDEX_VERSION, "indice compilado", self.index_path.name
+            )
+        except (RuntimeError, ValueError):
+            self.close()
+            raise
+
+        self._data_file = self.jsonl_path.open("rb")
+        if self.jsonl_path.stat().st_size != data_size:
+            self.close()
+            raise ValueError(
+                f"El indice {self.index_path.name} no corresponde a {self.jsonl_path.name}; vuelve a compilar."
+            )
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) if data_size else b""
+
+        cursor = _HEADER.size
+        slug_table = bytes(self._index[cursor : cursor + slug_bytes]).decode("utf-8")
+        self.slugs: List[str] = slug_table.split("\n") if slug_table else []
+        self._slug_codes = {slug: code for code, slug in enumerate(self.slugs)}
+        cursor += slug_bytes + padding(slug_bytes)
+
+        view = self._view = memoryview(self._index)
+        columns = []
+        for typecode, width in (("Q", 8), ("Q", 8), ("I", 4), ("I", 4), ("H", 2), ("I", 4)):
+            size = count * width
+            columns.append(view[cursor : cursor + size].cast(typecode))
+            cursor += size + padding(size)
+        self._ids, self._offsets, self._lengths, self._chunk_indexes, self._slug_column, self._positions = columns
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return self._row_for_id(chunk_id) is not None
+
+    def __enter__(self) -> "CompiledDataset":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for name in ("_ids", "_offsets", "_lengths", "_chunk_indexes", "_slug_column", "_positions", "_view"):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+                setattr(self, name, None)
+        for name in ("_data", "_index"):
+            handle = getattr(self, name, None)
+            if isinstance(handle, mmap.mmap):
+                handle.close()
+        for name in ("_data_file", "_index_file"):
+            handle = getattr(self, name, None)
+            if handle is not None:
+                handle.close()
+
+    def ids(self) -> Iterator[str]:
+        """chunk_ids del dataset, en orden del indice."""
+
+        return (f"{value:016x}" for value in self._ids)
+
+    def get(self, chunk_id: str) -> dict:
+        row = self._row_for_id(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        return self._read_row(row)
+
+    def get_by_position(self, model_slug: str, chunk_index: int) -> dict:
+        code = self._slug_codes.get(model_slug)
+        if code is None:
+            raise KeyError((model_slug, chunk_index))
+        target = (code, chunk_index)
+        index = bisect_left(self._positions, target, key=self._position_key)
+        if index == self._count or self._position_key(self._positions[index]) != target:
+            raise KeyError((model_slug, chunk_index))
+        return self._read_row(self._positions[index])
+
+    def get_many(self, chunk_ids: Iterable[str]) -> List[dict]:
+        """Lee varios chunks en una pasada ordenada por offset; respeta el orden de entrada."""
+
+        requested = list(chunk_ids)
+        rows = []
+        for chunk_id in requested:
+            row = self._row_for_id(chunk_id)
+            if row is None:
+                raise KeyError(chunk_id)
+            rows.append(row)
+        records = {row: self._read_row(row) for row in sorted(set(rows), key=self._offsets.__getitem__)}
+        return [records[row] for row in rows]
+
+    def _row_for_id(self, chunk_id: str) -> Optional[int]:
+        try:
+            value = int(chunk_id, 16)
+        except (TypeError, ValueError):
+            return None
+        index = bisect_left(self._ids, value)
+        if index < self._count and self._ids[index] == value:
+            return index
+        return None
+
+    def _position_key(self, row: int) -> Tuple[int, int]:
+        return self._slug_column[row], self._chunk_indexes[row]
+
+    def _read_row(self, row: int) -> dict:
+        start = self._offsets[row]
+        return json.loads(self._data[start : start + self._lengths[row]])
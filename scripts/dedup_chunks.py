@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import argparse
+import inspect
+import json
+import sys
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from utils import (
+    CITATION_FIELDS,
+    DATA_DIR,
+    BuildManifest,
+    ChunkIdAssigner,
+    ManualConfig,
+    StageMetrics,
+    add_metrics_arguments,
+    count_items,
+    ensure_directory,
+    filter_manuals,
+    fingerprint,
+    iter_jsonl,
+    load_manuals_config,
+    normalize_plain,
+    sha256_file,
+)
+
+STAGE = "dedup"
+DEDUP_REPORT_NAME = "dedup_report.json"
+
+NUM_PERM = 128
+BANDS = 16  # 16 bandas x 8 filas: umbral LSH efectivo ~0.71
+SHINGLE_WORDS = 4
+_MASK64 = (1 << 64) - 1
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_SHINGLE_MULTIPLIERS = np.array(
+    [0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53, 0x94D049BB133111EB, 0xBF58476D1CE4E5B9], dtype=np.uint64
+)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Detecta chunks casi duplicados entre manuales (MinHash + LSH) y deja uno canonico.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        help="Filtra manuales por key/slug/nombre. Ej: --only model_s model_x",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.8,
+        help="Similitud Jaccard estimada minima para considerar dos chunks duplicados.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Ignora el manifest de build y deduplica aunque los JSONL procesados no hayan cambiado.",
+    )
+    add_metrics_arguments(parser)
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    try:
+        manuals = filter_manuals(load_manuals_config(), args.only)
+        with StageMetrics.from_args(STAGE, args) as metrics, metrics.manual(STAGE) as record:
+            report = dedup_if_stale(manuals, BuildManifest.load(), threshold=args.threshold, force=args.force)
+            if report is None:
+                record.status = "skip"
+    except FileNotFoundError as exc:
+        print(f"[ERROR] No se encontro el JSONL procesado: {exc.filename}", file=sys.stderr)
+        return 1
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+
+    if report is None:
+        print(f"[SKIP] Deduplicacion al dia con los JSONL procesados ({dedup_report_path(manuals)})")
+        return 0
+    for slug, stats in report["manuals"].items():
+        print(f"[OK] {slug}: {stats['kept']}/{stats['total']} chunks canonicos")
+    print(
+        f"[OK] {report['total_chunks']} chunks -> {report['canonical_chunks']} canonicos "
+        f"(ratio de deduplicacion {report['dedup_ratio']:.1%})"
+    )
+    return 0
+
+
+def dedup_report_path(manuals: Sequence[ManualConfig]) -> Path:
+    """``deduped/dedup_report.json`` dentro del ``data_dir`` de los manuales."""
+
+    data_dir = manuals[0].data_dir if manuals else DATA_DIR
+    return data_dir / "deduped" / DEDUP_REPORT_NAME
+
+
+def dedup_inputs_fingerprint(manuals: Sequence[ManualConfig], threshold: float) -> str:
+    """Hash de los JSONL procesados, los parametros y el codigo de MinHash/LSH."""
+
+    rules = [shingle_hashes, minhash_signatures, near_duplicate_groups, dedup_manuals]
+    return fingerprint(
+        [(manual.slug, sha256_file(manual.processed_jsonl_path)) for manual in manuals],
+        threshold,
+        NUM_PERM,
+        BANDS,
+        SHINGLE_WORDS,
+        [inspect.getsource(rule) for rule in rules],
+    )
+
+
+def dedup_if_stale(
+    manuals: Sequence[ManualConfig],
+    manifest: BuildManifest,
+    threshold: float = 0.8,
+    force: bool = False,
+) -> Optional[dict]:
+    """Deduplica salvo que el manifest diga que las salidas estan al dia (entonces retorna None)."""
+
+    inputs = dedup_inputs_fingerprint(manuals, threshold)
+    target = ",".join(manual.slug for manual in manuals)
+    if not force and manifest.is_fresh(STAGE, target, inputs):
+        return None
+    report = dedup_manuals(manuals, threshold=threshold)
+    outputs = [manual.deduped_jsonl_path for manual in manuals] + [dedup_report_path(manuals)]
+    manifest.record(STAGE, target, inputs, outputs)
+    return report
+
+
+@dataclass
+class _Chunk:
+    manual: ManualConfig
+    record: dict
+
+
+def dedup_manuals(manuals: Sequence[ManualConfig], threshold: float = 0.8) -> dict:
+    """Deduplica los JSONL procesados y escribe data/deduped/{slug}.jsonl mas un reporte."""
+
+    chunks: List[_Chunk] = []
+    for manual in manuals:
+        fallback_ids = ChunkIdAssigner()
+        for record in iter_jsonl(manual.processed_jsonl_path):
+            metadata = record.setdefault("metadata", {})
+            metadata.setdefault("chunk_id", fallback_ids.assign(manual.slug, record.get("text", "")))
+            chunks.append(_Chunk(manual, record))
+    count_items("chunks", len(chunks))
+
+    signatures = minhash_signatures([chunk.record.get("text", "") for chunk in chunks])
+    groups = near_duplicate_groups(signatures, threshold=threshold)
+
+    # El canonico es el primero en orden de configuracion / chunk_index (los indices ya vienen asi).
+    canonical_of = {member: group[0] for group in groups for member in group}
+    members_of: Dict[int, List[int]] = {}
+    for member, canonical in canonical_of.items():
+        members_of.setdefault(canonical, []).append(member)
+
+    per_manual: Dict[str, dict] = {manual.slug: {"total": 0, "kept": 0} for manual in manuals}
+    outputs = {manual.slug: [] for manual in manuals}
+    for position, chunk in enumerate(chunks):
+        stats = per_manual[chunk.manual.slug]
+        stats["total"] += 1
+        if canonical_of.get(position, position) != position:
+            continue
+        stats["kept"] += 1
+        occurrences = [chunks[member] for member in sorted(members_of.get(position, [position]))]
+        metadata = chunk.record["metadata"]
+        metadata["model_slugs"] = list(dict.fromkeys(item.record["metadata"].get("model_slug") for item in occurrences))
+        # Cita de cada aparicion: el backend la usa cuando el chunk entra por otro modelo.
+        metadata["appears_in"] = [
+            {
+                "chunk_id": item.record["metadata"].get("chunk_id"),
+                **{field: item.record["metadata"].get(field) for field in CITATION_FIELDS},
+            }
+            for item in occurrences
+        ]
+        outputs[chunk.manual.slug].append(chunk.record)
+
+    for manual in manuals:
+        path = manual.deduped_jsonl_path
+        ensure_directory(path)
+        with path.open("w", encoding="utf-8") as f:
+            for record in outputs[manual.slug]:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    total = len(chunks)
+    kept = sum(stats["kept"] for stats in per_manual.values())
+    report = {
+        "threshold": threshold,
+        "num_perm": NUM_PERM,
+        "bands": BANDS,
+        "total_chunks": total,
+        "canonical_chunks": kept,
+        "dedup_ratio": (1 - kept / total) if total else 0.0,
+        "duplicate_groups": sum(1 for group in groups if len(group) > 1),
+        "manuals": per_manual,
+    }
+    count_items("canonical", kept)
+    report_path = dedup_report_path(manuals)
+    ensure_directory(report_path)
+    with report_path.open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+class _WordKeys(dict):
+    """Cache palabra -> hash de 64 bits; cada palabra distinta se hashea una sola vez."""
+
+    def __missing__(self, word: str) -> int:
+        key = self[word] = ((zlib.crc32(word.encode("utf-8")) + 1) * int(_GOLDEN)) & _MASK64
+        return key
+
+
+def shingle_hashes(texts: Sequence[str]) -> List[np.ndarray]:
+    """Hashes de 64 bits de los n-gramas de palabras normalizadas de cada texto.
+
+    El hash de un shingle es una combinacion lineal (uint64 con desborde) de los hashes
+    de sus palabras, calculada con NumPy sobre ventanas deslizantes.
+    """
+
+    word_keys = _WordKeys()
+    hashes: List[np.ndarray] = []
+    for text in texts:
+        keys = np.fromiter(map(word_keys.__getitem__, normalize_plain(text).split()), dtype=np.uint64)
+        if len(keys) <= SHINGLE_WORDS:
+            # Texto corto: un unico shingle con todas sus palabras.
+            hashes.append(np.array([(keys * _SHINGLE_MULTIPLIERS[: len(keys)]).sum()], dtype=np.uint64))
+            continue
+        windows = len(keys) - SHINGLE_WORDS + 1
+        combined = keys[:windows] * _SHINGLE_MULTIPLIERS[0]
+        for offset in range(1, SHINGLE_WORDS):
+            combined += keys[offset : offset + windows] * _SHINGLE_MULTIPLIERS[offset]
+        hashes.append(combined)
+    return hashes
+
+
+def minhash_signatures(texts: Sequence[str], num_perm: int = NUM_PERM) -> np.ndarray:
+    """Firmas MinHash (len(texts) x num_perm) con one-permutation hashing densificado.
+
+    En lugar de aplicar ``num_perm`` permutaciones a cada shingle, se mezcla cada hash una
+    sola vez: los bits altos eligen una de ``num_perm`` celdas y el resto es el valor que
+    compite por el minimo de esa celda. Las celdas vacias toman el valor de la siguiente
+    celda no vacia (densificacion circular), lo que mantiene el estimador de Jaccard.
+    """
+
+    if num_perm & (num_perm - 1):
+        raise ValueError("num_perm debe ser potencia de 2.")
+    bin_bits = np.uint64(num_perm.bit_length() - 1)
+    empty = np.uint64(np.iinfo(np.uint64).max)
+
+    per_doc = shingle_hashes(texts)
+    lengths = np.fromiter((len(hashes) for hashes in per_doc), dtype=np.int64, count=len(per_doc))
+    if not len(per_doc):
+        return np.zeros((0, num_perm), dtype=np.uint32)
+    mixed = _mix64(np.concatenate(per_doc))
+    docs = np.repeat(np.arange(len(per_doc), dtype=np.uint64), lengths)
+
+    cells = (docs << bin_bits) + (mixed >> (np.uint64(64) - bin_bits))
+    signatures = np.full(len(per_doc) * num_perm, empty, dtype=np.uint64)
+    np.minimum.at(signatures, cells, mixed & np.uint64((1 << 32) - 1))
+    signatures = signatures.reshape(len(per_doc), num_perm)
+
+    # Densificacion: indice de la siguiente celda no vacia (circular) via minimo acumulado inverso.
+    doubled = np.concatenate([signatures, signatures], axis=1)
+    positions = np.where(doubled != empty, np.arange(2 * num_perm), 2 * num_perm)
+    next_filled = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :num_perm]
+    filled = np.take_along_axis(doubled, np.minimum(next_filled, 2 * num_perm - 1), axis=1)
+    return filled.astype(np.uint32)
+
+
+def near_duplicate_groups(signatures: np.ndarray, threshold: float = 0.8, bands: int = BANDS) -> List[List[int]]:
+    """Agrupa documentos cuya similitud estimada supera ``threshold`` (LSH por bandas + union-find).
+
+    Union-find encadena pares (A~B, B~C) aunque A y C no se parezcan; por eso cada grupo se
+    parte despues de modo que todos sus miembros superen ``threshold`` contra el primero,
+    que es el que queda como canonico.
+    """
+
+    count, num_perm = signatures.shape
+    rows = num_perm // bands
+    candidates: List[np.ndarray] = []
+    for band in range(bands):
+        keys = np.zeros(count, dtype=np.uint64)
+        for column in range(band * rows, (band + 1) * rows):
+            keys = keys * _GOLDEN + signatures[:, column].astype(np.uint64)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        same_as_previous = np.concatenate(([False], sorted_keys[1:] == sorted_keys[:-1]))
+        if not same_as_previous.any():
+            continue
+        # Por bucket: pares contra el primer miembro (estrella) y entre vecinos consecutivos (cadena).
+        bucket_first = order[np.maximum.accumulate(np.where(same_as_previous, 0, np.arange(count)))]
+        members = order[same_as_previous]
+        previous = order[np.flatnonzero(same_as_previous) - 1]
+        candidates.append(np.minimum(bucket_first[same_as_previous], members) * count + np.maximum(bucket_first[same_as_previous], members))
+        candidates.append(np.minimum(previous, members) * count + np.maximum(previous, members))
+
+    parent = list(range(count))
+
+    def find(node: int) -> int:
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    if candidates:
+        codes = np.unique(np.concatenate(candidates))
+        first, other = codes // count, codes % count
+        keep = first != other
+        first, other = first[keep], other[keep]
+        agreement = (signatures[first] == signatures[other]).mean(axis=1)
+        for a, b in zip(first[agreement >= threshold].tolist(), other[agreement >= threshold].tolist()):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups: Dict[int, List[int]] = {}
+    for doc in range(count):
+        groups.setdefault(find(doc), []).append(doc)
+
+    verified: List[List[int]] = []
+    for group in groups.values():
+        pending = np.array(group)
+        while len(pending):
+            close = (signatures[pending] == signatures[pending[0]]).mean(axis=1) >= threshold
+            verified.append(pending[close].tolist())
+            pending = pending[~close]
+    verified.sort(key=lambda group: group[0])
+    return verified
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """Finalizador splitmix64: dispersa bien los bits de hashes de 64 bits."""
+
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,21 +1,34 @@
 from __future__ import annotations
 
 import argparse
+import json
+import random
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable
+from typing import Dict, Iterable, Optional
 
 import requests
 from tqdm import tqdm
 
 from utils import (
+    BuildManifest,
     ManualConfig,
+    StageMetrics,
+    add_metrics_arguments,
+    count_items,
     ensure_directory,
     filter_manuals,
+    fingerprint,
     load_manuals_config,
     read_headers_from_env_or_file,
 )
 
+STAGE = "download"
+
 
 def main(argv: Iterable[str] | None = None) -> int:
     parser = argparse.ArgumentParser(
@@ -30,7 +43,12 @@ def main(argv: Iterable[str] | None = None) -> int:
     parser.add_argument(
         "--force",
         action="store_true",
-        help="Fuerza la descarga incluso si el archivo ya existe.",
+        help="Descarga todo de nuevo, sin GET condicional aunque haya ETag/Last-Modified guardados.",
+    )
+    parser.add_argument(
+        "--ignore-validators",
+        action="store_true",
+        help="Igual que --force: no envia If-None-Match/If-Modified-Since y descarga todo de nuevo.",
     )
     parser.add_argument(
         "--headers-file",
@@ -42,9 +60,36 @@ def main(argv: Iterable[str] | None = None) -> int:
         default=90,
         help="Timeout por request en segundos.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Descargas simultaneas.",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="Reintentos por manual; cada reintento reanuda desde el .tmp parcial (HTTP Range).",
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=1.0,
+        help="Espera base en segundos antes de reanudar; se duplica en cada reintento.",
+    )
+    parser.add_argument(
+        "--standin",
+        action="store_true",
+        help="No descarga los manuales: comprueba reanudacion y GET condicional contra un stand-in local.",
+    )
+    add_metrics_arguments(parser)
 
     args = parser.parse_args(list(argv) if argv is not None else None)
 
+    if args.standin:
+        return check_against_standin(args.timeout)
+
     try:
         manuals = filter_manuals(load_manuals_config(), args.only)
     except Exception as exc:
@@ -52,30 +97,155 @@ def main(argv: Iterable[str] | None = None) -> int:
         return 1
 
     headers = read_headers_from_env_or_file(args.headers_file)
-    session = requests.Session()
-    session.headers.update(headers)
+    sessions = ThreadLocalSessions(headers)
+    manifest = BuildManifest.load()
+    metrics = StageMetrics.from_args(STAGE, args)
 
-    for manual in manuals:
+    def run(position: int, manual: ManualConfig) -> Optional[str]:
         try:
-            download_manual(session, manual, force=args.force, timeout=args.timeout)
+            with metrics.manual(manual.slug) as record:
+                downloaded = download_manual(
+                    sessions.get(),
+                    manual,
+                    force=args.force or args.ignore_validators,
+                    timeout=args.timeout,
+                    manifest=manifest,
+                    retries=args.retries,
+                    backoff=args.backoff,
+                    progress_position=position,
+                )
+                if not downloaded:
+                    record.status = "skip"
         except Exception as exc:
-            print(f"[ERROR] {manual.display_name}: {exc}", file=sys.stderr)
-            return 1
+            return f"{manual.display_name}: {exc}"
+        return None
 
-    return 0
+    with metrics, ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        errors = [error for error in executor.map(run, range(len(manuals)), manuals) if error]
 
+    for error in errors:
+        print(f"[ERROR] {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+class ThreadLocalSessions:
+    """Una requests.Session por hilo (Session no es thread-safe), reutilizada entre manuales."""
+
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+        self._local = threading.local()
+
+    def get(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update(self.headers)
+        return session
+
+
+def download_manual(
+    session: requests.Session,
+    manual: ManualConfig,
+    force: bool,
+    timeout: int,
+    manifest: Optional[BuildManifest] = None,
+    retries: int = 3,
+    backoff: float = 1.0,
+    progress_position: int = 0,
+) -> bool:
+    """Descarga un manual. Retorna False si se omitio (ya existia o el servidor respondio 304).
+
+    Si el PDF ya existe y su ``.http.json`` tiene ETag/Last-Modified, se revalida con un GET
+    condicional; sin validadores se omite sin hacer ningun request. ``force`` descarga de
+    nuevo sin condiciones.
+    """
 
-def download_manual(session: requests.Session, manual: ManualConfig, force: bool, timeout: int) -> None:
     destination = manual.raw_pdf_path
     ensure_directory(destination)
 
+    validators: Dict[str, str] = {}
     if destination.exists() and not force:
-        print(f"[SKIP] {manual.display_name} ya existe en {destination.name}")
-        return
+        validators = read_http_validators(manual)
+        if not (validators.get("etag") or validators.get("last_modified")):
+            print(f"[SKIP] {manual.display_name} ya existe en {destination.name}")
+            return False
 
     print(f"[INFO] Descargando {manual.display_name} desde {manual.pdf_url}")
+
+    attempt = 0
+    while True:
+        try:
+            changed = _fetch(session, manual, validators, timeout, progress_position)
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as exc:
+            attempt += 1
+            if attempt > retries:
+                raise
+            # Backoff exponencial con jitter, como upload_dataset.post_with_retries.
+            delay = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.0)
+            print(
+                f"[WARN] {manual.display_name}: transferencia interrumpida ({exc}); "
+                f"reanudando en {delay:.1f}s ({attempt}/{retries})"
+            )
+            time.sleep(delay)
+
+    if not changed:
+        print(f"[SKIP] {manual.display_name} sin cambios en el servidor (HTTP 304)")
+        return False
+
+    count_items("bytes", destination.stat().st_size)
+    if manifest is None:
+        print(f"[OK] Guardado en {destination}")
+        return True
+
+    # El sha256 del PDF es la entrada de la extraccion: si no cambia, las etapas siguientes se omiten.
+    previous = manifest.output_digest(STAGE, manual.slug, destination)
+    manifest.record(STAGE, manual.slug, fingerprint(manual.pdf_url), [destination])
+    if previous is not None and previous == manifest.output_digest(STAGE, manual.slug, destination):
+        print(f"[OK] Guardado en {destination} (contenido sin cambios)")
+    else:
+        print(f"[OK] Guardado en {destination}")
+    return True
+
+
+def _fetch(
+    session: requests.Session,
+    manual: ManualConfig,
+    validators: Dict[str, str],
+    timeout: int,
+    progress_position: int,
+) -> bool:
+    """Un intento de descarga. Retorna False si el servidor respondio 304 (sin cambios)."""
+
+    destination = manual.raw_pdf_path
+    temp_path = destination.with_suffix(".tmp")
+    sidecar = read_http_validators(manual)
+
+    request_headers: Dict[str, str] = {}
+    if validators.get("etag"):
+        request_headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        request_headers["If-Modified-Since"] = validators["last_modified"]
+
+    # Reanudar un .tmp parcial solo si sabemos a que version del archivo pertenece (If-Range).
+    partial = sidecar.get("partial") or {}
+    resume_from = temp_path.stat().st_size if temp_path.exists() else 0
+    if resume_from and (partial.get("etag") or partial.get("last_modified")):
+        request_headers["Range"] = f"bytes={resume_from}-"
+        request_headers["If-Range"] = partial.get("etag") or partial["last_modified"]
+    else:
+        resume_from = 0
+
     try:
-        response = session.get(manual.pdf_url, stream=True, timeout=timeout)
+        response = session.get(manual.pdf_url, stream=True, timeout=timeout, headers=request_headers)
+        if response.status_code == 304:
+            response.close()
+            return False
+        if response.status_code == 416:
+            # El rango ya no es valido (archivo cambio o .tmp completo/corrupto): empezar de cero.
+            response.close()
+            temp_path.unlink(missing_ok=True)
+            return _fetch(session, manual, validators, timeout, progress_position)
         response.raise_for_status()
     except requests.HTTPError as exc:
         status = exc.response.status_code if exc.response is not None else "desconocido"
@@ -89,34 +259,157 @@ def download_manual(session: requests.Session, manual: ManualConfig, force: bool
 
     content_type = response.headers.get("content-type", "").lower()
     if "pdf" not in content_type:
+        response.close()
         raise RuntimeError(
             f"Respuesta inesperada (content-type: {content_type or 'desconocido'}). "
             "Verifica los headers/cookies usados."
         )
 
-    total = int(response.headers.get("content-length", 0))
-    temp_path = destination.with_suffix(".tmp")
+    resumed = response.status_code == 206
+    if not resumed:
+        resume_from = 0
+    response_validators = {
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+    }
+    write_http_validators(manual, {**sidecar, "partial": response_validators})
+
+    remaining = int(response.headers.get("content-length", 0))
+    total = resume_from + remaining if remaining else 0
 
-    with temp_path.open("wb") as f:
-        if total == 0:
-            for chunk in response.iter_content(chunk_size=1024 * 64):
-                if chunk:
-                    f.write(chunk)
-        else:
-            with tqdm(
-                total=total,
-                unit="B",
-                unit_scale=True,
-                unit_divisor=1024,
-                desc=destination.name,
-            ) as progress:
-                for chunk in response.iter_content(chunk_size=1024 * 128):
-                    if chunk:
-                        f.write(chunk)
-                        progress.update(len(chunk))
+    with temp_path.open("ab" if resumed else "wb") as f, tqdm(
+        total=total or None,
+        initial=resume_from,
+        unit="B",
+        unit_scale=True,
+        unit_divisor=1024,
+        desc=destination.name,
+        position=progress_position,
+        disable=total == 0,
+    ) as progress:
+        for chunk in response.iter_content(chunk_size=1024 * 128):
+            if chunk:
+                f.write(chunk)
+                progress.update(len(chunk))
+
+    if total and temp_path.stat().st_size != total:
+        raise requests.exceptions.ChunkedEncodingError(
+            f"descarga incompleta ({temp_path.stat().st_size} de {total} bytes)"
+        )
 
     temp_path.replace(destination)
-    print(f"[OK] Guardado en {destination}")
+    write_http_validators(manual, {"url": manual.pdf_url, **response_validators})
+    return True
+
+
+def check_against_standin(timeout: int = 10) -> int:
+    """Descarga un PDF sintetico de ``PdfDownloadStandIn`` en un directorio temporal y verifica:
+
+    1. una transferencia cortada a mitad del cuerpo se reanuda con ``Range``/``If-Range`` (206);
+    2. con el archivo al dia, el GET condicional (por defecto) recibe 304 y no reescribe nada;
+    3. si el servidor publica otra version, el GET condicional la descarga (200);
+    4. un ``.tmp`` parcial de una version anterior no se reanuda: ``If-Range`` no coincide y
+       el servidor manda el archivo completo;
+    5. ``force`` descarga sin ``If-None-Match``/``If-Modified-Since`` (200).
+    """
+
+    from standins import PdfDownloadStandIn
+
+    rng = random.Random(0)
+    versions = [b"%PDF-1.4\n" + rng.randbytes(1024 * 1024) for _ in range(3)]
+    failures = []
+
+    def check(name: str, ok: bool, detail: str) -> None:
+        print(f"[{'OK' if ok else 'ERROR'}] {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    with PdfDownloadStandIn() as standin, tempfile.TemporaryDirectory() as scratch, requests.Session() as session:
+        url = standin.add_file("/standin.pdf", versions[0])
+        manual = ManualConfig("standin", "Stand-in", "standin", "Stand-in", url, None, "es", None, data_dir=Path(scratch))
+
+        standin.drop_next("/standin.pdf", 300_000)
+        download_manual(session, manual, force=False, timeout=timeout, retries=1, backoff=0.1)
+        statuses = [status for status, _ in standin.log]
+        resumed_from = standin.log[-1][1].get("range", "-")
+        check(
+            "reanudacion",
+            statuses == [200, 206] and manual.raw_pdf_path.read_bytes() == versions[0],
+            f"respuestas {statuses}, reanudada con Range {resumed_from}",
+        )
+
+        standin.log.clear()
+        downloaded = download_manual(session, manual, force=False, timeout=timeout)
+        status, request_headers = standin.log[-1]
+        check(
+            "GET condicional sin cambios",
+            not downloaded and status == 304 and "if-none-match" in request_headers,
+            f"HTTP {status} con If-None-Match {request_headers.get('if-none-match')}",
+        )
+
+        standin.log.clear()
+        standin.add_file("/standin.pdf", versions[1])
+        downloaded = download_manual(session, manual, force=False, timeout=timeout)
+        status = standin.log[-1][0]
+        check(
+            "GET condicional con version nueva",
+            downloaded and status == 200 and manual.raw_pdf_path.read_bytes() == versions[1],
+            f"HTTP {status}, {manual.raw_pdf_path.stat().st_size} bytes",
+        )
+
+        standin.log.clear()
+        standin.add_file("/standin.pdf", versions[2])
+        standin.drop_next("/standin.pdf", 300_000)
+        try:
+            download_manual(session, manual, force=False, timeout=timeout, retries=0)
+        except requests.RequestException:
+            pass
+        standin.add_file("/standin.pdf", versions[0])
+        download_manual(session, manual, force=False, timeout=timeout, retries=0)
+        status, request_headers = standin.log[-1]
+        check(
+            "parcial de otra version",
+            status == 200 and "if-range" in request_headers and manual.raw_pdf_path.read_bytes() == versions[0],
+            f"HTTP {status} con If-Range {request_headers.get('if-range')}",
+        )
+
+        standin.log.clear()
+        downloaded = download_manual(session, manual, force=True, timeout=timeout)
+        status, request_headers = standin.log[-1]
+        check(
+            "descarga forzada",
+            downloaded and status == 200 and "if-none-match" not in request_headers,
+            f"HTTP {status} sin If-None-Match",
+        )
+
+    if failures:
+        print(f"[ERROR] Fallaron {len(failures)} comprobaciones contra el stand-in", file=sys.stderr)
+        return 1
+    return 0
+
+
+def read_http_validators(manual: ManualConfig) -> Dict[str, str]:
+    """Lee ETag/Last-Modified guardados junto al PDF (y los del .tmp parcial, si existe)."""
+
+    path = manual.raw_http_meta_path
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as f:
+        data = json.load(f)
+    # Validadores de otra URL no sirven para revalidar.
+    if data.get("url") not in (None, manual.pdf_url):
+        return {key: value for key, value in data.items() if key == "partial"}
+    return data
+
+
+def write_http_validators(manual: ManualConfig, data: Dict[str, object]) -> None:
+    path = manual.raw_http_meta_path
+    ensure_directory(path)
+    cleaned = {key: value for key, value in data.items() if value}
+    temp_path = path.with_suffix(".json.tmp")
+    with temp_path.open("w", encoding="utf-8") as f:
+        json.dump(cleaned, f, ensure_ascii=False, indent=2)
+    temp_path.replace(path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,414 @@
+"""Evaluacion offline de la recuperacion del chat contra preguntas etiquetadas.
+
+Replica lo que hace el backend con cada pregunta (``NomicClient.search`` pide 3*k,
+filtra por modelo y se queda con k; ``chat.ts`` descarta chunks con puntaje bajo o sin
+terminos en comun; ``buildPrompt`` arma el prompt) y mide, por configuracion de k y
+tamanio de chunk: recall de las paginas esperadas, MRR, largo del prompt y latencia de
+``/query/topk``. Por defecto consulta un stand-in local (``standins.py``) con BM25 sobre
+los chunks; con ``--endpoint`` se puede apuntar a Atlas u otro servicio compatible. Con
+``--trim`` el contexto se recorta a las oraciones que comparten terminos con la pregunta
+(``context_trim.py``) antes de armar el prompt.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from chat_retrieval import DEFAULT_NOMIC_K, MIN_NORMALIZED_SCORE, normalize_score, search_topk, select_relevant
+from context_packing import build_prompt, pack_context
+from context_trim import DEFAULT_NEIGHBORS, trim_context
+from sentence_index import SentenceIndex
+from token_counter import DEFAULT_TOKENIZER, Tokenizer, load_tokenizer
+from utils import (
+    DATA_DIR,
+    REPO_ROOT,
+    ManualConfig,
+    ensure_directory,
+    filter_manuals,
+    iter_jsonl,
+    load_manuals_config,
+    now_iso,
+)
+
+QUESTIONS_PATH = REPO_ROOT / "config" / "eval_questions.jsonl"
+EVAL_DIR = DATA_DIR / "eval"
+CURRENT_CHUNKS = 0  # "tamanio" de los chunks ya generados en data/processed
+
+
+@dataclass(frozen=True)
+class Question:
+    question: str
+    model: str
+    pages: frozenset
+
+
+@dataclass
+class ConfigResult:
+    chunk_size: int
+    k: int
+    recall: float
+    mrr: float
+    prompt_chars: float
+    prompt_tokens: float
+    answered: int
+    latency_p50_ms: float
+    latency_p95_ms: float
+
+    @property
+    def label(self) -> str:
+        size = "actual" if self.chunk_size == CURRENT_CHUNKS else str(self.chunk_size)
+        return f"chunk={size} k={self.k}"
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Mide recall@k, MRR, largo del prompt y latencia de la recuperacion del chat.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--questions",
+        type=Path,
+        default=QUESTIONS_PATH,
+        help="JSONL con {question, model, pages} por linea.",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        help="Filtra manuales por key/slug/nombre. Ej: --only model_y",
+    )
+    parser.add_argument(
+        "--k",
+        nargs="+",
+        type=int,
+        default=[DEFAULT_NOMIC_K],
+        help="Valores de NOMIC_K a evaluar.",
+    )
+    parser.add_argument(
+        "--chunk-sizes",
+        nargs="+",
+        type=int,
+        help="Re-chunkea con estos tamanios (en data/eval/work). Sin esta opcion usa data/processed.",
+    )
+    parser.add_argument(
+        "--length-unit",
+        choices=("chars", "tokens"),
+        default="chars",
+        help="Unidad de --chunk-sizes.",
+    )
+    parser.add_argument(
+        "--tokenizer",
+        default=DEFAULT_TOKENIZER,
+        help="Tokenizer para contar tokens del prompt (approx, tiktoken:<encoding>, hf:<tokenizer.json>).",
+    )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        default=0,
+        help="Empaqueta el contexto para que el prompt no pase de estos tokens (0 = sin limite, como el backend).",
+    )
+    parser.add_argument(
+        "--trim",
+        action="store_true",
+        help="Recorta cada chunk a las oraciones con terminos de la pregunta y sus vecinas.",
+    )
+    parser.add_argument(
+        "--trim-chars",
+        type=int,
+        default=0,
+        help="Con --trim, largo maximo del contexto recortado en caracteres (0 = sin limite).",
+    )
+    parser.add_argument(
+        "--trim-neighbors",
+        type=int,
+        default=DEFAULT_NEIGHBORS,
+        help="Con --trim, oraciones vecinas que se conservan a cada lado de una que coincide.",
+    )
+    parser.add_argument(
+        "--overlap-ratio",
+        type=float,
+        default=0.15,
+        help="Solapamiento como fraccion del tamanio de chunk al re-chunkear.",
+    )
+    parser.add_argument(
+        "--min-score",
+        type=float,
+        default=MIN_NORMALIZED_SCORE,
+        help="Umbral de puntaje normalizado (MIN_NORMALIZED_SCORE en chat.ts).",
+    )
+    parser.add_argument(
+        "--max-recall-drop",
+        type=float,
+        default=0.0,
+        help="Perdida de recall aceptada frente a la mejor configuracion al recomendar una.",
+    )
+    parser.add_argument(
+        "--endpoint",
+        help="URL base de un servicio /query/topk real (p. ej. https://api-atlas.nomic.ai/v1). Usa NOMIC_API_KEY.",
+    )
+    parser.add_argument(
+        "--projection-id",
+        default=os.getenv("NOMIC_PROJECTION_ID"),
+        help="projection_id a consultar con --endpoint.",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=EVAL_DIR / "work",
+        help="Directorio para los chunks re-generados.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=EVAL_DIR / "retrieval_results.json",
+        help="JSON con los resultados de cada configuracion.",
+    )
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    if args.endpoint and args.chunk_sizes:
+        print("[ERROR] --chunk-sizes solo aplica al stand-in local; un endpoint real ya tiene sus chunks.", file=sys.stderr)
+        return 1
+    if (args.trim_chars or args.trim_neighbors != DEFAULT_NEIGHBORS) and not args.trim:
+        print("[ERROR] --trim-chars y --trim-neighbors requieren --trim.", file=sys.stderr)
+        return 1
+    if args.endpoint and not args.projection_id:
+        print("[ERROR] --endpoint requiere --projection-id (o NOMIC_PROJECTION_ID).", file=sys.stderr)
+        return 1
+
+    try:
+        manuals = filter_manuals(load_manuals_config(), args.only)
+        questions = load_questions(args.questions, {manual.slug for manual in manuals})
+        tokenizer = load_tokenizer(args.tokenizer)
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+    if not questions:
+        print(f"[ERROR] {args.questions} no tiene preguntas para los manuales elegidos.", file=sys.stderr)
+        return 1
+
+    import requests
+
+    session = requests.Session()
+    chunk_sizes = args.chunk_sizes or [CURRENT_CHUNKS]
+    results: List[ConfigResult] = []
+    trim = (args.trim_chars, args.trim_neighbors) if args.trim else None
+    sentences = SentenceIndex.from_manuals(manuals) if args.trim else None
+
+    if args.endpoint:
+        token = os.getenv("NOMIC_API_KEY")
+        if token:
+            session.headers["Authorization"] = f"Bearer {token}"
+        for k in args.k:
+            results.append(
+                evaluate(
+                    session, args.endpoint, args.projection_id, questions, CURRENT_CHUNKS, k,
+                    tokenizer, args.min_score, args.token_budget, trim, sentences,
+                )
+            )
+            print_result(results[-1])
+    else:
+        from standins import NomicTopkStandIn
+
+        with NomicTopkStandIn() as standin:
+            for size in chunk_sizes:
+                try:
+                    records = list(
+                        chunk_records(manuals, size, args.overlap_ratio, args.work_dir, args.length_unit, tokenizer)
+                    )
+                except FileNotFoundError as exc:
+                    print(f"[ERROR] No se encontro {exc.filename}; ejecuta primero extract/chunk.", file=sys.stderr)
+                    return 1
+                projection_id = f"chunks-{size or 'actual'}"
+                standin.add_projection(projection_id, records)
+                print(f"[INFO] {projection_id}: {len(records)} chunks indexados en el stand-in")
+                for k in args.k:
+                    results.append(
+                        evaluate(
+                            session, standin.base_url, projection_id, questions, size, k,
+                            tokenizer, args.min_score, args.token_budget, trim, sentences,
+                        )
+                    )
+                    print_result(results[-1])
+
+    best = recommend(results, args.max_recall_drop)
+    if len(results) > 1:
+        reference = max(result.recall for result in results)
+        print(
+            f"[OK] Recomendado: {best.label} (recall {best.recall:.3f} vs mejor {reference:.3f}, "
+            f"prompt {best.prompt_chars:.0f} chars)"
+        )
+
+    ensure_directory(args.output)
+    with args.output.open("w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "generated_at": now_iso(),
+                "endpoint": args.endpoint or "standin-bm25",
+                "questions": len(questions),
+                "min_score": args.min_score,
+                "tokenizer": tokenizer.name,
+                "token_budget": args.token_budget,
+                "trim": {"max_chars": args.trim_chars, "neighbors": args.trim_neighbors} if args.trim else None,
+                "results": [result.__dict__ for result in results],
+                "recommended": best.__dict__,
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    print(f"[OK] Resultados -> {args.output}")
+    return 0
+
+
+def load_questions(path: Path, slugs: Optional[set] = None) -> List[Question]:
+    """Lee el set etiquetado; omite preguntas de manuales fuera de ``slugs``."""
+
+    questions: List[Question] = []
+    for line_number, raw in enumerate(iter_jsonl(path), start=1):
+        try:
+            question = Question(str(raw["question"]), str(raw["model"]), frozenset(int(page) for page in raw["pages"]))
+        except (KeyError, TypeError, ValueError) as exc:
+            raise ValueError(f"{path.name}:{line_number}: se esperaba {{question, model, pages}} ({exc})") from exc
+        if slugs is None or question.model in slugs:
+            questions.append(question)
+    return questions
+
+
+def chunk_records(
+    manuals: Sequence[ManualConfig],
+    chunk_size: int,
+    overlap_ratio: float,
+    work_dir: Path,
+    length_unit: str = "chars",
+    tokenizer: Optional[Tokenizer] = None,
+) -> Iterator[dict]:
+    """Chunks de todos los manuales: los de data/processed o re-generados con ``chunk_size``."""
+
+    if chunk_size == CURRENT_CHUNKS:
+        for manual in manuals:
+            yield from iter_jsonl(manual.processed_jsonl_path)
+        return
+
+    from chunk_manuals import build_documents_from_pages, build_splitter, write_jsonl
+    from page_store import iter_manual_pages
+
+    splitter = build_splitter(chunk_size, round(chunk_size * overlap_ratio), length_unit, tokenizer)
+    for manual in manuals:
+        scratch = replace(manual, data_dir=work_dir / f"chunk_{chunk_size}")
+        documents = build_documents_from_pages(manual, iter_manual_pages(manual))
+        ensure_directory(scratch.processed_jsonl_path)
+        write_jsonl(scratch, splitter.split_documents(documents), tokenizer)
+        yield from iter_jsonl(scratch.processed_jsonl_path)
+
+
+def evaluate(
+    session,
+    base_url: str,
+    projection_id: str,
+    questions: Sequence[Question],
+    chunk_size: int,
+    k: int,
+    tokenizer: Tokenizer,
+    min_score: float = MIN_NORMALIZED_SCORE,
+    token_budget: int = 0,
+    trim: Optional[Tuple[int, int]] = None,
+    sentences: Optional[SentenceIndex] = None,
+) -> ConfigResult:
+    """Metricas de una configuracion; ``trim`` = (max_chars, neighbors) activa el recorte por oraciones.
+
+    ``sentences`` trae las oraciones ya segmentadas de los chunks de ``data/processed``; los
+    re-generados con otro ``chunk_size`` se segmentan al vuelo.
+    """
+
+    recalls: List[float] = []
+    reciprocal_ranks: List[float] = []
+    prompt_chars: List[int] = []
+    prompt_tokens: List[int] = []
+    latencies: List[float] = []
+    answered = 0
+
+    for question in questions:
+        started = time.perf_counter()
+        chunks = search_topk(session, base_url, projection_id, question.question, question.model, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        relevant = select_relevant(question.question, chunks, min_score)
+        if trim and relevant:
+            relevant = trim_context(question.question, relevant, *trim, index=sentences).chunks
+        if token_budget and relevant:
+            scores = [normalize_score(chunk["score"]) for chunk in relevant]
+            relevant = pack_context(question.question, relevant, token_budget, tokenizer, scores).chunks
+        covered: set = set()
+        first_hit = 0
+        for rank, chunk in enumerate(relevant, start=1):
+            hit = chunk_pages(chunk["metadata"]) & question.pages
+            covered |= hit
+            if hit and not first_hit:
+                first_hit = rank
+
+        recalls.append(len(covered) / len(question.pages) if question.pages else 0.0)
+        reciprocal_ranks.append(1 / first_hit if first_hit else 0.0)
+        # Sin chunks relevantes chat.ts responde 404 y no llama al LLM.
+        prompt = build_prompt(question.question, relevant) if relevant else ""
+        prompt_chars.append(len(prompt))
+        prompt_tokens.append(tokenizer.count(prompt))
+        answered += bool(relevant)
+
+    return ConfigResult(
+        chunk_size=chunk_size,
+        k=k,
+        recall=round(statistics.fmean(recalls), 4),
+        mrr=round(statistics.fmean(reciprocal_ranks), 4),
+        prompt_chars=round(statistics.fmean(prompt_chars), 1),
+        prompt_tokens=round(statistics.fmean(prompt_tokens), 1),
+        answered=answered,
+        latency_p50_ms=round(percentile(latencies, 50), 2),
+        latency_p95_ms=round(percentile(latencies, 95), 2),
+    )
+
+
+def chunk_pages(metadata: dict) -> set:
+    pages = metadata.get("source_pages")
+    if pages:
+        return set(pages)
+    start, end = metadata.get("page_start"), metadata.get("page_end")
+    if isinstance(start, int) and isinstance(end, int):
+        return set(range(start, end + 1))
+    return set()
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def recommend(results: Sequence[ConfigResult], max_recall_drop: float = 0.0) -> ConfigResult:
+    """Configuracion con el prompt mas corto cuyo recall no cae mas de ``max_recall_drop``."""
+
+    floor = max(result.recall for result in results) - max_recall_drop
+    keeping = [result for result in results if result.recall >= floor - 1e-9]
+    return min(keeping, key=lambda result: (result.prompt_chars, result.k, result.chunk_size))
+
+
+def print_result(result: ConfigResult) -> None:
+    print(
+        f"[INFO] {result.label:<18} recall {result.recall:.3f}  MRR {result.mrr:.3f}  "
+        f"prompt {result.prompt_chars:7.0f} chars {result.prompt_tokens:6.0f} tokens  respondidas {result.answered}  "
+        f"latencia p50 {result.latency_p50_ms:.1f} ms / p95 {result.latency_p95_ms:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,22 +1,49 @@
 from __future__ import annotations
 
 import argparse
+import inspect
 import json
+import math
 import re
 import sys
-from typing import Iterable, List
+import tempfile
+from collections import Counter
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 from pypdf import PdfReader
 from tqdm import tqdm
 
+from page_store import PageReader, PageWriter
+from page_watchdog import PageJournal, PageWatchdog, WatchdogLimits, add_watchdog_arguments, write_quarantine
+from pdf_backends import (
+    AUTO_BACKEND,
+    BACKEND_CHOICES,
+    DEFAULT_BACKEND,
+    PdfTextBackend,
+    available_backends,
+    backend_fingerprint,
+    choose_backend,
+    open_backend,
+)
 from utils import (
+    BuildManifest,
     ManualConfig,
-    ensure_directory,
+    StageMetrics,
+    add_metrics_arguments,
+    count_items,
     filter_manuals,
+    fingerprint,
+    iter_intermediate_pages,
     load_manuals_config,
+    manual_fingerprint,
     now_iso,
+    sha256_file,
 )
 
+STAGE = "extract"
+
 
 def main(argv: Iterable[str] | None = None) -> int:
     parser = argparse.ArgumentParser(
@@ -28,6 +55,35 @@ def main(argv: Iterable[str] | None = None) -> int:
         nargs="+",
         help="Filtra manuales por key/slug/nombre. Ej: --only model_y",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Procesos para extraer paginas en paralelo (1 = serial).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Ignora el manifest de build y re-extrae todos los manuales.",
+    )
+    parser.add_argument(
+        "--keep-boilerplate",
+        action="store_true",
+        help="No elimina encabezados/pies de pagina repetidos en la mayoria de las paginas.",
+    )
+    parser.add_argument(
+        "--debug-txt",
+        action="store_true",
+        help="Escribe tambien data/intermediate/{slug}.txt con el texto de cada pagina para revisarlo.",
+    )
+    add_backend_argument(parser)
+    add_watchdog_arguments(parser)
+    parser.add_argument(
+        "--migrate-legacy",
+        action="store_true",
+        help="Convierte los JSON intermedios del formato anterior a .pages.jsonl/.pages.idx sin leer los PDFs.",
+    )
+    add_metrics_arguments(parser)
     args = parser.parse_args(list(argv) if argv is not None else None)
 
     try:
@@ -36,95 +92,647 @@ def main(argv: Iterable[str] | None = None) -> int:
         print(f"[ERROR] {exc}", file=sys.stderr)
         return 1
 
+    if args.migrate_legacy:
+        return migrate_legacy_manuals(manuals, force=args.force)
+
+    strip_boilerplate = not args.keep_boilerplate
+    limits = WatchdogLimits.from_args(args)
+    manifest = BuildManifest.load()
+    metrics = StageMetrics.from_args(STAGE, args)
+    inputs: Dict[str, str] = {}
+    stale: List[ManualConfig] = []
     for manual in manuals:
         try:
-            extract_manual(manual)
+            # Con auto el fingerprint lleva el backend elegido, no la lista de los instalados.
+            name = resolve_backend(manual, args.backend, force=args.force)
+            inputs[manual.slug] = extract_inputs_fingerprint(manual, strip_boilerplate, args.debug_txt, name)
         except FileNotFoundError:
             print(
                 f"[ERROR] No se encontro el PDF para {manual.display_name} ({manual.raw_pdf_path})",
                 file=sys.stderr,
             )
             return 1
+        if not args.force and manifest.is_fresh(STAGE, manual.slug, inputs[manual.slug]):
+            print(f"[SKIP] {manual.display_name} sin cambios desde la ultima extraccion")
+            metrics.skip(manual.slug)
+            continue
+        stale.append(manual)
+
+    def record(manual: ManualConfig) -> None:
+        manifest.record(STAGE, manual.slug, inputs[manual.slug], extract_outputs(manual, args.debug_txt))
+
+    with metrics:
+        if limits.enabled or args.retry_quarantine:
+            for manual in stale:
+                try:
+                    with metrics.manual(manual.slug):
+                        quarantined = extract_manual_watchdog(
+                            manual, limits, args.workers, strip_boilerplate, args.debug_txt, args.backend,
+                            args.retry_quarantine,
+                        )
+                        # Con paginas en cuarentena el manual queda pendiente: la proxima corrida retoma.
+                        if not quarantined:
+                            record(manual)
+                except Exception as exc:
+                    print(f"[ERROR] {manual.display_name}: {exc}", file=sys.stderr)
+                    return 1
+            return 0
+
+        if args.workers > 1:
+            return extract_manuals_parallel(
+                stale,
+                args.workers,
+                on_written=record,
+                strip_boilerplate=strip_boilerplate,
+                metrics=metrics,
+                debug_txt=args.debug_txt,
+                backend=args.backend,
+            )
+
+        for manual in stale:
+            try:
+                with metrics.manual(manual.slug):
+                    extract_manual(manual, strip_boilerplate, args.debug_txt, args.backend)
+                    record(manual)
+            except FileNotFoundError:
+                print(
+                    f"[ERROR] No se encontro el PDF para {manual.display_name} ({manual.raw_pdf_path})",
+                    file=sys.stderr,
+                )
+                return 1
+            except Exception as exc:
+                print(f"[ERROR] {manual.display_name}: {exc}", file=sys.stderr)
+                return 1
+
+    return 0
+
+
+def extract_manuals_parallel(
+    manuals: Sequence[ManualConfig],
+    workers: int,
+    on_written: Optional[Callable[[ManualConfig], None]] = None,
+    strip_boilerplate: bool = True,
+    metrics: Optional[StageMetrics] = None,
+    debug_txt: bool = False,
+    backend: str = DEFAULT_BACKEND,
+) -> int:
+    """Extrae varios manuales a la vez repartiendo rangos de paginas en un pool de procesos."""
+
+    metrics = metrics or StageMetrics(STAGE)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Encolar todos los rangos primero para que los manuales se solapen en el pool.
+        pending: List[Tuple[ManualConfig, str, int, List[Future]]] = []
+        for manual in manuals:
+            try:
+                name = resolve_backend(manual, backend)
+                total_pages, futures = submit_page_ranges(executor, manual, workers, name)
+            except FileNotFoundError:
+                print(
+                    f"[ERROR] No se encontro el PDF para {manual.display_name} ({manual.raw_pdf_path})",
+                    file=sys.stderr,
+                )
+                executor.shutdown(cancel_futures=True)
+                return 1
+            except Exception as exc:
+                print(f"[ERROR] {manual.display_name}: {exc}", file=sys.stderr)
+                executor.shutdown(cancel_futures=True)
+                return 1
+            pending.append((manual, name, total_pages, futures))
+
+        for manual, name, total_pages, futures in pending:
+            try:
+                # El tiempo por manual incluye la espera de sus rangos (ya encolados en el pool).
+                with metrics.manual(manual.slug):
+                    raw_pages = iter_page_ranges(manual, total_pages, futures)
+                    outline = read_outline(PdfReader(str(manual.raw_pdf_path)))
+                    write_manual_output(manual, raw_pages, strip_boilerplate, debug_txt, outline, name)
+                    if on_written is not None:
+                        on_written(manual)
+            except Exception as exc:
+                print(f"[ERROR] {manual.display_name}: {exc}", file=sys.stderr)
+                executor.shutdown(cancel_futures=True)
+                return 1
+
+    return 0
+
+
+def submit_page_ranges(
+    executor: Executor, manual: ManualConfig, workers: int, backend: str = DEFAULT_BACKEND
+) -> Tuple[int, List[Future]]:
+    """Encola la extraccion de un manual por rangos de paginas. Retorna (paginas, futures)."""
+
+    total_pages = len(PdfReader(str(manual.raw_pdf_path)).pages)
+    futures = [
+        executor.submit(extract_page_range, str(manual.raw_pdf_path), start, stop, backend)
+        for start, stop in page_ranges(total_pages, workers)
+    ]
+    return total_pages, futures
+
+
+def iter_page_ranges(manual: ManualConfig, total_pages: int, futures: Sequence[Future]) -> Iterator[str]:
+    """Texto crudo de cada pagina, en orden, a medida que terminan los rangos encolados."""
+
+    with tqdm(total=total_pages, desc=manual.slug, unit="pag") as progress:
+        for future in futures:
+            chunk = future.result()
+            yield from chunk
+            progress.update(len(chunk))
+
+
+def extract_if_stale(
+    manual: ManualConfig,
+    manifest: BuildManifest,
+    force: bool = False,
+    executor: Optional[Executor] = None,
+    workers: int = 1,
+    strip_boilerplate: bool = True,
+    debug_txt: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    limits: WatchdogLimits = WatchdogLimits(),
+    retry_quarantine: bool = False,
+) -> bool:
+    """Extrae un manual salvo que el manifest diga que esta al dia. Retorna False si se omitio.
+
+    Con ``executor`` las paginas se reparten en el pool (ver ``submit_page_ranges``). Con
+    ``limits`` se extrae bajo el watchdog en ``workers`` procesos propios (ver
+    ``extract_manual_watchdog``) y, si quedan paginas en cuarentena, el manual no se marca
+    al dia en el manifest: la corrida siguiente lo retoma desde el journal.
+    """
+
+    backend = resolve_backend(manual, backend, force=force)
+    inputs = extract_inputs_fingerprint(manual, strip_boilerplate, debug_txt, backend)
+    if not force and manifest.is_fresh(STAGE, manual.slug, inputs):
+        print(f"[SKIP] {manual.display_name} sin cambios desde la ultima extraccion")
+        return False
+
+    if limits.enabled or retry_quarantine:
+        quarantined = extract_manual_watchdog(
+            manual, limits, workers, strip_boilerplate, debug_txt, backend, retry_quarantine
+        )
+        if not quarantined:
+            manifest.record(STAGE, manual.slug, inputs, extract_outputs(manual, debug_txt))
+        return True
+    if executor is None:
+        extract_manual(manual, strip_boilerplate, debug_txt, backend)
+    else:
+        total_pages, futures = submit_page_ranges(executor, manual, workers, backend)
+        outline = read_outline(PdfReader(str(manual.raw_pdf_path)))
+        raw_pages = iter_page_ranges(manual, total_pages, futures)
+        write_manual_output(manual, raw_pages, strip_boilerplate, debug_txt, outline, backend)
+    manifest.record(STAGE, manual.slug, inputs, extract_outputs(manual, debug_txt))
+    return True
+
+
+def extract_inputs_fingerprint(
+    manual: ManualConfig,
+    strip_boilerplate: bool = True,
+    debug_txt: bool = False,
+    backend: str = DEFAULT_BACKEND,
+) -> str:
+    """Entradas de la extraccion: contenido del PDF, backend, reglas de limpieza, salidas pedidas y config del manual."""
+
+    return fingerprint(
+        sha256_file(manual.raw_pdf_path),
+        backend_fingerprint(backend),
+        clean_text_fingerprint(strip_boilerplate),
+        inspect.getsource(read_outline),
+        debug_txt,
+        manual_fingerprint(manual),
+    )
+
+
+def extract_outputs(manual: ManualConfig, debug_txt: bool = False) -> List[Path]:
+    outputs = [manual.intermediate_pages_path, manual.intermediate_index_path]
+    if debug_txt:
+        outputs.append(manual.intermediate_txt_path)
+    return outputs
+
+
+def clean_text_fingerprint(strip_boilerplate: bool = True) -> str:
+    """Hash de las reglas de limpieza; cambia si se edita clean_text, sus patrones o el filtro de boilerplate."""
+
+    rules = [clean_text, _join_hyphenated]
+    if strip_boilerplate:
+        rules += [BoilerplateDetector, strip_boilerplate_lines, boilerplate_line_key, _edge_line_indexes]
+    patterns = [pattern.pattern for pattern in (_LINE_BREAK, _MULTISPACE, _BLANK_LINES, _PAGE_FOOTER, _TESLA_INC)]
+    if strip_boilerplate:
+        patterns.append(_DIGITS.pattern)
+    return fingerprint(
+        [inspect.getsource(rule) for rule in rules],
+        patterns,
+        strip_boilerplate and (BOILERPLATE_MIN_FRACTION, BOILERPLATE_EDGE_LINES, BOILERPLATE_MIN_PAGES),
+    )
+
+
+def extract_manual(
+    manual: ManualConfig,
+    strip_boilerplate: bool = True,
+    debug_txt: bool = False,
+    backend: str = DEFAULT_BACKEND,
+) -> None:
+    name = resolve_backend(manual, backend)
+    outline = read_outline(PdfReader(str(manual.raw_pdf_path)))
+    with open_backend(name, manual.raw_pdf_path) as pdf:
+        raw_pages = (pdf.page_text(index) for index in tqdm(range(pdf.page_count()), desc=manual.slug, unit="pag"))
+        write_manual_output(manual, raw_pages, strip_boilerplate, debug_txt, outline, name)
+
+
+def extract_manual_watchdog(
+    manual: ManualConfig,
+    limits: WatchdogLimits,
+    workers: int = 1,
+    strip_boilerplate: bool = True,
+    debug_txt: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    retry_quarantine: bool = False,
+) -> List[int]:
+    """Extrae un manual con ``PageWatchdog``; retorna las paginas en cuarentena (desde 1).
+
+    El texto crudo de cada pagina va al journal ``{slug}.raw.jsonl`` apenas termina, asi una
+    corrida interrumpida retoma desde las paginas que faltan. Las paginas que fallan (timeout,
+    memoria, excepcion del parser) se escriben vacias, se listan en ``{slug}.quarantine.json``
+    y en ``quarantined_pages`` del indice, y solo se reintentan con ``retry_quarantine``. El
+    journal se borra cuando el manual termina sin cuarentena.
+    """
+
+    name = resolve_backend(manual, backend)
+    reader = PdfReader(str(manual.raw_pdf_path))
+    outline = read_outline(reader)
+    total_pages = len(reader.pages)
+    del reader
+    inputs = fingerprint(sha256_file(manual.raw_pdf_path), backend_fingerprint(name))
+
+    with PageJournal(manual.raw_journal_path, inputs, total_pages) as journal:
+        if journal.resumed_pages:
+            print(
+                f"[INFO] {manual.display_name}: se retoma la extraccion ({len(journal.offsets)}/{total_pages} "
+                f"paginas ya extraidas, {len(journal.quarantined)} en cuarentena)"
+            )
+        pending = [
+            index
+            for index in range(total_pages)
+            if index not in journal.offsets and (retry_quarantine or index not in journal.quarantined)
+        ]
+        with PageWatchdog(manual.raw_pdf_path, name, limits, workers) as watchdog:
+            with tqdm(total=len(pending), desc=manual.slug, unit="pag") as progress:
+                for result in watchdog.run(pending):
+                    journal.record(result)
+                    if result.error is not None:
+                        progress.write(f"[WARN] {manual.display_name} pagina {result.index + 1}: {result.error}")
+                    progress.update()
+
+        quarantined = [index + 1 for index in sorted(journal.quarantined)]
+        raw_pages = (journal.text(index) for index in range(total_pages))
+        write_manual_output(manual, raw_pages, strip_boilerplate, debug_txt, outline, name, quarantined)
+        write_quarantine(manual.quarantine_path, journal, {"model_key": manual.key, "slug": manual.slug, "backend": name})
+
+    count_items("quarantined_pages", len(quarantined))
+    if quarantined:
+        print(
+            f"[WARN] {manual.display_name}: {len(quarantined)} paginas en cuarentena ({manual.quarantine_path.name}); "
+            "reintenta con --retry-quarantine"
+        )
+    else:
+        manual.raw_journal_path.unlink(missing_ok=True)
+    return quarantined
+
+
+def add_backend_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--backend",
+        choices=BACKEND_CHOICES,
+        default=DEFAULT_BACKEND,
+        help="Extractor de texto del PDF; auto elige el mas rapido que pasa los controles de calidad.",
+    )
+
+
+# Eleccion de ``auto`` por PDF en este proceso: el fingerprint y la extraccion usan la misma.
+_AUTO_CHOICES: Dict[Path, str] = {}
+
+
+def resolve_backend(manual: ManualConfig, backend: str, force: bool = False) -> str:
+    """Nombre del backend a usar; con ``auto`` lo elige midiendo una muestra de paginas del manual.
+
+    La eleccion es estable: se reutiliza el backend que figura en el indice de paginas de la
+    extraccion anterior (si sigue instalado), y solo se vuelve a medir con ``force`` o si no
+    hay indice. Medir de nuevo en cada corrida podria cambiar de backend por ruido de tiempos
+    y con eso el texto crudo y los chunk_ids de todo el manual.
+    """
+
+    if backend != AUTO_BACKEND:
+        return backend
+    if manual.raw_pdf_path in _AUTO_CHOICES:
+        return _AUTO_CHOICES[manual.raw_pdf_path]
+    previous = None if force else previous_backend(manual)
+    if previous in available_backends():
+        print(f"[INFO] {manual.display_name}: backend auto -> {previous} (elegido en la extraccion anterior)")
+        name = previous
+    else:
+        name, trials = choose_backend(manual.raw_pdf_path)
+        print(f"[INFO] {manual.display_name}: backend auto -> {name} ({'; '.join(trial.describe() for trial in trials)})")
+    _AUTO_CHOICES[manual.raw_pdf_path] = name
+    return name
+
+
+def previous_backend(manual: ManualConfig) -> Optional[str]:
+    """Backend que figura en el indice de paginas del manual, o None si no hay indice legible."""
+
+    if not manual.intermediate_index_path.exists():
+        return None
+    try:
+        with PageReader(manual.intermediate_pages_path, manual.intermediate_index_path) as reader:
+            return reader.metadata.get("backend")
+    except (OSError, ValueError):
+        return None
+
+
+def read_outline(reader: PdfReader) -> List[Tuple[int, List[str]]]:
+    """Marcadores (bookmarks) del PDF como ``(pagina, ruta de titulos)``, ordenados por pagina.
+
+    La ruta incluye los titulos de los marcadores padre, p. ej. ``["Conduccion", "Autopilot"]``.
+    Un PDF sin marcadores (o con el outline danado) retorna una lista vacia.
+    """
+
+    entries: List[Tuple[int, List[str]]] = []
+
+    def walk(items: list, parents: List[str]) -> None:
+        path = None
+        for item in items:
+            # pypdf entrega los hijos como una lista justo despues de su padre.
+            if isinstance(item, list):
+                if path is not None:
+                    walk(item, path)
+                continue
+            path = parents + [" ".join(str(item.title or "").split())]
+            try:
+                page = reader.get_destination_page_number(item)
+            except Exception:
+                # Destino roto: el marcador sigue sirviendo como padre de sus hijos.
+                page = None
+            if path[-1] and page is not None and page >= 0:
+                entries.append((page + 1, path))
+
+    try:
+        walk(reader.outline, [])
+    except Exception as exc:
+        print(f"[WARN] No se pudo leer el indice del PDF ({exc}); se extrae sin secciones.")
+        return []
+    return sorted(entries, key=lambda entry: entry[0])
+
+
+def page_ranges(total_pages: int, workers: int) -> List[Tuple[int, int]]:
+    """Divide [0, total_pages) en rangos contiguos (~4 por worker para balancear carga)."""
+
+    if total_pages <= 0:
+        return []
+    size = max(1, math.ceil(total_pages / (workers * 4)))
+    return [(start, min(start + size, total_pages)) for start in range(0, total_pages, size)]
+
+
+# Cache de backends por proceso worker: evita re-parsear el xref del PDF en cada rango.
+_WORKER_BACKENDS: Dict[Tuple[str, str], PdfTextBackend] = {}
+
+
+def extract_page_range(pdf_path: str, start: int, stop: int, backend: str = DEFAULT_BACKEND) -> List[str]:
+    """Texto crudo de las paginas [start, stop) de un PDF (se ejecuta en un worker).
+
+    La limpieza ocurre despues, en ``write_manual_output``: detectar encabezados repetidos
+    necesita ver las lineas originales de todas las paginas del manual.
+    """
+
+    pdf = _WORKER_BACKENDS.get((backend, pdf_path))
+    if pdf is None:
+        pdf = _WORKER_BACKENDS[(backend, pdf_path)] = open_backend(backend, Path(pdf_path))
+    return [pdf.page_text(index) for index in range(start, stop)]
+
+
+def write_manual_output(
+    manual: ManualConfig,
+    raw_pages: Iterable[str],
+    strip_boilerplate: bool = True,
+    debug_txt: bool = False,
+    outline: Sequence[Tuple[int, List[str]]] = (),
+    backend: str = DEFAULT_BACKEND,
+    quarantined: Sequence[int] = (),
+) -> None:
+    """Limpia y escribe las paginas a medida que llegan, en ``{slug}.pages.jsonl`` + ``.pages.idx``.
+
+    Detectar boilerplate necesita ver todas las paginas antes de limpiar la primera: en ese
+    caso el texto crudo se vuelca a un temporal en disco mientras se cuentan las lineas de
+    borde, y se relee despues. En memoria solo queda una pagina a la vez.
+
+    Con ``outline`` (ver ``read_outline``) cada pagina guarda ``section_path``: la ruta del
+    ultimo marcador que empieza en ella o antes. ``quarantined`` (paginas que el watchdog no
+    pudo extraer) queda en la metadata del indice.
+    """
+
+    with tempfile.TemporaryFile("w+", encoding="utf-8", suffix=".raw") as spill:
+        boilerplate: Set[str] = set()
+        if strip_boilerplate:
+            detector = BoilerplateDetector()
+            for text in raw_pages:
+                detector.add(text)
+                spill.write(json.dumps(text, ensure_ascii=False))
+                spill.write("\n")
+            boilerplate = detector.keys()
+            spill.seek(0)
+            raw_pages = (json.loads(line) for line in spill)
+
+        debug_path = manual.intermediate_txt_path if debug_txt else None
+        with PageWriter(manual.intermediate_pages_path, manual.intermediate_index_path, debug_path) as writer:
+            total_pages = 0
+            section: List[str] = []
+            cursor = 0
+            for total_pages, text in enumerate(raw_pages, start=1):
+                while cursor < len(outline) and outline[cursor][0] <= total_pages:
+                    section = outline[cursor][1]
+                    cursor += 1
+                if boilerplate:
+                    text = strip_boilerplate_lines(text, boilerplate)
+                cleaned = clean_text(text)
+                if cleaned:
+                    writer.add(total_pages, cleaned, section)
+
+            metadata = {
+                "model_key": manual.key,
+                "slug": manual.slug,
+                "display_name": manual.display_name,
+                "document_title": manual.document_title,
+                "pdf_source": str(manual.raw_pdf_path.name),
+                "total_pages": total_pages,
+                "extracted_pages": len(writer),
+                "backend": backend,
+                "quarantined_pages": list(quarantined),
+                "boilerplate_removed": sorted(boilerplate),
+                "outline": [{"page": page, "path": path} for page, path in outline],
+                "extracted_at": now_iso(),
+            }
+            writer.finish(metadata, total_pages)
+
+    count_items("pages", total_pages)
+    count_items("extracted_pages", len(writer))
+    count_items("chars", writer.chars)
+
+    print(f"[OK] Texto extraido en {manual.intermediate_pages_path.name} ({len(writer)}/{total_pages} paginas)")
+
+
+def migrate_legacy_manuals(manuals: Sequence[ManualConfig], force: bool = False) -> int:
+    """Reescribe los ``{slug}.json`` del formato anterior como ``.pages.jsonl`` + ``.pages.idx``."""
+
+    for manual in manuals:
+        legacy = manual.intermediate_json_path
+        if not legacy.exists():
+            print(f"[SKIP] {manual.display_name}: no hay {legacy.name}")
+            continue
+        if manual.intermediate_pages_path.exists() and not force:
+            print(f"[SKIP] {manual.display_name}: {manual.intermediate_pages_path.name} ya existe (usa --force)")
+            continue
+        try:
+            with legacy.open(encoding="utf-8") as f:
+                metadata = json.load(f).get("metadata", {})
+            with PageWriter(manual.intermediate_pages_path, manual.intermediate_index_path) as writer:
+                for page in iter_intermediate_pages(legacy):
+                    writer.add(page["page_number"], page["text"])
+                writer.finish(metadata, int(metadata.get("total_pages", len(writer))))
         except Exception as exc:
             print(f"[ERROR] {manual.display_name}: {exc}", file=sys.stderr)
             return 1
-
+        print(f"[OK] {legacy.name} -> {manual.intermediate_pages_path.name} ({len(writer)} paginas)")
     return 0
 
 
-def extract_manual(manual: ManualConfig) -> None:
-    pdf_path = manual.raw_pdf_path
-    reader = PdfReader(str(pdf_path))
+# Encabezados/pies de pagina: lineas en los bordes de la pagina que se repiten (con los
+# numeros normalizados) en al menos BOILERPLATE_MIN_FRACTION de las paginas con texto.
+BOILERPLATE_MIN_FRACTION = 0.5
+BOILERPLATE_EDGE_LINES = 3
+BOILERPLATE_MIN_PAGES = 4
+_DIGITS = re.compile(r"\d+")
 
-    pages_output: List[dict] = []
-    combined_text_lines: List[str] = []
 
-    for index, page in enumerate(tqdm(reader.pages, desc=manual.slug, unit="pag"), start=1):
-        raw_text = page.extract_text() or ""
-        cleaned = clean_text(raw_text)
-        if not cleaned:
-            continue
+def boilerplate_line_key(line: str) -> str:
+    return _DIGITS.sub("#", " ".join(line.split())).lower()
 
-        pages_output.append(
-            {
-                "page_number": index,
-                "text": cleaned,
-                "char_count": len(cleaned),
-            }
-        )
-        combined_text_lines.append(f"--- Pagina {index} ---\n{cleaned}\n")
 
-    metadata = {
-        "model_key": manual.key,
-        "slug": manual.slug,
-        "display_name": manual.display_name,
-        "document_title": manual.document_title,
-        "pdf_source": str(pdf_path.name),
-        "total_pages": len(reader.pages),
-        "extracted_pages": len(pages_output),
-        "extracted_at": now_iso(),
-    }
+def _edge_line_indexes(lines: Sequence[str], edge_lines: int) -> List[int]:
+    filled = [index for index, line in enumerate(lines) if line.strip()]
+    if len(filled) <= 2 * edge_lines:
+        return filled
+    return filled[:edge_lines] + filled[-edge_lines:]
 
-    data = {"metadata": metadata, "pages": pages_output}
 
-    ensure_directory(manual.intermediate_json_path)
-    ensure_directory(manual.intermediate_txt_path)
+class BoilerplateDetector:
+    """Cuenta las lineas de borde pagina a pagina, sin guardar el texto de las paginas."""
 
-    with manual.intermediate_json_path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    def __init__(self, min_fraction: float = BOILERPLATE_MIN_FRACTION, edge_lines: int = BOILERPLATE_EDGE_LINES):
+        self.min_fraction = min_fraction
+        self.edge_lines = edge_lines
+        self.counts: Counter = Counter()
+        self.pages_with_text = 0
 
-    with manual.intermediate_txt_path.open("w", encoding="utf-8") as f:
-        f.write("\n".join(combined_text_lines))
+    def add(self, text: str) -> None:
+        lines = text.replace("\r", "\n").split("\n")
+        indexes = _edge_line_indexes(lines, self.edge_lines)
+        if not indexes:
+            return
+        self.pages_with_text += 1
+        self.counts.update({boilerplate_line_key(lines[index]) for index in indexes})
 
-    print(f"[OK] Texto extraido en {manual.intermediate_json_path.name}")
+    def keys(self) -> Set[str]:
+        """Claves de las lineas de borde que se repiten en la mayoria de las paginas vistas."""
 
+        if self.pages_with_text < BOILERPLATE_MIN_PAGES:
+            return set()
+        threshold = max(2, math.ceil(self.min_fraction * self.pages_with_text))
+        return {key for key, count in self.counts.items() if count >= threshold}
 
-_MULTISPACE = re.compile(r"[ \t]+")
+
+def detect_boilerplate(
+    raw_pages: Iterable[str],
+    min_fraction: float = BOILERPLATE_MIN_FRACTION,
+    edge_lines: int = BOILERPLATE_EDGE_LINES,
+) -> Set[str]:
+    """Claves de las lineas de borde que se repiten en la mayoria de las paginas del manual."""
+
+    detector = BoilerplateDetector(min_fraction, edge_lines)
+    for text in raw_pages:
+        detector.add(text)
+    return detector.keys()
+
+
+def strip_boilerplate_lines(text: str, boilerplate: Set[str], edge_lines: int = BOILERPLATE_EDGE_LINES) -> str:
+    lines = text.replace("\r", "\n").split("\n")
+    drop = {index for index in _edge_line_indexes(lines, edge_lines) if boilerplate_line_key(lines[index]) in boilerplate}
+    if not drop:
+        return text
+    return "\n".join(line for index, line in enumerate(lines) if index not in drop)
+
+
+# Patrones precompilados de clean_text. Cada paso es una pasada en C; los pasos poco
+# frecuentes se saltan con una busqueda de subcadena antes de invocar al regex.
+_LINE_BREAK = re.compile(r"(?<!\n)\n(?!\n)")
+_MULTISPACE = re.compile(r"[ \t]{2,}|\t")
 _BLANK_LINES = re.compile(r"\n{3,}")
+_PAGE_FOOTER = re.compile(r"Pagina \d+ de \d+", re.IGNORECASE)
+_TESLA_INC = re.compile(r"Tesla,?\s+Inc\.")
 
 
 def clean_text(text: str) -> str:
     """Heuristicas basicas para limpiar texto extraido de PDF."""
 
     text = text.replace("\r", "\n")
-    text = text.replace("\u00ad\n", "")
-    text = text.replace("\u00ad", "")
+    if "\u00ad" in text:
+        text = text.replace("\u00ad\n", "").replace("\u00ad", "")
 
     # Unir palabras cortadas por salto de linea con guion.
-    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
-
-    # Saltos simples -> espacio; doble salto preserva parrafos.
-    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
+    if "-\n" in text:
+        text = _join_hyphenated(text)
 
-    text = _MULTISPACE.sub(" ", text)
+    # Saltos simples -> espacio; doble salto preserva parrafos. Solo se reemplazan
+    # las corridas de espacios que cambian (2+ espacios o tabs), no cada espacio.
+    text = _MULTISPACE.sub(" ", _LINE_BREAK.sub(" ", text))
     text = _BLANK_LINES.sub("\n\n", text.strip())
 
-    text = re.sub(r"Pagina \d+ de \d+", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"Tesla,?\s+Inc\.", "", text)
+    text = _PAGE_FOOTER.sub("", text)
+    if "Tesla" in text:
+        text = _TESLA_INC.sub("", text)
 
     return text.strip()
 
 
+def _join_hyphenated(text: str) -> str:
+    """Equivale a ``re.sub(r"(\w)-\n(\w)", r"\1\2", text)`` sin escanear cada caracter.
+
+    Como en el regex, la letra que sigue a un corte ya unido no puede iniciar otro
+    (las coincidencias no se solapan): ``"a-\nb-\nc"`` -> ``"ab-\nc"``.
+    """
+
+    parts = text.split("-\n")
+    joined = [parts[0]]
+    previous_consumed = False
+    previous_part = parts[0]
+    for part in parts[1:]:
+        head = joined[-1]
+        if (
+            head
+            and part
+            and _is_word_char(head[-1])
+            and _is_word_char(part[0])
+            and not (previous_consumed and len(previous_part) == 1)
+        ):
+            joined[-1] = head + part
+            previous_consumed = True
+        else:
+            joined.append(part)
+            previous_consumed = False
+        previous_part = part
+    return "-\n".join(joined)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
 
@@ -0,0 +1,576 @@
+"""Prueba de carga de ``POST /api/chat``: latencias p50/p95/p99, throughput y tasa de error.
+
+Genera preguntas a partir de los chunks procesados (o lee un JSONL ``{question, model}``,
+p. ej. ``config/eval_questions.jsonl``) y las envia con asyncio a una tasa fija (``--qps``,
+lazo abierto) o con un numero fijo de clientes (``--concurrency``, lazo cerrado). Varios
+valores forman una escalera de pasos para ver donde se satura el servicio. Todas las
+requests comparten un unico pool de conexiones (``httpx.AsyncClient``).
+
+Con ``--standins`` levanta stand-ins locales de Nomic (``/query/topk``, BM25) y del LLM
+(``/api/generate``) con latencia configurable, y ``--server-cmd`` arranca el backend
+apuntando a ellos (``NOMIC_BASE_URL``/``LLM_BASE_URL``). ``--replica`` recorre el mismo
+camino con el port en Python (``chat_retrieval.py``) en vez del backend Node y separa el
+tiempo de cada etapa.
+
+    python scripts/loadtest_chat.py --standins --server-cmd "npm --prefix server start" --qps 2 5 10 20
+    python scripts/loadtest_chat.py --url https://mi-app.onrender.com/api/chat --concurrency 1 2 4 --duration 60
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from chat_retrieval import (
+    DEFAULT_NOMIC_K,
+    NOMIC_TIMEOUT_S,
+    normalize_model,
+    parse_topk,
+    select_relevant,
+    topk_payload,
+)
+from context_packing import build_prompt
+from evaluate_retrieval import percentile
+from utils import (
+    DATA_DIR,
+    REPO_ROOT,
+    ManualConfig,
+    ensure_directory,
+    extract_terms,
+    filter_manuals,
+    iter_jsonl,
+    load_manuals_config,
+    now_iso,
+)
+
+DEFAULT_URL = "http://localhost:3000/api/chat"
+RESULTS_PATH = DATA_DIR / "bench" / "loadtest_chat.json"
+SERVER_LOG_PATH = DATA_DIR / "bench" / "loadtest_server.log"
+# El backend exige que NOMIC_PROJECTION_ID sea un UUID.
+STANDIN_PROJECTION_ID = "00000000-0000-4000-8000-000000000000"
+LLM_MODEL_NAME = "integracion"
+LLM_TIMEOUT_S = 120
+HISTOGRAM_BOUNDS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+HISTOGRAM_WIDTH = 40
+QUESTION_TEMPLATES = ("¿Qué dice el manual sobre {}?", "¿Cómo funciona {}?", "¿Dónde se configura {}?")
+# Un paso se considera saturado si atiende menos del 90% de la tasa ofrecida, si su p95
+# duplica el del primer paso o si mas del 1% de las requests fallan.
+SATURATION_THROUGHPUT = 0.9
+SATURATION_LATENCY = 2.0
+MAX_ERROR_RATE = 0.01
+
+
+@dataclass(frozen=True)
+class ChatRequest:
+    model: str
+    question: str
+
+
+@dataclass
+class Sample:
+    latency_ms: float
+    outcome: str  # codigo HTTP ("200", "404", ...) o la excepcion del cliente ("ReadTimeout", ...)
+    finished: float  # time.perf_counter() al recibir la respuesta
+    stages: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def is_error(self) -> bool:
+        # 4xx son respuestas validas del chat (p. ej. 404 sin fragmentos relevantes).
+        return not self.outcome.isdigit() or int(self.outcome) >= 500
+
+
+@dataclass
+class StepResult:
+    mode: str
+    level: float
+    elapsed_s: float
+    sent: int
+    ok: int
+    outcomes: Dict[str, int]
+    throughput_rps: float
+    error_rate: float
+    latency_ms: Dict[str, float]
+    histogram: List[int]
+    stages_ms: Dict[str, Dict[str, float]]
+
+    @property
+    def label(self) -> str:
+        return f"{self.mode}={self.level:g}"
+
+
+class ChatTarget:
+    """``POST /api/chat`` del backend."""
+
+    def __init__(self, client, url: str):
+        self.client = client
+        self.url = url
+
+    async def __call__(self, request: ChatRequest) -> Tuple[str, Dict[str, float]]:
+        response = await self.client.post(self.url, json={"model": request.model, "question": request.question})
+        return str(response.status_code), {}
+
+
+class ReplicaTarget:
+    """El camino de ``routes/chat.ts`` en Python: topk, filtro ``hasOverlap``, prompt y LLM."""
+
+    def __init__(self, client, nomic_url: str, llm_url: str, projection_id: str, k: int):
+        self.client = client
+        self.topk_url = f"{nomic_url.rstrip('/')}/query/topk"
+        self.generate_url = f"{llm_url.rstrip('/')}/api/generate"
+        self.projection_id = projection_id
+        self.k = k
+
+    async def __call__(self, request: ChatRequest) -> Tuple[str, Dict[str, float]]:
+        stages: Dict[str, float] = {}
+        model_slug = normalize_model(request.model)
+        if not model_slug:
+            return "400", stages
+
+        started = time.perf_counter()
+        payload = topk_payload(self.projection_id, request.question, self.k)
+        try:
+            response = await self.client.post(self.topk_url, json=payload, timeout=NOMIC_TIMEOUT_S)
+            if response.status_code != 200:
+                # nomicClient.ts reintenta una vez antes de rendirse.
+                response = await self.client.post(self.topk_url, json=payload, timeout=NOMIC_TIMEOUT_S)
+            response.raise_for_status()
+            chunks = parse_topk(response.json(), model_slug, self.k)
+        except Exception:
+            return "502", stages
+        finally:
+            stages["nomic_ms"] = _elapsed_ms(started)
+        if not chunks:
+            return "404", stages
+
+        started = time.perf_counter()
+        relevant = select_relevant(request.question, chunks)
+        prompt = build_prompt(request.question, relevant)
+        stages["filter_ms"] = _elapsed_ms(started)
+        if not relevant:
+            return "404", stages
+
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(
+                self.generate_url,
+                json={"model": LLM_MODEL_NAME, "prompt": prompt, "stream": False},
+                timeout=LLM_TIMEOUT_S,
+            )
+            response.raise_for_status()
+            answer = response.json().get("response")
+        except Exception:
+            return "502", stages
+        finally:
+            stages["llm_ms"] = _elapsed_ms(started)
+        return ("200" if isinstance(answer, str) and answer.strip() else "502"), stages
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Prueba de carga de /api/chat con asyncio (latencias, throughput y errores).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--url", default=DEFAULT_URL, help="Endpoint /api/chat a probar.")
+    load = parser.add_mutually_exclusive_group(required=True)
+    load.add_argument("--qps", type=float, nargs="+", help="Tasas a ofrecer (requests/s), un paso por valor.")
+    load.add_argument("--concurrency", type=int, nargs="+", help="Clientes simultaneos, un paso por valor.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos por paso.")
+    parser.add_argument("--poisson", action="store_true", help="Con --qps, llegadas de Poisson en vez de equiespaciadas.")
+    parser.add_argument("--connections", type=int, default=100, help="Tamanio del pool de conexiones HTTP.")
+    parser.add_argument("--timeout", type=float, default=130.0, help="Timeout por request (el LLM tiene 120 s).")
+    parser.add_argument("--questions", type=Path, help="JSONL con {question, model}. Sin esto se generan desde los chunks.")
+    parser.add_argument("--num-questions", type=int, default=200, help="Preguntas a generar desde los chunks.")
+    parser.add_argument("--only", nargs="+", help="Filtra manuales por key/slug/nombre. Ej: --only model_y")
+    parser.add_argument("--seed", type=int, default=13, help="Semilla para preguntas, llegadas y stand-ins.")
+    parser.add_argument("--standins", action="store_true", help="Levanta stand-ins locales de Nomic y del LLM.")
+    parser.add_argument(
+        "--replica",
+        action="store_true",
+        help="Mide el port en Python de chat.ts contra los stand-ins en vez del backend (implica --standins).",
+    )
+    parser.add_argument(
+        "--server-cmd",
+        help='Comando que arranca el backend (p. ej. "npm --prefix server start"); con --standins apunta a ellos.',
+    )
+    parser.add_argument("--server-timeout", type=float, default=60.0, help="Segundos de espera a que responda /health.")
+    parser.add_argument("--nomic-latency-ms", type=float, default=150.0, help="Latencia mediana del stand-in de Nomic.")
+    parser.add_argument("--llm-latency-ms", type=float, default=2000.0, help="Latencia mediana del stand-in del LLM.")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Dispersion log-normal de las latencias simuladas.")
+    parser.add_argument("--llm-concurrency", type=int, help="Requests que el stand-in del LLM atiende a la vez.")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="Fraccion de 503 del stand-in del LLM.")
+    parser.add_argument("--k", type=int, default=DEFAULT_NOMIC_K, help="NOMIC_K del backend (solo con --replica).")
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH, help="Reporte JSON.")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    if importlib.util.find_spec("httpx") is None:
+        print("[ERROR] loadtest_chat.py requiere httpx: pip install httpx", file=sys.stderr)
+        return 1
+
+    standins = args.standins or args.replica
+    try:
+        manuals = filter_manuals(load_manuals_config(), args.only)
+        if args.questions:
+            questions = load_questions(args.questions)
+        else:
+            questions = questions_from_chunks(manuals, args.num_questions, args.seed)
+        records = list(itertools.chain.from_iterable(iter_jsonl(m.processed_jsonl_path) for m in manuals)) if standins else []
+    except FileNotFoundError as exc:
+        print(f"[ERROR] No se encontro {exc.filename}; ejecuta primero chunk_manuals.py.", file=sys.stderr)
+        return 1
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+    if not questions:
+        print("[ERROR] No hay preguntas para la prueba.", file=sys.stderr)
+        return 1
+    print(f"[INFO] {len(questions)} preguntas")
+
+    with ExitStack() as stack:
+        replica_urls = None
+        server_env: Dict[str, str] = {}
+        if standins:
+            from standins import LlmGenerateStandIn, NomicTopkStandIn
+
+            nomic = stack.enter_context(
+                NomicTopkStandIn(latency=args.nomic_latency_ms / 1000, jitter=args.jitter, seed=args.seed)
+            )
+            nomic.add_projection(STANDIN_PROJECTION_ID, records)
+            llm = stack.enter_context(
+                LlmGenerateStandIn(
+                    latency=args.llm_latency_ms / 1000,
+                    jitter=args.jitter,
+                    concurrency=args.llm_concurrency,
+                    failure_rate=args.llm_failure_rate,
+                    seed=args.seed,
+                )
+            )
+            print(f"[INFO] Stand-ins: Nomic {nomic.base_url} ({len(records)} chunks), LLM {llm.base_url}")
+            replica_urls = (nomic.base_url, llm.base_url) if args.replica else None
+            server_env = standin_server_env(nomic.base_url, llm.base_url, args.url)
+
+        if not args.replica:
+            if args.server_cmd:
+                try:
+                    process = start_server(args.server_cmd, server_env)
+                except OSError as exc:
+                    print(f"[ERROR] No se pudo ejecutar --server-cmd: {exc}", file=sys.stderr)
+                    return 1
+                stack.callback(stop_server, process)
+            elif server_env:
+                print("[INFO] Arranca el backend con estas variables (o usa --server-cmd):")
+                for key, value in server_env.items():
+                    print(f"  {key}={value}")
+            if not wait_for_health(health_url(args.url), args.server_timeout):
+                print(f"[ERROR] {health_url(args.url)} no respondio en {args.server_timeout:.0f} s.", file=sys.stderr)
+                return 1
+
+        results = asyncio.run(run_steps(args, questions, replica_urls))
+
+    saturation = saturation_step(results)
+    if saturation is None:
+        print("[OK] Sin saturacion en los pasos probados.")
+    else:
+        step, reason = saturation
+        print(f"[WARN] Saturacion desde {step.label}: {reason}")
+
+    ensure_directory(args.output)
+    with args.output.open("w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "generated_at": now_iso(),
+                "target": "replica" if args.replica else args.url,
+                "duration_s": args.duration,
+                "questions": len(questions),
+                "connections": args.connections,
+                "standins": {
+                    "nomic_latency_ms": args.nomic_latency_ms,
+                    "llm_latency_ms": args.llm_latency_ms,
+                    "jitter": args.jitter,
+                    "llm_concurrency": args.llm_concurrency,
+                    "llm_failure_rate": args.llm_failure_rate,
+                }
+                if standins
+                else None,
+                "histogram_bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+                "steps": [asdict(result) for result in results],
+                "saturation": {"step": saturation[0].label, "reason": saturation[1]} if saturation else None,
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    print(f"[OK] Resultados -> {args.output}")
+    return 0
+
+
+def load_questions(path: Path) -> List[ChatRequest]:
+    questions: List[ChatRequest] = []
+    for line_number, raw in enumerate(iter_jsonl(path), start=1):
+        try:
+            questions.append(ChatRequest(str(raw["model"]), str(raw["question"])))
+        except (KeyError, TypeError) as exc:
+            raise ValueError(f"{path.name}:{line_number}: se esperaba {{question, model}} ({exc})") from exc
+    return questions
+
+
+def questions_from_chunks(manuals: Sequence[ManualConfig], count: int, seed: int) -> List[ChatRequest]:
+    """Una pregunta por chunk elegido al azar (muestreo de reservorio), con terminos de su inicio."""
+
+    rnd = random.Random(seed)
+    sample: List[dict] = []
+    for seen, record in enumerate(itertools.chain.from_iterable(iter_jsonl(m.processed_jsonl_path) for m in manuals)):
+        if len(sample) < count:
+            sample.append(record)
+        else:
+            slot = rnd.randrange(seen + 1)
+            if slot < count:
+                sample[slot] = record
+
+    questions = []
+    for record in sample:
+        terms = [term for term in extract_terms(record.get("text", "")[:300]) if len(term) >= 5][:3]
+        if terms:
+            template = rnd.choice(QUESTION_TEMPLATES)
+            questions.append(ChatRequest(record["metadata"].get("model_slug", ""), template.format(" ".join(terms))))
+    return questions
+
+
+def standin_server_env(nomic_url: str, llm_url: str, chat_url: str) -> Dict[str, str]:
+    return {
+        "PORT": str(urlsplit(chat_url).port or 3000),
+        "NOMIC_API_KEY": "standin",
+        "NOMIC_PROJECTION_ID": STANDIN_PROJECTION_ID,
+        "NOMIC_BASE_URL": nomic_url,
+        "LLM_BASE_URL": llm_url,
+        "LLM_MODEL_NAME": LLM_MODEL_NAME,
+    }
+
+
+def health_url(chat_url: str) -> str:
+    parts = urlsplit(chat_url)
+    return f"{parts.scheme}://{parts.netloc}/health"
+
+
+def start_server(command: str, env: Dict[str, str]) -> subprocess.Popen:
+    ensure_directory(SERVER_LOG_PATH)
+    with SERVER_LOG_PATH.open("wb") as log:
+        process = subprocess.Popen(
+            shlex.split(command), cwd=REPO_ROOT, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT
+        )
+    print(f"[INFO] Backend iniciado (pid {process.pid}); log en {SERVER_LOG_PATH}")
+    return process
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def wait_for_health(url: str, timeout: float) -> bool:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+async def run_steps(
+    args: argparse.Namespace,
+    questions: Sequence[ChatRequest],
+    replica_urls: Optional[Tuple[str, str]],
+) -> List[StepResult]:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    # Sin timeout de pool: la espera por una conexion libre cuenta como latencia.
+    timeout = httpx.Timeout(args.timeout, pool=None)
+    rnd = random.Random(args.seed)
+    results: List[StepResult] = []
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        if replica_urls:
+            target = ReplicaTarget(client, *replica_urls, STANDIN_PROJECTION_ID, args.k)
+        else:
+            target = ChatTarget(client, args.url)
+        for level in args.qps or args.concurrency:
+            if args.qps:
+                samples, elapsed = await run_open_loop(target, questions, level, args.duration, rnd, args.poisson)
+            else:
+                samples, elapsed = await run_closed_loop(target, questions, level, args.duration)
+            results.append(summarize("qps" if args.qps else "concurrency", level, samples, elapsed))
+            print_step(results[-1])
+    return results
+
+
+async def run_open_loop(
+    target, questions: Sequence[ChatRequest], qps: float, duration: float, rnd: random.Random, poisson: bool
+) -> Tuple[List[Sample], float]:
+    """Lanza requests a la tasa pedida sin esperar respuestas; la latencia se mide desde el
+    instante programado, asi un servicio lento no frena el generador (coordinated omission)."""
+
+    start = time.perf_counter()
+    tasks = []
+    offset = 0.0
+    while offset < duration:
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        request = questions[len(tasks) % len(questions)]
+        tasks.append(asyncio.create_task(timed(target, request, start + offset)))
+        offset += rnd.expovariate(qps) if poisson else 1 / qps
+    samples = await asyncio.gather(*tasks)
+    return list(samples), time.perf_counter() - start
+
+
+async def run_closed_loop(
+    target, questions: Sequence[ChatRequest], concurrency: int, duration: float
+) -> Tuple[List[Sample], float]:
+    start = time.perf_counter()
+    deadline = start + duration
+    order = itertools.count()
+    samples: List[Sample] = []
+
+    async def client_loop() -> None:
+        while time.perf_counter() < deadline:
+            request = questions[next(order) % len(questions)]
+            samples.append(await timed(target, request, time.perf_counter()))
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+async def timed(target, request: ChatRequest, started: float) -> Sample:
+    try:
+        outcome, stages = await target(request)
+    except Exception as exc:  # timeouts, conexiones rechazadas, ...
+        outcome, stages = type(exc).__name__, {}
+    return Sample(_elapsed_ms(started), outcome, time.perf_counter(), stages)
+
+
+def summarize(mode: str, level: float, samples: Sequence[Sample], elapsed: float) -> StepResult:
+    """Latencias sobre las respuestas 200; la tasa de error cuenta 5xx y fallas del cliente.
+
+    El throughput se mide entre la primera y la ultima respuesta 200: en un servicio sin
+    saturar ese intervalo dura lo mismo que el paso; saturado, las respuestas se alargan
+    mas alla del paso y el throughput cae por debajo de la tasa ofrecida.
+    """
+
+    ok = [sample for sample in samples if sample.outcome == "200"]
+    latencies = [sample.latency_ms for sample in ok]
+    outcomes: Dict[str, int] = {}
+    for sample in samples:
+        outcomes[sample.outcome] = outcomes.get(sample.outcome, 0) + 1
+    histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for latency in latencies:
+        histogram[bisect_left(HISTOGRAM_BOUNDS_MS, latency)] += 1
+    stage_names = list(dict.fromkeys(name for sample in ok for name in sample.stages))
+    stages_ms = {
+        name: {
+            "p50": round(percentile([s.stages[name] for s in ok if name in s.stages], 50), 1),
+            "p95": round(percentile([s.stages[name] for s in ok if name in s.stages], 95), 1),
+        }
+        for name in stage_names
+    }
+    errors = sum(sample.is_error for sample in samples)
+    finished = sorted(sample.finished for sample in ok)
+    span = finished[-1] - finished[0] if len(finished) > 1 else elapsed
+    return StepResult(
+        mode=mode,
+        level=level,
+        elapsed_s=round(elapsed, 3),
+        sent=len(samples),
+        ok=len(ok),
+        outcomes=dict(sorted(outcomes.items())),
+        throughput_rps=round((len(ok) - 1) / span, 3) if len(ok) > 1 and span > 0 else 0.0,
+        error_rate=round(errors / len(samples), 4) if samples else 0.0,
+        latency_ms={
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(max(latencies, default=0.0), 1),
+        },
+        histogram=histogram,
+        stages_ms=stages_ms,
+    )
+
+
+def print_step(result: StepResult) -> None:
+    latency = result.latency_ms
+    print(
+        f"[INFO] {result.label:<16} {result.sent} enviadas, {result.ok} ok, {result.throughput_rps:.2f} resp/s, "
+        f"errores {result.error_rate:.1%}  p50 {latency['p50']:.0f} ms  p95 {latency['p95']:.0f} ms  "
+        f"p99 {latency['p99']:.0f} ms  max {latency['max']:.0f} ms"
+    )
+    others = {outcome: count for outcome, count in result.outcomes.items() if outcome != "200"}
+    if others:
+        print(f"       respuestas no 200: {others}")
+    for name, stats in result.stages_ms.items():
+        print(f"       {name:<10} p50 {stats['p50']:.0f} ms  p95 {stats['p95']:.0f} ms")
+    for line in histogram_lines(result.histogram):
+        print(f"       {line}")
+
+
+def histogram_lines(histogram: Sequence[int]) -> List[str]:
+    """Barras por rango de latencia, desde el primer rango con datos hasta el ultimo."""
+
+    filled = [index for index, count in enumerate(histogram) if count]
+    if not filled:
+        return []
+    peak = max(histogram)
+    lines = []
+    for index in range(filled[0], filled[-1] + 1):
+        if index < len(HISTOGRAM_BOUNDS_MS):
+            label = f"<= {HISTOGRAM_BOUNDS_MS[index]:>6} ms"
+        else:
+            label = f" > {HISTOGRAM_BOUNDS_MS[-1]:>6} ms"
+        bar = "#" * round(HISTOGRAM_WIDTH * histogram[index] / peak)
+        lines.append(f"{label} |{bar:<{HISTOGRAM_WIDTH}}| {histogram[index]}")
+    return lines
+
+
+def saturation_step(results: Sequence[StepResult]) -> Optional[Tuple[StepResult, str]]:
+    """Primer paso con errores, throughput por debajo de lo ofrecido o p95 disparado."""
+
+    if not results:
+        return None
+    baseline = results[0].latency_ms["p95"]
+    for result in results:
+        if result.error_rate > MAX_ERROR_RATE:
+            return result, f"errores {result.error_rate:.1%}"
+        if result.mode == "qps" and result.throughput_rps < SATURATION_THROUGHPUT * result.level:
+            return result, f"{result.throughput_rps:.2f} resp/s de {result.level:g} ofrecidas"
+        if baseline and result.latency_ms["p95"] > SATURATION_LATENCY * baseline:
+            return result, f"p95 {result.latency_ms['p95']:.0f} ms vs {baseline:.0f} ms en {results[0].label}"
+    return None
+
+
+def _elapsed_ms(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from binfmt import le_bytes, pad, padding, unpack_header
+from utils import ManualConfig, ensure_directory, iter_intermediate_pages
+
+# Formato intermedio por manual (reemplaza al JSON con indent=2):
+#   {slug}.pages.jsonl  un registro {"page_number", "text", "char_count"} por pagina con texto
+#                       (+ "section_path" si el PDF tiene marcadores)
+#   {slug}.pages.idx    indice little-endian:
+#     header <4sHHIIQI  magic, version, reservado, n_registros, paginas del PDF, bytes del JSONL,
+#                       bytes de metadata JSON
+#     metadata JSON (modelo, boilerplate_removed, extracted_at, ...), alineada a 8 bytes
+#     offsets u64[n] | lengths u32[n] | page_numbers u32[n] (ordenados, + padding)
+PAGES_MAGIC = b"T3PG"
+PAGES_VERSION = 1
+_HEADER = struct.Struct("<4sHHIIQI")
+
+
+class PageWriter:
+    """Escribe las paginas de un manual a medida que se limpian; ``finish`` publica el indice.
+
+    Ambos archivos se escriben como ``.tmp`` y se renombran al final, asi un lector nunca
+    ve un JSONL a medio escribir. Si el bloque ``with`` falla, los temporales se borran.
+    """
+
+    def __init__(self, pages_path: Path, index_path: Path, debug_txt_path: Optional[Path] = None):
+        self.pages_path = pages_path
+        self.index_path = index_path
+        self.debug_txt_path = debug_txt_path
+        ensure_directory(pages_path)
+        self._temps = [pages_path.with_name(pages_path.name + ".tmp"), index_path.with_name(index_path.name + ".tmp")]
+        self._pages = self._temps[0].open("wb")
+        self._debug = None
+        if debug_txt_path is not None:
+            self._temps.append(debug_txt_path.with_name(debug_txt_path.name + ".tmp"))
+            self._debug = self._temps[2].open("w", encoding="utf-8")
+        self._offsets = array("Q")
+        self._lengths = array("I")
+        self._page_numbers = array("I")
+        self._size = 0
+        self.chars = 0
+        self._finished = False
+
+    def __enter__(self) -> "PageWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if not self._finished:
+            self._close_files()
+            for path in self._temps:
+                path.unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._page_numbers)
+
+    def add(self, page_number: int, text: str, section_path: Optional[List[str]] = None) -> None:
+        if self._page_numbers and page_number <= self._page_numbers[-1]:
+            raise ValueError(f"Paginas fuera de orden: {page_number} despues de {self._page_numbers[-1]}")
+        record = {"page_number": page_number, "text": text, "char_count": len(text)}
+        if section_path:
+            record["section_path"] = section_path
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        self._pages.write(line + b"\n")
+        self._offsets.append(self._size)
+        self._lengths.append(len(line))
+        self._page_numbers.append(page_number)
+        self._size += len(line) + 1
+        self.chars += len(text)
+        if self._debug is not None:
+            # Mismo formato que el .txt de depuracion anterior.
+            if len(self) > 1:
+                self._debug.write("\n")
+            self._debug.write(f"--- Pagina {page_number} ---\n{text}\n")
+
+    def finish(self, metadata: dict, total_pages: int) -> None:
+        self._close_files()
+        metadata_blob = json.dumps(metadata, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self._temps[1].open("wb") as out:
+            out.write(
+                _HEADER.pack(PAGES_MAGIC, PAGES_VERSION, 0, len(self), total_pages, self._size, len(metadata_blob))
+            )
+            out.write(pad(metadata_blob))
+            for column in (self._offsets, self._lengths, self._page_numbers):
+                out.write(pad(le_bytes(column)))
+        self._temps[0].replace(self.pages_path)
+        self._temps[1].replace(self.index_path)
+        if self.debug_txt_path is not None:
+            self._temps[2].replace(self.debug_txt_path)
+        self._finished = True
+
+    def _close_files(self) -> None:
+        self._pages.close()
+        if self._debug is not None:
+            self._debug.close()
+
+
+class PageReader:
+    """Lectura perezosa de las paginas de un manual a traves de su indice (ambos via mmap).
+
+    Iterar recorre el JSONL en orden; ``get(n)`` y ``iter_range(a, b)`` buscan la pagina
+    por biseccion y solo decodifican los registros pedidos.
+    """
+
+    def __init__(self, pages_path: Path, index_path: Optional[Path] = None):
+        self.pages_path = pages_path
+        self.index_path = index_path or pages_path.with_suffix(".idx")
+
+        self._index_file = self.index_path.open("rb")
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _, _, _, count, self.total_pages, data_size, metadata_bytes = unpack_header(
+                _HEADER, self._index, PAGES_MAGIC, PAGES_VERSION, "indice de paginas", self.index_path.name
+            )
+        except (RuntimeError, ValueError):
+            self.close()
+            raise
+
+        self._data_file = self.pages_path.open("rb")
+        if self.pages_path.stat().st_size != data_size:
+            self.close()
+            raise ValueError(f"El indice {self.index_path.name} no corresponde a {self.pages_path.name}; vuelve a extraer.")
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) if data_size else b""
+
+        cursor = _HEADER.size
+        self.metadata: dict = json.loads(bytes(self._index[cursor : cursor + metadata_bytes]))
+        cursor += metadata_bytes + padding(metadata_bytes)
+        view = self._view = memoryview(self._index)
+        columns = []
+        for typecode, width in (("Q", 8), ("I", 4), ("I", 4)):
+            size = count * width
+            columns.append(view[cursor : cursor + size].cast(typecode))
+            cursor += size + padding(size)
+        self._offsets, self._lengths, self._page_numbers = columns
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> "PageReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[dict]:
+        return self._iter_rows(0, self._count)
+
+    def __contains__(self, page_number: int) -> bool:
+        row = bisect_left(self._page_numbers, page_number)
+        return row < self._count and self._page_numbers[row] == page_number
+
+    def close(self) -> None:
+        for name in ("_offsets", "_lengths", "_page_numbers", "_view"):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+                setattr(self, name, None)
+        for name in ("_data", "_index"):
+            handle = getattr(self, name, None)
+            if isinstance(handle, mmap.mmap):
+                handle.close()
+        for name in ("_data_file", "_index_file"):
+            handle = getattr(self, name, None)
+            if handle is not None:
+                handle.close()
+
+    def page_numbers(self) -> List[int]:
+        """Numeros de pagina con texto (las paginas vacias no se guardan)."""
+
+        return self._page_numbers.tolist()
+
+    def get(self, page_number: int) -> dict:
+        row = bisect_left(self._page_numbers, page_number)
+        if row >= self._count or self._page_numbers[row] != page_number:
+            raise KeyError(page_number)
+        return self._record(row)
+
+    def iter_range(self, first: int, last: int) -> Iterator[dict]:
+        """Paginas con ``first <= page_number <= last``, en orden."""
+
+        return self._iter_rows(bisect_left(self._page_numbers, first), bisect_right(self._page_numbers, last))
+
+    def _iter_rows(self, start: int, stop: int) -> Iterator[dict]:
+        for row in range(start, stop):
+            yield self._record(row)
+
+    def _record(self, row: int) -> dict:
+        offset = self._offsets[row]
+        return json.loads(self._data[offset : offset + self._lengths[row]])
+
+
+def intermediate_source_path(manual: ManualConfig) -> Path:
+    """Archivo de paginas del manual: el JSONL nuevo o, si no existe, el JSON intermedio anterior."""
+
+    if manual.intermediate_pages_path.exists() or not manual.intermediate_json_path.exists():
+        return manual.intermediate_pages_path
+    return manual.intermediate_json_path
+
+
+def iter_manual_pages(manual: ManualConfig) -> Iterator[dict]:
+    """Paginas extraidas de un manual en orden, sin cargar el documento completo."""
+
+    path = intermediate_source_path(manual)
+    if path == manual.intermediate_json_path:
+        yield from iter_intermediate_pages(path)
+        return
+    with PageReader(path, manual.intermediate_index_path) as reader:
+        yield from reader
@@ -0,0 +1,348 @@
+"""Extraccion de paginas con limite de tiempo y de memoria, en workers que se reciclan.
+
+Cada worker es un proceso aparte (``spawn``) que abre el PDF con el backend pedido y extrae
+las paginas que le manda el proceso principal, de a una:
+
+- ``page_timeout``: si una pagina tarda mas, el worker se mata y la pagina va a cuarentena.
+- ``memory_mb``: tope de memoria virtual del worker (``RLIMIT_AS``, solo POSIX). Una pagina
+  que lo agota falla con ``MemoryError`` (o el worker muere) y va a cuarentena.
+- ``pages_per_worker``: el worker se reemplaza despues de esa cantidad de paginas, asi lo
+  que retiene el parser (caches de fuentes, objetos ya resueltos) no crece sin limite.
+
+``PageJournal`` guarda el texto crudo de cada pagina apenas termina (``{slug}.raw.jsonl``):
+una corrida interrumpida retoma desde ahi, y las paginas en cuarentena se reintentan con
+``--retry-quarantine`` sin volver a extraer las demas. El proceso principal nunca abre el
+contenido de las paginas y solo retiene las que llegan antes de su turno.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import time
+from dataclasses import dataclass
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from utils import ensure_directory, now_iso
+
+# Tiempo para levantar un worker y abrir el PDF (ademas de ``page_timeout``).
+WORKER_START_TIMEOUT_S = 60.0
+# Paginas que se pueden adelantar por worker mientras se espera una pagina lenta.
+PAGES_AHEAD_PER_WORKER = 4
+
+
+@dataclass(frozen=True)
+class WatchdogLimits:
+    page_timeout: float = 0.0
+    memory_mb: int = 0
+    pages_per_worker: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.page_timeout or self.memory_mb or self.pages_per_worker)
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "WatchdogLimits":
+        return cls(args.page_timeout, args.max_memory_mb, args.pages_per_worker)
+
+
+def add_watchdog_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--page-timeout",
+        type=float,
+        default=0.0,
+        help="Segundos maximos por pagina; la que se pasa va a cuarentena (0 = sin limite).",
+    )
+    parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        default=0,
+        help="Tope de memoria de cada proceso extractor, en MB (RLIMIT_AS; 0 = sin limite).",
+    )
+    parser.add_argument(
+        "--pages-per-worker",
+        type=int,
+        default=0,
+        help="Reemplaza cada proceso extractor despues de estas paginas (0 = nunca).",
+    )
+    parser.add_argument(
+        "--retry-quarantine",
+        action="store_true",
+        help="Vuelve a intentar las paginas en cuarentena de una corrida anterior.",
+    )
+
+
+@dataclass
+class PageResult:
+    index: int
+    text: Optional[str] = None
+    error: Optional[str] = None
+
+
+class PageJournal:
+    """Texto crudo por pagina en un JSONL de solo agregado; la ultima linea de cada pagina manda.
+
+    La primera linea es ``{"inputs", "total_pages"}``: si no coincide con la corrida actual
+    (otro PDF u otro backend) el journal se descarta. Una linea cortada por una corrida
+    interrumpida se trunca al abrir. El texto no se carga en memoria: se guardan offsets.
+    """
+
+    def __init__(self, path: Path, inputs: str, total_pages: int):
+        self.path = path
+        self.offsets: Dict[int, int] = {}
+        self.quarantined: Dict[int, dict] = {}
+        header = {"inputs": inputs, "total_pages": total_pages}
+        size = self._load(header) if path.exists() else 0
+        ensure_directory(path)
+        self._file = path.open("r+b" if size else "w+b")
+        if size:
+            self._file.truncate(size)
+            self._file.seek(size)
+        else:
+            self._write(header)
+
+    @property
+    def resumed_pages(self) -> int:
+        return len(self.offsets) + len(self.quarantined)
+
+    def __enter__(self) -> "PageJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def record(self, result: PageResult) -> None:
+        if result.error is None:
+            offset = self._file.tell()
+            self._write({"index": result.index, "text": result.text or ""})
+            self.offsets[result.index] = offset
+            self.quarantined.pop(result.index, None)
+            return
+        attempts = self.quarantined.get(result.index, {}).get("attempts", 0) + 1
+        entry = {"index": result.index, "error": result.error, "attempts": attempts}
+        self._write(entry)
+        self.quarantined[result.index] = entry
+
+    def text(self, index: int) -> str:
+        """Texto crudo de la pagina ``index``; vacio si no se extrajo (cuarentena)."""
+
+        offset = self.offsets.get(index)
+        if offset is None:
+            return ""
+        self._file.seek(offset)
+        line = self._file.readline()
+        self._file.seek(0, 2)
+        return json.loads(line)["text"]
+
+    def _write(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+        # flush por pagina: si el proceso muere, lo ya escrito sirve para retomar.
+        self._file.flush()
+
+    def _load(self, header: dict) -> int:
+        size = 0
+        with self.path.open("rb") as f:
+            for line_number, line in enumerate(f):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                if line_number == 0:
+                    if entry != header:
+                        return 0
+                elif "text" in entry:
+                    self.offsets[entry["index"]] = size
+                    self.quarantined.pop(entry["index"], None)
+                else:
+                    self.offsets.pop(entry["index"], None)
+                    self.quarantined[entry["index"]] = entry
+                size += len(line)
+        return size
+
+
+def write_quarantine(path: Path, journal: PageJournal, metadata: dict) -> None:
+    """Publica la cuarentena del manual (paginas numeradas desde 1) o la borra si quedo vacia."""
+
+    if not journal.quarantined:
+        path.unlink(missing_ok=True)
+        return
+    pages = [
+        {"page": index + 1, "error": entry["error"], "attempts": entry["attempts"]}
+        for index, entry in sorted(journal.quarantined.items())
+    ]
+    ensure_directory(path)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump({**metadata, "pages": pages, "updated_at": now_iso()}, f, ensure_ascii=False, indent=2)
+
+
+class _Worker:
+    def __init__(self, context, pdf_path: Path, backend: str, memory_mb: int):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child, str(pdf_path), backend, memory_mb), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.index: Optional[int] = None
+        self.deadline = 0.0
+        self.pages = 0
+        if not self.conn.poll(WORKER_START_TIMEOUT_S):
+            self.kill()
+            raise RuntimeError(f"El extractor no abrio el PDF en {WORKER_START_TIMEOUT_S:.0f} s.")
+        try:
+            status, error = self.conn.recv()
+        except EOFError:
+            self.kill()
+            raise RuntimeError(f"El extractor termino al abrir el PDF (codigo {self.process.exitcode}).") from None
+        if status != "ready":
+            self.kill()
+            raise RuntimeError(f"El extractor no pudo abrir el PDF: {error}")
+
+    def send(self, index: int, timeout: float) -> None:
+        self.conn.send(index)
+        self.index = index
+        self.deadline = time.monotonic() + timeout if timeout else float("inf")
+        self.pages += 1
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class PageWatchdog:
+    """Extrae paginas de un PDF en ``workers`` procesos vigilados; ver el docstring del modulo."""
+
+    def __init__(self, pdf_path: Path, backend: str, limits: WatchdogLimits, workers: int = 1):
+        if limits.memory_mb and importlib.util.find_spec("resource") is None:
+            print("[WARN] Esta plataforma no permite limitar la memoria (RLIMIT_AS); solo se aplica el timeout.")
+            limits = WatchdogLimits(limits.page_timeout, 0, limits.pages_per_worker)
+        self.pdf_path = pdf_path
+        self.backend = backend
+        self.limits = limits
+        self.workers = max(1, workers)
+        # spawn: workers limpios (sin la memoria ni los hilos del proceso principal) para que
+        # RLIMIT_AS mida solo lo que usa el extractor.
+        self._context = multiprocessing.get_context("spawn")
+        self._slots: List[Optional[_Worker]] = [None] * self.workers
+
+    def __enter__(self) -> "PageWatchdog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for position, worker in enumerate(self._slots):
+            if worker is not None:
+                worker.stop()
+                self._slots[position] = None
+
+    def run(self, indexes: Sequence[int]) -> Iterator[PageResult]:
+        """Resultado de cada pagina de ``indexes``, en ese orden."""
+
+        ahead = self.workers * PAGES_AHEAD_PER_WORKER
+        results: Dict[int, PageResult] = {}
+        sent = 0
+        for position, index in enumerate(indexes):
+            while index not in results:
+                while sent < len(indexes) and sent < position + ahead and self._idle_slot() is not None:
+                    self._dispatch(self._idle_slot(), indexes[sent])
+                    sent += 1
+                for result in self._collect():
+                    results[result.index] = result
+            yield results.pop(index)
+
+    def _idle_slot(self) -> Optional[int]:
+        for position, worker in enumerate(self._slots):
+            if worker is None or worker.index is None:
+                return position
+        return None
+
+    def _dispatch(self, position: int, index: int) -> None:
+        worker = self._slots[position]
+        if worker is not None and self.limits.pages_per_worker and worker.pages >= self.limits.pages_per_worker:
+            worker.stop()
+            worker = None
+        if worker is None:
+            worker = self._slots[position] = _Worker(self._context, self.pdf_path, self.backend, self.limits.memory_mb)
+        worker.send(index, self.limits.page_timeout)
+
+    def _collect(self) -> Iterable[PageResult]:
+        busy = [(position, worker) for position, worker in enumerate(self._slots) if worker is not None and worker.index is not None]
+        if not busy:
+            return []
+        deadline = min(worker.deadline for _, worker in busy)
+        timeout = None if deadline == float("inf") else max(0.0, deadline - time.monotonic())
+        ready = set(wait([worker.conn for _, worker in busy], timeout=timeout))
+        now = time.monotonic()
+        collected = []
+        for position, worker in busy:
+            index = worker.index
+            if worker.conn in ready:
+                try:
+                    _, text, error, fatal = worker.conn.recv()
+                except (EOFError, OSError):
+                    worker.process.join(timeout=1)
+                    text, error, fatal = None, f"el extractor termino inesperadamente (codigo {worker.process.exitcode})", True
+            elif now >= worker.deadline:
+                text, error, fatal = None, f"excedio el limite de {self.limits.page_timeout:g} s", True
+            else:
+                continue
+            worker.index = None
+            if fatal:
+                worker.kill()
+                self._slots[position] = None
+            collected.append(PageResult(index, text, error))
+        return collected
+
+
+def _worker_main(conn: Connection, pdf_path: str, backend: str, memory_mb: int) -> None:
+    if memory_mb:
+        import resource
+
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        from pdf_backends import open_backend
+
+        pdf = open_backend(backend, Path(pdf_path))
+    except BaseException as exc:
+        conn.send(("error", f"{type(exc).__name__}: {exc}"))
+        return
+    conn.send(("ready", None))
+    with pdf:
+        while True:
+            try:
+                index = conn.recv()
+            except EOFError:
+                return
+            if index is None:
+                return
+            try:
+                conn.send((index, pdf.page_text(index), None, False))
+            except MemoryError:
+                # El heap puede quedar fragmentado: se responde y el worker se reemplaza.
+                limit = f" (limite {memory_mb} MB)" if memory_mb else ""
+                conn.send((index, None, f"memoria agotada{limit}", True))
+                return
+            except Exception as exc:
+                conn.send((index, None, f"{type(exc).__name__}: {exc}", False))
@@ -0,0 +1,269 @@
+"""Backends intercambiables para extraer el texto crudo de cada pagina de un PDF.
+
+- ``pypdf``: el de siempre, puro Python y sin dependencias extra (por defecto).
+- ``pdfminer``: pdfminer.six (``pip install pdfminer.six``). Analiza el layout, asi que
+  ordena mejor las paginas a varias columnas, a cambio de ser mas lento.
+- ``pdfium``: pypdfium2 (``pip install pypdfium2``), nativo y varias veces mas rapido.
+- ``auto``: prueba los backends instalados sobre una muestra de paginas del manual y usa el
+  mas rapido cuya salida pasa los controles de calidad (ver ``choose_backend``). La eleccion
+  queda en el indice de paginas y se reutiliza en las corridas siguientes, porque otro
+  backend cambia el texto crudo y con el los chunk_ids.
+
+Todos exponen ``name``, ``page_count()``, ``page_text(index)`` y ``close()``. El texto crudo
+pasa despues por la misma limpieza (``extract_text.write_manual_output``), asi que el formato
+intermedio es el mismo con cualquier backend.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import io
+import time
+from dataclasses import dataclass
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils import STOPWORDS, fingerprint, to_words
+
+DEFAULT_BACKEND = "pypdf"
+AUTO_BACKEND = "auto"
+# Orden de preferencia ante empates; el modulo es el que se busca para saber si esta instalado.
+BACKEND_MODULES = {"pypdf": "pypdf", "pdfminer": "pdfminer", "pdfium": "pypdfium2"}
+BACKEND_PACKAGES = {"pypdf": "pypdf", "pdfminer": "pdfminer.six", "pdfium": "pypdfium2"}
+BACKEND_CHOICES = (*BACKEND_MODULES, AUTO_BACKEND)
+# Controles de calidad de ``auto`` frente a la salida de pypdf sobre las mismas paginas:
+# caracteres (sin espacios) entre 90% y 125%, y al menos 85% de las palabras conocidas.
+AUTO_SAMPLE_PAGES = 8
+MIN_CHAR_RATIO = 0.9
+MAX_CHAR_RATIO = 1.25
+MIN_WORD_HIT_RATE = 0.85
+# Otro backend solo reemplaza a pypdf si es al menos esta cantidad de veces mas rapido: una
+# diferencia menor cae dentro del ruido de medicion y haria que la eleccion cambie entre corridas.
+AUTO_MIN_SPEEDUP = 1.5
+
+
+class PdfTextBackend:
+    name = ""
+
+    def page_count(self) -> int:
+        raise NotImplementedError
+
+    def page_text(self, index: int) -> str:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "PdfTextBackend":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class PypdfBackend(PdfTextBackend):
+    name = "pypdf"
+
+    def __init__(self, path: Path):
+        from pypdf import PdfReader
+
+        self.reader = PdfReader(str(path))
+
+    def page_count(self) -> int:
+        return len(self.reader.pages)
+
+    def page_text(self, index: int) -> str:
+        return self.reader.pages[index].extract_text() or ""
+
+
+class PdfminerBackend(PdfTextBackend):
+    name = "pdfminer"
+
+    def __init__(self, path: Path):
+        try:
+            from pdfminer.pdfdocument import PDFDocument
+            from pdfminer.pdfinterp import PDFResourceManager
+            from pdfminer.pdfpage import PDFPage
+            from pdfminer.pdfparser import PDFParser
+        except ImportError as exc:
+            raise RuntimeError("Instala pdfminer.six para usar --backend pdfminer.") from exc
+        self._file = open(path, "rb")
+        try:
+            document = PDFDocument(PDFParser(self._file))
+            self._pages = list(PDFPage.create_pages(document))
+        except Exception:
+            self._file.close()
+            raise
+        self._resources = PDFResourceManager(caching=True)
+
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    def page_text(self, index: int) -> str:
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter
+
+        with io.StringIO() as output:
+            device = TextConverter(self._resources, output, laparams=LAParams())
+            try:
+                PDFPageInterpreter(self._resources, device).process_page(self._pages[index])
+            finally:
+                device.close()
+            # TextConverter cierra cada pagina con un salto de pagina (\f).
+            return output.getvalue().replace("\f", "")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class PdfiumBackend(PdfTextBackend):
+    name = "pdfium"
+
+    def __init__(self, path: Path):
+        try:
+            import pypdfium2
+        except ImportError as exc:
+            raise RuntimeError("Instala pypdfium2 para usar --backend pdfium.") from exc
+        self._document = pypdfium2.PdfDocument(str(path))
+
+    def page_count(self) -> int:
+        return len(self._document)
+
+    def page_text(self, index: int) -> str:
+        page = self._document[index]
+        try:
+            text_page = page.get_textpage()
+            try:
+                return text_page.get_text_range().replace("\r\n", "\n")
+            finally:
+                text_page.close()
+        finally:
+            page.close()
+
+    def close(self) -> None:
+        self._document.close()
+
+
+_BACKENDS = {backend.name: backend for backend in (PypdfBackend, PdfminerBackend, PdfiumBackend)}
+
+
+def available_backends() -> List[str]:
+    """Backends con su biblioteca instalada, en orden de preferencia."""
+
+    return [name for name, module in BACKEND_MODULES.items() if importlib.util.find_spec(module) is not None]
+
+
+def open_backend(name: str, path: Path) -> PdfTextBackend:
+    try:
+        backend = _BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Backend desconocido '{name}'. Usa {', '.join(BACKEND_CHOICES)}.") from None
+    return backend(path)
+
+
+def backend_fingerprint(spec: str) -> str:
+    """Backend pedido y versiones de las bibliotecas que podria usar (cambian el texto crudo)."""
+
+    names = available_backends() if spec == AUTO_BACKEND else [spec]
+    return fingerprint(spec, [(name, _library_version(name)) for name in names])
+
+
+@dataclass
+class BackendTrial:
+    name: str
+    ms_per_page: float = 0.0
+    chars: int = 0
+    word_hit_rate: float = 0.0
+    passed: bool = False
+    reason: str = ""
+
+    def describe(self) -> str:
+        if not self.passed:
+            return f"{self.name} descartado ({self.reason})"
+        return f"{self.name} {self.ms_per_page:.1f} ms/pag"
+
+
+def choose_backend(
+    path: Path,
+    sample_pages: int = AUTO_SAMPLE_PAGES,
+    candidates: Optional[Sequence[str]] = None,
+) -> Tuple[str, List[BackendTrial]]:
+    """Elige el backend mas rapido cuya salida se parece a la de pypdf en una muestra de paginas.
+
+    La muestra son ``sample_pages`` paginas repartidas en todo el manual (no solo la portada
+    y el indice). Un backend pasa si extrae entre ``MIN_CHAR_RATIO`` y ``MAX_CHAR_RATIO`` de
+    los caracteres de pypdf (sin contar espacios) y si al menos ``MIN_WORD_HIT_RATE`` de sus
+    palabras aparecen en el vocabulario de pypdf o son stopwords: texto con palabras pegadas
+    o mal decodificado cae por debajo. El orden de las palabras no influye, asi un backend que
+    ordena distinto las columnas no se castiga; pero como la referencia es el propio pypdf,
+    el control tampoco puede premiar a uno que arregla el texto a varias columnas: solo
+    descarta salidas peores. Entre los que pasan se elige por velocidad, y pypdf solo se
+    reemplaza si el otro es al menos ``AUTO_MIN_SPEEDUP`` veces mas rapido. Retorna
+    (backend elegido, pruebas).
+    """
+
+    names = [name for name in (candidates or BACKEND_MODULES) if name in available_backends()]
+    if DEFAULT_BACKEND not in names:
+        names.insert(0, DEFAULT_BACKEND)
+    trials: List[BackendTrial] = []
+    samples: Dict[str, str] = {}
+    for name in names:
+        trial = BackendTrial(name)
+        trials.append(trial)
+        try:
+            with open_backend(name, path) as backend:
+                indexes = sample_indexes(backend.page_count(), sample_pages)
+                started = time.perf_counter()
+                samples[name] = "\n".join(backend.page_text(index) for index in indexes)
+                trial.ms_per_page = (time.perf_counter() - started) * 1000 / max(1, len(indexes))
+        except Exception as exc:
+            trial.reason = f"error: {exc}"
+
+    reference = samples.get(DEFAULT_BACKEND)
+    if reference is None:
+        return DEFAULT_BACKEND, trials
+    reference_chars = _visible_chars(reference)
+    vocabulary = set(to_words(reference)) | STOPWORDS
+    for trial in trials:
+        text = samples.get(trial.name)
+        if text is None:
+            continue
+        trial.chars = _visible_chars(text)
+        words = to_words(text)
+        trial.word_hit_rate = sum(word in vocabulary for word in words) / len(words) if words else 1.0
+        ratio = trial.chars / reference_chars if reference_chars else 1.0
+        if not MIN_CHAR_RATIO <= ratio <= MAX_CHAR_RATIO:
+            trial.reason = f"{ratio:.0%} de los caracteres de pypdf"
+        elif trial.word_hit_rate < MIN_WORD_HIT_RATE:
+            trial.reason = f"{trial.word_hit_rate:.0%} de palabras conocidas"
+        else:
+            trial.passed = True
+
+    passed = [trial for trial in trials if trial.passed]
+    best = min(passed, key=lambda trial: trial.ms_per_page) if passed else None
+    default = next((trial for trial in passed if trial.name == DEFAULT_BACKEND), None)
+    if best is not None and default is not None and best.ms_per_page * AUTO_MIN_SPEEDUP > default.ms_per_page:
+        best = default
+    return (best.name if best else DEFAULT_BACKEND), trials
+
+
+def sample_indexes(total_pages: int, count: int) -> List[int]:
+    """``count`` paginas equiespaciadas de [0, total_pages), sin repetir."""
+
+    if total_pages <= count:
+        return list(range(total_pages))
+    step = total_pages / count
+    return [int(step * position + step / 2) for position in range(count)]
+
+
+def _visible_chars(text: str) -> int:
+    return sum(not char.isspace() for char in text)
+
+
+def _library_version(name: str) -> str:
+    try:
+        return version(BACKEND_PACKAGES[name])
+    except PackageNotFoundError:
+        return "?"
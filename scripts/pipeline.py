@@ -0,0 +1,390 @@
+"""Pipeline completo: download -> extract -> chunk -> compile.
+
+Cada etapa corre en su propio hilo y se conecta con la siguiente por una cola acotada,
+asi un manual puede estar en chunking mientras el siguiente todavia se extrae. La
+extraccion reparte paginas en un pool de procesos, por lo que el chunking (CPU, en este
+proceso) no compite por el GIL con pypdf. Un manual que falla en una etapa se reporta y
+no avanza, pero no detiene a los demas; la compilacion final usa los manuales exitosos.
+
+Uso, desde la raiz del repo:
+
+    python -m scripts.pipeline --only model_y model_3 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+if str(SCRIPTS_DIR) not in sys.path:
+    # Los modulos de cada etapa se importan como en los scripts sueltos (``from utils import ...``).
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from page_watchdog import WatchdogLimits, add_watchdog_arguments  # noqa: E402
+from pdf_backends import BACKEND_CHOICES, DEFAULT_BACKEND  # noqa: E402
+from token_counter import Tokenizer, load_tokenizer  # noqa: E402
+from utils import (  # noqa: E402
+    BuildManifest,
+    ManualConfig,
+    StageMetrics,
+    add_metrics_arguments,
+    filter_manuals,
+    load_manuals_config,
+)
+
+# Las dependencias pesadas (pypdf, requests, numpy) se importan recien al armar cada etapa.
+_DONE = object()
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Ejecuta download -> extract -> chunk -> compile con etapas concurrentes.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        help="Filtra manuales por key/slug/nombre. Ej: --only model_y",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Procesos para extraer paginas en paralelo (1 = serial, en el hilo de la etapa).",
+    )
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=4,
+        help="Descargas simultaneas.",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=2,
+        help="Manuales que pueden esperar entre una etapa y la siguiente.",
+    )
+    parser.add_argument(
+        "--skip-download",
+        action="store_true",
+        help="No descarga; usa los PDFs que ya estan en data/raw.",
+    )
+    parser.add_argument(
+        "--headers-file",
+        help="Ruta a un JSON con headers HTTP extra para la descarga (cookies, etc.).",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=90,
+        help="Timeout por request de descarga en segundos.",
+    )
+    parser.add_argument(
+        "--keep-boilerplate",
+        action="store_true",
+        help="No elimina encabezados/pies de pagina repetidos al extraer.",
+    )
+    parser.add_argument(
+        "--debug-txt",
+        action="store_true",
+        help="Escribe tambien el .txt de cada manual en data/intermediate para revisarlo.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKEND_CHOICES,
+        default=DEFAULT_BACKEND,
+        help="Extractor de texto del PDF (ver pdf_backends.py); auto elige por manual.",
+    )
+    add_watchdog_arguments(parser)
+    parser.add_argument("--chunk-size", type=int, default=800, help="Tamanio de chunk en caracteres.")
+    parser.add_argument("--chunk-overlap", type=int, default=120, help="Solapamiento entre chunks consecutivos.")
+    parser.add_argument(
+        "--length-unit",
+        choices=("chars", "tokens"),
+        default="chars",
+        help="Unidad de --chunk-size/--chunk-overlap.",
+    )
+    parser.add_argument(
+        "--tokenizer",
+        default="approx",
+        help="Tokenizer para token_count y --length-unit tokens: approx, tiktoken:<encoding> o hf:<tokenizer.json>.",
+    )
+    parser.add_argument(
+        "--section-depth",
+        type=int,
+        default=2,
+        help="Niveles del indice del PDF que separan chunks; 0 ignora las secciones.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Ruta del JSONL compilado (por defecto la de compile_dataset.py).",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["jsonl", "compact"],
+        default="jsonl",
+        help="Formato del dataset compilado (ver compile_dataset.py --format).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Ignora el manifest de build en extract/chunk/compile y revalida las descargas.",
+    )
+    add_metrics_arguments(parser)
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    try:
+        manuals = filter_manuals(load_manuals_config(), args.only)
+        tokenizer = load_tokenizer(args.tokenizer)
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    run_id = time.strftime("%Y%m%dT%H%M%S")
+    manifest = BuildManifest.load()
+    failures = StageFailures()
+    stages: List[PipelineStage] = []
+    executor = None
+
+    try:
+        if not args.skip_download:
+            stages.append(
+                PipelineStage(
+                    "download",
+                    _download_work(args, manifest),
+                    StageMetrics.from_args("download", args, run_id),
+                    args.download_workers,
+                )
+            )
+
+        extract_work, executor = _extract_work(args, manifest)
+        stages.append(PipelineStage("extract", extract_work, StageMetrics.from_args("extract", args, run_id)))
+        stages.append(
+            PipelineStage("chunk", _chunk_work(args, manifest, tokenizer), StageMetrics.from_args("chunk", args, run_id))
+        )
+        run_stages(stages, manuals, failures, queue_size=args.queue_size)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        for stage in stages:
+            stage.metrics.save()
+
+    succeeded = [manual for manual in manuals if manual.slug not in failures.by_slug]
+    compile_seconds = 0.0
+    if succeeded:
+        import compile_dataset
+
+        compile_started = time.perf_counter()
+        output = args.output or compile_dataset.COMPILED_PATH
+        try:
+            with StageMetrics.from_args("compile", args, run_id) as metrics, metrics.manual(output.name) as record:
+                if not compile_dataset.compile_files(
+                    [manual.processed_jsonl_path for manual in succeeded],
+                    output,
+                    manifest,
+                    force=args.force,
+                    output_format=args.format,
+                ):
+                    record.status = "skip"
+        except Exception as exc:
+            print(f"[ERROR] compile: {exc}", file=sys.stderr)
+            return 1
+        compile_seconds = time.perf_counter() - compile_started
+    else:
+        print("[ERROR] Ningun manual completo las etapas; no hay nada que compilar.", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    busy = ", ".join(f"{stage.name} {stage.busy_seconds:.1f}s" for stage in stages)
+    print(f"[INFO] Tiempo ocupado por etapa: {busy}, compile {compile_seconds:.1f}s")
+    print(f"[INFO] Pipeline completo en {elapsed:.1f}s: {len(succeeded)}/{len(manuals)} manuales")
+
+    for slug, (stage, message) in failures.by_slug.items():
+        print(f"[ERROR] {slug} fallo en {stage}: {message}", file=sys.stderr)
+    return 1 if failures.by_slug or not succeeded else 0
+
+
+class StageFailures:
+    """Errores por manual, compartidos entre los hilos de las etapas."""
+
+    def __init__(self) -> None:
+        self.by_slug: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, manual: ManualConfig, stage: str, exc: BaseException) -> None:
+        if isinstance(exc, FileNotFoundError) and exc.filename:
+            message = f"no se encontro {exc.filename}"
+        else:
+            message = str(exc) or type(exc).__name__
+        with self._lock:
+            self.by_slug[manual.slug] = (stage, message)
+        print(f"[ERROR] {manual.display_name} ({stage}): {message}", file=sys.stderr)
+
+
+class PipelineStage:
+    """Etapa del pipeline: ``threads`` hilos que aplican ``work`` a cada manual de ``inbox``.
+
+    Los manuales exitosos pasan a ``outbox``; cuando termina el ultimo hilo se envia el
+    marcador de fin a la etapa siguiente. ``work`` retorna False si omitio el manual.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        work: Callable[[ManualConfig], Optional[bool]],
+        metrics: Optional[StageMetrics] = None,
+        threads: int = 1,
+    ):
+        self.name = name
+        self.work = work
+        self.metrics = metrics or StageMetrics(name)
+        self.threads = max(1, threads)
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        inbox: "queue.Queue",
+        outbox: Optional["queue.Queue"],
+        failures: StageFailures,
+    ) -> List[threading.Thread]:
+        remaining = [self.threads]
+
+        def loop() -> None:
+            while True:
+                manual = inbox.get()
+                if manual is _DONE:
+                    # Reenviar para que los otros hilos de esta etapa tambien terminen.
+                    inbox.put(_DONE)
+                    break
+                stage_started = time.perf_counter()
+                try:
+                    with self.metrics.manual(manual.slug) as record:
+                        if self.work(manual) is False:
+                            record.status = "skip"
+                except Exception as exc:
+                    failures.add(manual, self.name, exc)
+                    manual = None
+                with self._lock:
+                    self.busy_seconds += time.perf_counter() - stage_started
+                if manual is not None and outbox is not None:
+                    outbox.put(manual)
+
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and outbox is not None:
+                outbox.put(_DONE)
+
+        threads = [
+            threading.Thread(target=loop, name=f"{self.name}-{index}", daemon=True)
+            for index in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+
+def run_stages(
+    stages: List[PipelineStage],
+    manuals: Iterable[ManualConfig],
+    failures: StageFailures,
+    queue_size: int = 2,
+) -> None:
+    """Conecta las etapas con colas acotadas, las alimenta con ``manuals`` y espera a que terminen."""
+
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+    threads: List[threading.Thread] = []
+    for position, stage in enumerate(stages):
+        outbox = queues[position + 1] if position + 1 < len(queues) else None
+        threads.extend(stage.start(queues[position], outbox, failures))
+
+    for manual in manuals:
+        queues[0].put(manual)
+    queues[0].put(_DONE)
+    for thread in threads:
+        thread.join()
+
+
+def _download_work(args: argparse.Namespace, manifest: BuildManifest) -> Callable[[ManualConfig], Optional[bool]]:
+    import download_manuals
+    from utils import read_headers_from_env_or_file
+
+    sessions = download_manuals.ThreadLocalSessions(read_headers_from_env_or_file(args.headers_file))
+
+    def work(manual: ManualConfig) -> bool:
+        return download_manuals.download_manual(
+            sessions.get(),
+            manual,
+            force=args.force,
+            timeout=args.timeout,
+            manifest=manifest,
+        )
+
+    return work
+
+
+def _extract_work(args: argparse.Namespace, manifest: BuildManifest):
+    import extract_text
+
+    executor = None
+    limits = WatchdogLimits.from_args(args)
+    # Bajo el watchdog cada manual levanta sus propios workers vigilados (page_watchdog.py).
+    if args.workers > 1 and not (limits.enabled or args.retry_quarantine):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # spawn: hacer fork desde un proceso con hilos activos puede heredar locks tomados.
+        executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def work(manual: ManualConfig) -> bool:
+        return extract_text.extract_if_stale(
+            manual,
+            manifest,
+            force=args.force,
+            executor=executor,
+            workers=args.workers,
+            strip_boilerplate=not args.keep_boilerplate,
+            debug_txt=args.debug_txt,
+            backend=args.backend,
+            limits=limits,
+            retry_quarantine=args.retry_quarantine,
+        )
+
+    return work, executor
+
+
+def _chunk_work(
+    args: argparse.Namespace,
+    manifest: BuildManifest,
+    tokenizer: Tokenizer,
+) -> Callable[[ManualConfig], Optional[bool]]:
+    import chunk_manuals
+
+    splitter = chunk_manuals.build_splitter(args.chunk_size, args.chunk_overlap, args.length_unit, tokenizer)
+
+    def work(manual: ManualConfig) -> bool:
+        return chunk_manuals.chunk_if_stale(
+            manual,
+            splitter,
+            manifest,
+            force=args.force,
+            tokenizer=tokenizer,
+            length_unit=args.length_unit,
+            section_depth=args.section_depth,
+        )
+
+    return work
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,467 @@
+"""Cache precalculado de recuperacion para las preguntas frecuentes del chat.
+
+``build`` lee un log de consultas (JSONL con ``question``/``model``, p. ej. lineas de pino,
+o texto ``modelo<TAB>pregunta``), normaliza cada pregunta con ``extractTerms`` de chat.ts,
+agrupa las que comparten casi los mismos terminos (Jaccard) y consulta ``/query/topk`` una
+vez por grupo. Los resultados quedan en SQLite con vencimiento (TTL) y metadata de uso
+(ultimo acceso y cantidad) para desalojar al estilo LRU; ``QueryCache.lookup`` responde
+preguntas repetidas sin llamar a ningun servicio remoto.
+
+    python scripts/query_cache.py build --log consultas.jsonl --min-count 2
+    python scripts/query_cache.py lookup --model model_y "como abro el puerto de carga"
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import chain
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from chat_retrieval import DEFAULT_NOMIC_K, normalize_model, search_topk
+from utils import (
+    DATA_DIR,
+    compute_chunk_id,
+    ensure_directory,
+    extract_terms,
+    filter_manuals,
+    iter_jsonl,
+    load_manuals_config,
+)
+
+CACHE_PATH = DATA_DIR / "cache" / "query_cache.sqlite"
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_TTL_HOURS = 24 * 7
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    model_slug TEXT NOT NULL,
+    query_key TEXT NOT NULL,
+    canonical_query TEXT NOT NULL,
+    log_count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    access_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (model_slug, query_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access, access_count);
+CREATE TABLE IF NOT EXISTS entry_terms (
+    model_slug TEXT NOT NULL,
+    term TEXT NOT NULL,
+    query_key TEXT NOT NULL,
+    PRIMARY KEY (model_slug, term, query_key),
+    FOREIGN KEY (model_slug, query_key) REFERENCES entries ON DELETE CASCADE
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entry_chunks (
+    model_slug TEXT NOT NULL,
+    query_key TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL,
+    score REAL,
+    PRIMARY KEY (model_slug, query_key, rank),
+    FOREIGN KEY (model_slug, query_key) REFERENCES entries ON DELETE CASCADE
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id TEXT PRIMARY KEY,
+    payload BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def query_terms(question: str) -> FrozenSet[str]:
+    return frozenset(extract_terms(question))
+
+
+def query_key(terms: Iterable[str]) -> str:
+    """Clave canonica de una pregunta: sus terminos de ``extractTerms`` ordenados."""
+
+    return " ".join(sorted(terms))
+
+
+def jaccard(left: FrozenSet[str], right: FrozenSet[str]) -> float:
+    if not left and not right:
+        return 1.0
+    return len(left & right) / len(left | right)
+
+
+@dataclass
+class QueryCluster:
+    model_slug: str
+    terms: FrozenSet[str]
+    questions: Counter = field(default_factory=Counter)
+
+    @property
+    def key(self) -> str:
+        return query_key(self.terms)
+
+    @property
+    def count(self) -> int:
+        return sum(self.questions.values())
+
+    @property
+    def canonical_query(self) -> str:
+        """La redaccion mas frecuente del grupo (es la que se consulta a /query/topk)."""
+
+        return self.questions.most_common(1)[0][0]
+
+
+@dataclass
+class CacheHit:
+    model_slug: str
+    query_key: str
+    canonical_query: str
+    similarity: float
+    expires_at: float
+    chunks: List[dict]
+
+
+def read_query_log(path: Path) -> Iterator[Tuple[str, str]]:
+    """Pares ``(model_slug, pregunta)`` del log; omite lineas sin pregunta o con modelo desconocido."""
+
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                body = record.get("body") if isinstance(record.get("body"), dict) else record
+                question = body.get("question") or body.get("query")
+                model = body.get("model") or body.get("model_slug")
+            else:
+                model, _, question = line.partition("\t")
+            if not isinstance(question, str) or not isinstance(model, str):
+                continue
+            model_slug = normalize_model(model)
+            if model_slug and question.strip():
+                yield model_slug, question.strip()
+
+
+def cluster_queries(pairs: Iterable[Tuple[str, str]], threshold: float = DEFAULT_THRESHOLD) -> List[QueryCluster]:
+    """Agrupa preguntas del mismo modelo cuyos terminos tienen Jaccard >= ``threshold``.
+
+    Las claves mas frecuentes fundan los grupos; cada clave se une al grupo mas parecido
+    entre los que comparten al menos un termino (indice invertido por termino).
+    """
+
+    exact: Dict[Tuple[str, str], QueryCluster] = {}
+    for model_slug, question in pairs:
+        terms = query_terms(question)
+        if not terms:
+            continue
+        cluster = exact.setdefault((model_slug, query_key(terms)), QueryCluster(model_slug, terms))
+        cluster.questions[question] += 1
+
+    clusters: List[QueryCluster] = []
+    by_term: Dict[Tuple[str, str], List[int]] = {}
+    for candidate in sorted(exact.values(), key=lambda item: (-item.count, item.key)):
+        seen = {position for term in candidate.terms for position in by_term.get((candidate.model_slug, term), ())}
+        best, best_similarity = None, threshold
+        for position in sorted(seen):
+            similarity = jaccard(candidate.terms, clusters[position].terms)
+            if similarity >= best_similarity and (best is None or similarity > best_similarity):
+                best, best_similarity = position, similarity
+        if best is not None:
+            clusters[best].questions.update(candidate.questions)
+            continue
+        for term in candidate.terms:
+            by_term.setdefault((candidate.model_slug, term), []).append(len(clusters))
+        clusters.append(candidate)
+
+    clusters.sort(key=lambda item: (-item.count, item.model_slug, item.key))
+    return clusters
+
+
+class QueryCache:
+    """Cache de resultados de ``/query/topk`` por ``(model_slug, query_key)`` sobre SQLite.
+
+    Los chunks se guardan una sola vez (JSON comprimido con zlib) y cada entrada solo
+    referencia sus ``chunk_id`` con el puntaje, asi las preguntas que comparten
+    resultados no duplican texto.
+    """
+
+    def __init__(self, path: Path = CACHE_PATH, threshold: float = DEFAULT_THRESHOLD):
+        ensure_directory(path)
+        self.path = path
+        self.threshold = threshold
+        self._db = sqlite3.connect(str(path))
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self) -> "QueryCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _files(self) -> List[Path]:
+        # En modo WAL las escrituras recientes viven en el -wal hasta el proximo checkpoint.
+        candidates = [self.path, self.path.with_name(self.path.name + "-wal")]
+        return [path for path in candidates if path.exists()]
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def is_fresh(self, model_slug: str, key: str, now: Optional[float] = None) -> bool:
+        row = self._db.execute(
+            "SELECT expires_at FROM entries WHERE model_slug = ? AND query_key = ?", (model_slug, key)
+        ).fetchone()
+        return row is not None and row[0] > (now if now is not None else time.time())
+
+    def put(
+        self,
+        model_slug: str,
+        terms: Iterable[str],
+        canonical_query: str,
+        chunks: Sequence[dict],
+        ttl_seconds: float,
+        log_count: int = 0,
+        now: Optional[float] = None,
+    ) -> None:
+        now = now if now is not None else time.time()
+        terms = sorted(set(terms))
+        key = query_key(terms)
+        with self._db:
+            self._db.execute("DELETE FROM entries WHERE model_slug = ? AND query_key = ?", (model_slug, key))
+            self._db.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (model_slug, key, canonical_query, log_count, now, now + ttl_seconds, now),
+            )
+            self._db.executemany(
+                "INSERT INTO entry_terms VALUES (?, ?, ?)", [(model_slug, term, key) for term in terms]
+            )
+            rows = []
+            for rank, chunk in enumerate(chunks):
+                metadata = chunk.get("metadata") or {}
+                chunk_id = metadata.get("chunk_id") or compute_chunk_id(metadata.get("model_slug", model_slug), chunk["text"])
+                payload = json.dumps({"text": chunk["text"], "metadata": metadata}, ensure_ascii=False, separators=(",", ":"))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO chunks VALUES (?, ?)", (chunk_id, zlib.compress(payload.encode("utf-8"), 6))
+                )
+                rows.append((model_slug, key, rank, chunk_id, chunk.get("score")))
+            self._db.executemany("INSERT INTO entry_chunks VALUES (?, ?, ?, ?, ?)", rows)
+
+    def lookup(self, model_slug: str, question: str, now: Optional[float] = None) -> Optional[CacheHit]:
+        """Entrada vigente para la pregunta: clave exacta o la mas parecida sobre ``threshold``.
+
+        Registra el acceso (``last_access``, ``access_count``) para el desalojo LRU.
+        """
+
+        now = now if now is not None else time.time()
+        terms = query_terms(question)
+        if not terms:
+            return None
+        key, similarity = query_key(terms), 1.0
+        if not self.is_fresh(model_slug, key, now):
+            key, similarity = self._nearest(model_slug, terms, now)
+            if key is None:
+                return None
+
+        with self._db:
+            self._db.execute(
+                "UPDATE entries SET last_access = ?, access_count = access_count + 1 WHERE model_slug = ? AND query_key = ?",
+                (now, model_slug, key),
+            )
+        canonical_query, expires_at = self._db.execute(
+            "SELECT canonical_query, expires_at FROM entries WHERE model_slug = ? AND query_key = ?", (model_slug, key)
+        ).fetchone()
+        chunks = [
+            {**json.loads(zlib.decompress(payload)), "score": score}
+            for score, payload in self._db.execute(
+                "SELECT e.score, c.payload FROM entry_chunks e JOIN chunks c USING (chunk_id) "
+                "WHERE e.model_slug = ? AND e.query_key = ? ORDER BY e.rank",
+                (model_slug, key),
+            )
+        ]
+        return CacheHit(model_slug, key, canonical_query, similarity, expires_at, chunks)
+
+    def _nearest(self, model_slug: str, terms: FrozenSet[str], now: float) -> Tuple[Optional[str], float]:
+        marks = ",".join("?" * len(terms))
+        rows = self._db.execute(
+            f"SELECT t.query_key FROM entry_terms t JOIN entries e USING (model_slug, query_key) "
+            f"WHERE t.model_slug = ? AND t.term IN ({marks}) AND e.expires_at > ? GROUP BY t.query_key",
+            (model_slug, *sorted(terms), now),
+        )
+        best, best_similarity = None, 0.0
+        for (key,) in rows:
+            similarity = jaccard(terms, frozenset(key.split(" ")))
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = key, similarity
+        return best, best_similarity
+
+    def evict(self, max_entries: int, now: Optional[float] = None) -> Tuple[int, int]:
+        """Borra entradas vencidas y, si sobran, las de acceso mas antiguo. Retorna (vencidas, LRU)."""
+
+        now = now if now is not None else time.time()
+        with self._db:
+            expired = self._db.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+            overflow = max(0, len(self) - max_entries) if max_entries > 0 else 0
+            if overflow:
+                self._db.execute(
+                    "DELETE FROM entries WHERE (model_slug, query_key) IN ("
+                    "SELECT model_slug, query_key FROM entries ORDER BY last_access, access_count LIMIT ?)",
+                    (overflow,),
+                )
+            self._db.execute("DELETE FROM chunks WHERE chunk_id NOT IN (SELECT chunk_id FROM entry_chunks)")
+        return expired, overflow
+
+    def stats(self) -> dict:
+        entries, accesses = self._db.execute("SELECT COUNT(*), COALESCE(SUM(access_count), 0) FROM entries").fetchone()
+        chunks, payload_bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM chunks").fetchone()
+        return {
+            "entries": entries,
+            "accesses": accesses,
+            "chunks": chunks,
+            "payload_kb": round(payload_bytes / 1024, 1),
+            "file_kb": round(sum(path.stat().st_size for path in self._files()) / 1024, 1),
+        }
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Precalcula y consulta resultados de recuperacion para preguntas frecuentes.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--cache", type=Path, default=CACHE_PATH, help="Archivo SQLite del cache.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Similitud de Jaccard entre terminos para considerar dos preguntas iguales.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser(
+        "build",
+        help="Agrupa un log de consultas y precalcula sus resultados.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    build.add_argument("--log", type=Path, required=True, help="Log de consultas (JSONL o modelo<TAB>pregunta).")
+    build.add_argument("--only", nargs="+", help="Filtra manuales por key/slug/nombre. Ej: --only model_y")
+    build.add_argument("--min-count", type=int, default=2, help="Apariciones minimas de un grupo en el log.")
+    build.add_argument("--max-entries", type=int, default=5000, help="Entradas maximas; sobre eso se desaloja por LRU.")
+    build.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL_HOURS, help="Vigencia de cada entrada.")
+    build.add_argument("--k", type=int, default=DEFAULT_NOMIC_K, help="NOMIC_K del backend.")
+    build.add_argument("--refresh", action="store_true", help="Vuelve a consultar tambien las entradas vigentes.")
+    build.add_argument(
+        "--endpoint",
+        help="URL base de un /query/topk real (p. ej. https://api-atlas.nomic.ai/v1). Sin esta opcion usa el stand-in local.",
+    )
+    build.add_argument(
+        "--projection-id",
+        default=os.getenv("NOMIC_PROJECTION_ID"),
+        help="projection_id a consultar con --endpoint.",
+    )
+
+    lookup = commands.add_parser("lookup", help="Busca una pregunta en el cache.")
+    lookup.add_argument("--model", required=True, help="Modelo (mismos alias que el backend).")
+    lookup.add_argument("question", help="Pregunta a buscar.")
+
+    commands.add_parser("stats", help="Muestra el tamanio del cache.")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    if args.command == "build":
+        return run_build(args)
+
+    if not args.cache.exists():
+        print(f"[ERROR] No existe {args.cache}; ejecuta primero query_cache.py build.", file=sys.stderr)
+        return 1
+    with QueryCache(args.cache, threshold=args.threshold) as cache:
+        if args.command == "stats":
+            print(json.dumps(cache.stats(), indent=2))
+            return 0
+        model_slug = normalize_model(args.model)
+        if not model_slug:
+            print(f"[ERROR] Modelo no reconocido: {args.model}", file=sys.stderr)
+            return 1
+        hit = cache.lookup(model_slug, args.question)
+    if hit is None:
+        print("[INFO] Sin entrada vigente para esa pregunta.")
+        return 1
+    print(f"[OK] '{hit.canonical_query}' (similitud {hit.similarity:.2f}, {len(hit.chunks)} chunks)")
+    for chunk in hit.chunks:
+        metadata = chunk["metadata"]
+        print(f"  {chunk['score']}: pags. {metadata.get('page_start')}-{metadata.get('page_end')} {chunk['text'][:80]!r}")
+    return 0
+
+
+def run_build(args: argparse.Namespace) -> int:
+    if args.endpoint and not args.projection_id:
+        print("[ERROR] --endpoint requiere --projection-id (o NOMIC_PROJECTION_ID).", file=sys.stderr)
+        return 1
+    try:
+        manuals = filter_manuals(load_manuals_config(), args.only)
+        pairs = list(read_query_log(args.log))
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+
+    slugs = {manual.slug for manual in manuals}
+    pairs = [(model_slug, question) for model_slug, question in pairs if model_slug in slugs]
+    clusters = cluster_queries(pairs, args.threshold)
+    selected = [cluster for cluster in clusters if cluster.count >= args.min_count][: args.max_entries]
+    covered = sum(cluster.count for cluster in selected)
+    print(
+        f"[INFO] {len(pairs)} consultas -> {len(clusters)} grupos; {len(selected)} con >= {args.min_count} apariciones "
+        f"cubren {covered / len(pairs) if pairs else 0:.1%} del log"
+    )
+
+    import requests
+
+    session = requests.Session()
+    with QueryCache(args.cache, threshold=args.threshold) as cache:
+        pending = [cluster for cluster in selected if args.refresh or not cache.is_fresh(cluster.model_slug, cluster.key)]
+        if args.endpoint:
+            token = os.getenv("NOMIC_API_KEY")
+            if token:
+                session.headers["Authorization"] = f"Bearer {token}"
+            fetched = precompute(cache, session, args.endpoint, args.projection_id, pending, args)
+        else:
+            from standins import NomicTopkStandIn
+
+            used = {cluster.model_slug for cluster in pending}
+            try:
+                records = list(chain.from_iterable(
+                    iter_jsonl(manual.processed_jsonl_path) for manual in manuals if manual.slug in used
+                ))
+            except FileNotFoundError as exc:
+                print(f"[ERROR] No se encontro {exc.filename}; ejecuta primero chunk_manuals.py.", file=sys.stderr)
+                return 1
+            with NomicTopkStandIn() as standin:
+                standin.add_projection("cache", records)
+                fetched = precompute(cache, session, standin.base_url, "cache", pending, args)
+
+        expired, evicted = cache.evict(args.max_entries)
+        stats = cache.stats()
+    print(
+        f"[OK] {fetched} consultas a /query/topk ({len(selected) - len(pending)} vigentes omitidas); "
+        f"{expired} vencidas y {evicted} desalojadas; {stats['entries']} entradas, {stats['file_kb']:.0f} KB -> {args.cache}"
+    )
+    return 0
+
+
+def precompute(cache: QueryCache, session, base_url: str, projection_id: str, clusters: Sequence[QueryCluster], args) -> int:
+    ttl_seconds = args.ttl_hours * 3600
+    for cluster in clusters:
+        chunks = search_topk(session, base_url, projection_id, cluster.canonical_query, cluster.model_slug, args.k)
+        cache.put(cluster.model_slug, cluster.terms, cluster.canonical_query, chunks, ttl_seconds, log_count=cluster.count)
+    return len(clusters)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
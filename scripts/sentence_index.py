@@ -0,0 +1,163 @@
+"""Oraciones de cada chunk en un archivo aparte por manual, para recortar el contexto al consultar.
+
+``chunk_manuals.py`` segmenta cada chunk en oraciones (``text_splitter.sentence_bounds``) y
+calcula sus terminos (``sentence_terms``, la misma ``extract_terms`` de chat.ts). Guardarlos
+en la metadata de cada chunk agrandaba el JSONL procesado ~65% y los arrastraba al dataset
+compilado, al upload y a ``content_hash``; por eso van en ``{slug}.sentences``, junto al JSONL
+y por ``chunk_id``, y solo los lee ``context_trim.py``.
+
+Formato de ``{slug}.sentences`` (little-endian), una fila por chunk en el orden del JSONL:
+    header <4sHHIIII  magic, version, reservado, n_chunks, n_limites, n_terminos, bytes del vocabulario
+    chunk_ids u64[n] | bound_offsets u32[n+1] | bounds u32[b] | term_offsets u32[b-n+1] |
+    term_ids u32[t] | vocabulario UTF-8 separado por "\\n" (cada bloque con padding a 8)
+``bounds[bound_offsets[i]:bound_offsets[i+1]]`` son los limites de las oraciones del chunk ``i``
+(offsets de caracteres sobre ``text``). Sus oraciones son las filas ``bound_offsets[i] - i``
+en adelante, y ``term_ids[term_offsets[s]:term_offsets[s+1]]`` los terminos de la oracion ``s``.
+"""
+
+from __future__ import annotations
+
+import struct
+from array import array
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from binfmt import le_bytes, pad, padding, unpack_header
+from text_splitter import sentence_bounds, sentence_fingerprint, sentence_terms
+from utils import ManualConfig, ensure_directory, fingerprint
+
+SENTENCES_MAGIC = b"T3SI"
+SENTENCES_VERSION = 1
+_HEADER = struct.Struct("<4sHHIIII")
+
+
+def sentence_index_fingerprint() -> str:
+    """Hash de la segmentacion y del formato del archivo."""
+
+    return fingerprint(SENTENCES_VERSION, sentence_fingerprint())
+
+
+class SentenceIndexBuilder:
+    """Acumula las oraciones de los chunks de un manual a medida que se escriben."""
+
+    def __init__(self) -> None:
+        self._chunk_ids = array("Q")
+        self._bound_offsets = array("I", [0])
+        self._bounds = array("I")
+        self._term_offsets = array("I", [0])
+        self._term_ids = array("I")
+        self._vocabulary: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._chunk_ids)
+
+    def add(self, chunk_id: str, text: str) -> None:
+        bounds = sentence_bounds(text)
+        self._chunk_ids.append(int(chunk_id, 16))
+        self._bounds.extend(bounds)
+        self._bound_offsets.append(len(self._bounds))
+        for terms in sentence_terms(text, bounds):
+            for term in terms.split():
+                self._term_ids.append(self._vocabulary.setdefault(term, len(self._vocabulary)))
+            self._term_offsets.append(len(self._term_ids))
+
+    def write(self, path: Path) -> int:
+        """Escribe ``{slug}.sentences`` (via ``.tmp`` + rename). Retorna la cantidad de oraciones."""
+
+        vocabulary = "\n".join(self._vocabulary).encode("utf-8")
+        ensure_directory(path)
+        temp_path = path.with_name(path.name + ".tmp")
+        with temp_path.open("wb") as out:
+            out.write(
+                pad(
+                    _HEADER.pack(
+                        SENTENCES_MAGIC,
+                        SENTENCES_VERSION,
+                        0,
+                        len(self),
+                        len(self._bounds),
+                        len(self._term_ids),
+                        len(vocabulary),
+                    )
+                )
+            )
+            for column in (self._chunk_ids, self._bound_offsets, self._bounds, self._term_offsets, self._term_ids):
+                out.write(pad(le_bytes(column)))
+            out.write(pad(vocabulary))
+        temp_path.replace(path)
+        return len(self._term_offsets) - 1
+
+
+class _ManualSentences:
+    def __init__(self, path: Path):
+        blob = path.read_bytes()
+        _, _, _, count, bound_count, term_count, vocabulary_bytes = unpack_header(
+            _HEADER, blob, SENTENCES_MAGIC, SENTENCES_VERSION, "indice de oraciones", path.name
+        )
+        cursor = _HEADER.size + padding(_HEADER.size)
+        columns = []
+        sentence_count = bound_count - count
+        for typecode, width, length in (
+            ("Q", 8, count),
+            ("I", 4, count + 1),
+            ("I", 4, bound_count),
+            ("I", 4, sentence_count + 1),
+            ("I", 4, term_count),
+        ):
+            column = array(typecode)
+            column.frombytes(blob[cursor : cursor + width * length])
+            columns.append(column)
+            cursor += width * length + padding(width * length)
+        self.chunk_ids, self.bound_offsets, self.bounds, self.term_offsets, self.term_ids = columns
+        vocabulary = blob[cursor : cursor + vocabulary_bytes].decode("utf-8")
+        self.vocabulary = vocabulary.split("\n") if vocabulary else []
+
+
+class SentenceIndex:
+    """Limites y terminos de las oraciones de los chunks de uno o varios manuales, por ``chunk_id``."""
+
+    def __init__(self, paths: Sequence[Path]):
+        self._manuals = [_ManualSentences(path) for path in paths]
+        self._rows: Dict[int, Tuple[int, int]] = {}
+        for position, manual in enumerate(self._manuals):
+            for row, value in enumerate(manual.chunk_ids):
+                self._rows[value] = (position, row)
+
+    @classmethod
+    def from_manuals(cls, manuals: Iterable[ManualConfig]) -> "SentenceIndex":
+        """Indices de ``data/processed/{slug}.sentences`` de los manuales que lo tienen."""
+
+        return cls([manual.sentence_index_path for manual in manuals if manual.sentence_index_path.exists()])
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return _chunk_key(chunk_id) in self._rows
+
+    def get(self, chunk_id: str) -> Optional[Tuple[List[int], List[FrozenSet[str]]]]:
+        """(limites, terminos de cada oracion) del chunk, o None si no esta en el indice."""
+
+        location = self._rows.get(_chunk_key(chunk_id))
+        if location is None:
+            return None
+        manual = self._manuals[location[0]]
+        row = location[1]
+        start, stop = manual.bound_offsets[row], manual.bound_offsets[row + 1]
+        bounds = manual.bounds[start:stop].tolist()
+        first = start - row
+        terms = [
+            frozenset(
+                manual.vocabulary[term]
+                for term in manual.term_ids[manual.term_offsets[sentence] : manual.term_offsets[sentence + 1]]
+            )
+            for sentence in range(first, first + len(bounds) - 1)
+        ]
+        return bounds, terms
+
+
+def _chunk_key(chunk_id: str) -> Optional[int]:
+    try:
+        return int(chunk_id, 16)
+    except (TypeError, ValueError):
+        return None
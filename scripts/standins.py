@@ -0,0 +1,416 @@
+"""Servicios locales que imitan a los externos del backend, para medir sin red ni API keys.
+
+``NomicTopkStandIn`` responde ``POST /query/topk`` con el mismo formato que Atlas
+(``{"results": [{"text", "metadata", "score"}]}``) usando un indice BM25 sobre los chunks
+procesados. Cada ``projection_id`` es un conjunto de chunks distinto (p. ej. uno por
+tamanio de chunk), como las proyecciones de Atlas.
+
+``AtlasUploadStandIn`` recibe los lotes de ``upload_dataset.py`` (agregar y borrar datos de
+un proyecto) y puede fallar a proposito para ejercitar los reintentos.
+
+``LlmGenerateStandIn`` responde ``POST /api/generate`` como el servidor del LLM
+(``{"response", "done"}``, sin streaming), para las pruebas de carga del chat.
+
+``PdfDownloadStandIn`` sirve PDFs por ``GET`` como el sitio de Tesla, con ``ETag`` y
+``Last-Modified``, ``Range``/``If-Range`` y 304, y puede cortar la conexion a mitad del
+cuerpo, para ejercitar la reanudacion y el GET condicional de ``download_manuals.py``.
+
+Todos aceptan una latencia simulada por request (mediana ``latency`` en segundos, con
+dispersion log-normal ``jitter``) y un maximo de requests atendidos a la vez
+(``concurrency``); el resto espera su turno, como en un servicio saturado.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bm25_index import BM25Index
+from utils import ChunkIdAssigner
+
+TOPK_PATH = "/query/topk"
+ADD_DATA_PATH = "/project/data/add/json/progressive"
+DELETE_DATA_PATH = "/project/data/delete"
+GENERATE_PATH = "/api/generate"
+_BYTE_RANGE = re.compile(r"bytes=(\d+)-$")
+
+
+class _StandInServer:
+    """Servidor HTTP en un hilo aparte; las subclases responden en ``handle``."""
+
+    name = "standin"
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        concurrency: Optional[int] = None,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self._slots = threading.BoundedSemaphore(concurrency) if concurrency else nullcontext()
+        self._latency_random = random.Random(seed)
+        self._latency_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle(self, path: str, payload: dict) -> Tuple[int, dict]:
+        raise NotImplementedError
+
+    def handle_get(self, handler: BaseHTTPRequestHandler) -> None:
+        handler._reply(404, {"detail": "Not Found"})
+
+    def serve(self, path: str, payload: dict) -> Tuple[int, dict]:
+        with self._slots:
+            delay = self.sample_latency()
+            if delay:
+                time.sleep(delay)
+            return self.handle(path, payload)
+
+    def sample_latency(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        if self.jitter <= 0:
+            return self.latency
+        with self._latency_lock:
+            return self._latency_random.lognormvariate(math.log(self.latency), self.jitter)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class NomicTopkStandIn(_StandInServer):
+    """Servidor HTTP local para ``/query/topk``; se usa como context manager.
+
+    El puntaje es BM25 dividido por el del primer resultado, asi queda en [0, 1] como la
+    similitud de Atlas y ``MIN_NORMALIZED_SCORE`` de chat.ts se aplica relativo al mejor chunk.
+    """
+
+    name = "nomic-standin"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **timing):
+        self._projections: Dict[str, Tuple[BM25Index, Dict[str, dict]]] = {}
+        super().__init__(host, port, **timing)
+
+    def add_projection(self, projection_id: str, records: Iterable[dict]) -> int:
+        """Indexa ``records`` (registros JSONL de chunks) bajo ``projection_id``. Retorna la cantidad."""
+
+        chunk_ids = ChunkIdAssigner()
+        by_id: Dict[str, dict] = {}
+        indexed: List[dict] = []
+        for record in records:
+            metadata = dict(record.get("metadata", {}))
+            metadata.setdefault("chunk_id", chunk_ids.assign(metadata.get("model_slug", ""), record.get("text", "")))
+            record = {"text": record.get("text", ""), "metadata": metadata}
+            by_id[metadata["chunk_id"]] = record
+            indexed.append(record)
+        index = BM25Index.from_records(indexed, projection_id)
+        self._projections[projection_id] = (index, by_id)
+        return len(indexed)
+
+    def topk(self, projection_id: str, query: str, k: int) -> List[dict]:
+        index, by_id = self._projections[projection_id]
+        hits = index.search(query, k)
+        best = hits[0].score if hits else 0.0
+        return [
+            {**by_id[hit.chunk_id], "score": round(hit.score / best, 6) if best else 0.0}
+            for hit in hits
+        ]
+
+    def handle(self, path: str, payload: dict) -> Tuple[int, dict]:
+        if path != TOPK_PATH:
+            return 404, {"detail": "Not Found"}
+        try:
+            projection_id = payload["projection_id"]
+            query = str(payload["query"])
+            k = int(payload.get("k", 10))
+        except (KeyError, TypeError, ValueError) as exc:
+            return 422, {"detail": f"payload invalido: {exc}"}
+        try:
+            return 200, {"results": self.topk(projection_id, query, k)}
+        except KeyError:
+            return 404, {"detail": f"proyeccion desconocida: {projection_id}"}
+
+    def close(self) -> None:
+        super().close()
+        for index, _ in self._projections.values():
+            index.close()
+        self._projections.clear()
+
+
+class AtlasUploadStandIn(_StandInServer):
+    """Servidor local que acepta los lotes de ``upload_dataset.py`` y guarda los datos en memoria.
+
+    ``failure_rate`` responde 503 a esa fraccion de los requests (con semilla fija), para
+    probar backoff y reanudacion. Con ``state_path`` el contenido se carga al iniciar y se
+    guarda al cerrar, asi varias ejecuciones seguidas ven el mismo "proyecto".
+    """
+
+    name = "atlas-upload-standin"
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+        state_path: Optional[Path] = None,
+        **timing,
+    ):
+        self.failure_rate = failure_rate
+        self.state_path = state_path
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._projects: Dict[str, Dict[str, dict]] = {}
+        if state_path is not None and state_path.exists():
+            with state_path.open(encoding="utf-8") as f:
+                self._projects = json.load(f)
+        super().__init__(host, port, seed=seed, **timing)
+
+    def data(self, project_id: str) -> Dict[str, dict]:
+        """Datos del proyecto por ``chunk_id`` (copia)."""
+
+        with self._lock:
+            return dict(self._projects.get(project_id, {}))
+
+    def handle(self, path: str, payload: dict) -> Tuple[int, dict]:
+        with self._lock:
+            self.requests += 1
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                self.failures += 1
+                return 503, {"detail": "stand-in: falla simulada"}
+            try:
+                project = self._projects.setdefault(str(payload["project_id"]), {})
+                if path == ADD_DATA_PATH:
+                    id_field = payload.get("id_field", "chunk_id")
+                    for datum in payload["data"]:
+                        project[str(datum[id_field])] = datum
+                    return 200, {"added": len(payload["data"])}
+                if path == DELETE_DATA_PATH:
+                    removed = sum(project.pop(str(datum_id), None) is not None for datum_id in payload["datum_ids"])
+                    return 200, {"deleted": removed}
+            except (KeyError, TypeError) as exc:
+                return 422, {"detail": f"payload invalido: {exc}"}
+        return 404, {"detail": "Not Found"}
+
+    def close(self) -> None:
+        super().close()
+        if self.state_path is not None:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.state_path.open("w", encoding="utf-8") as f:
+                json.dump(self._projects, f, ensure_ascii=False)
+
+
+class LlmGenerateStandIn(_StandInServer):
+    """Servidor local para ``/api/generate`` (sin streaming), con una respuesta fija.
+
+    La respuesta menciona el largo del prompt, asi se puede comprobar que llego completo.
+    ``failure_rate`` responde 503 a esa fraccion de los requests, como un LLM sobrecargado.
+    """
+
+    name = "llm-standin"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, failure_rate: float = 0.0, seed: int = 0, **timing):
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        super().__init__(host, port, seed=seed, **timing)
+
+    def handle(self, path: str, payload: dict) -> Tuple[int, dict]:
+        if path != GENERATE_PATH:
+            return 404, {"detail": "Not Found"}
+        with self._lock:
+            self.requests += 1
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                self.failures += 1
+                return 503, {"error": "stand-in: falla simulada"}
+        prompt = payload.get("prompt")
+        if not isinstance(prompt, str) or not prompt:
+            return 400, {"error": "prompt es obligatorio"}
+        return 200, {
+            "model": payload.get("model", ""),
+            "response": f"Respuesta simulada para un prompt de {len(prompt)} caracteres.",
+            "done": True,
+        }
+
+
+@dataclass
+class _ServedFile:
+    content: bytes
+    etag: str
+    last_modified: str
+
+
+class PdfDownloadStandIn(_StandInServer):
+    """Servidor local de PDFs por ``GET``; cada ``add_file`` publica (o reemplaza) una version.
+
+    Responde 304 si ``If-None-Match`` coincide con el ``ETag`` (o, sin el, si el archivo no
+    cambio desde ``If-Modified-Since``), 206 para ``Range: bytes=N-`` cuando ``If-Range``
+    falta o coincide con la version actual, 200 con el archivo completo si ``If-Range`` es de
+    otra version y 416 si el rango empieza despues del final. ``drop_next(path, n)`` hace
+    que la proxima respuesta a ``path`` anuncie el largo completo pero corte la conexion
+    despues de ``n`` bytes del cuerpo. ``log`` guarda (status, headers del request) de cada GET.
+    """
+
+    name = "pdf-download-standin"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **timing):
+        self.log: List[Tuple[int, Dict[str, str]]] = []
+        self._files: Dict[str, _ServedFile] = {}
+        self._drops: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._clock = time.time()
+        super().__init__(host, port, **timing)
+
+    def add_file(self, path: str, content: bytes) -> str:
+        """Publica ``content`` en ``path``; retorna la URL."""
+
+        with self._lock:
+            # Cada version un segundo despues de la anterior: Last-Modified tiene resolucion de segundos.
+            self._clock = max(time.time(), self._clock + 1)
+            self._files[path] = _ServedFile(
+                content,
+                '"%s"' % hashlib.sha256(content).hexdigest()[:16],
+                formatdate(self._clock, usegmt=True),
+            )
+        return self.base_url + path
+
+    def drop_next(self, path: str, after_bytes: int) -> None:
+        with self._lock:
+            self._drops[path] = after_bytes
+
+    def handle_get(self, handler: BaseHTTPRequestHandler) -> None:
+        path = handler.path.split("?", 1)[0]
+        headers = {key.lower(): value for key, value in handler.headers.items()}
+        with self._slots:
+            delay = self.sample_latency()
+            if delay:
+                time.sleep(delay)
+            with self._lock:
+                served = self._files.get(path)
+                drop = self._drops.pop(path, None) if served is not None else None
+            status, start = self._status(served, headers)
+            with self._lock:
+                self.log.append((status, headers))
+            if served is None:
+                handler._reply(404, {"detail": "Not Found"})
+                return
+            handler.send_response(status)
+            handler.send_header("ETag", served.etag)
+            handler.send_header("Last-Modified", served.last_modified)
+            handler.send_header("Accept-Ranges", "bytes")
+            if status in (304, 416):
+                if status == 416:
+                    handler.send_header("Content-Range", f"bytes */{len(served.content)}")
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+                return
+            body = served.content[start:]
+            handler.send_header("Content-Type", "application/pdf")
+            handler.send_header("Content-Length", str(len(body)))
+            if status == 206:
+                handler.send_header("Content-Range", f"bytes {start}-{len(served.content) - 1}/{len(served.content)}")
+            handler.end_headers()
+            if drop is None:
+                handler.wfile.write(body)
+                return
+            handler.wfile.write(body[:drop])
+            handler.wfile.flush()
+            handler.close_connection = True
+            handler.connection.shutdown(socket.SHUT_RDWR)
+
+    @staticmethod
+    def _status(served: Optional[_ServedFile], headers: Dict[str, str]) -> Tuple[int, int]:
+        """(status, primer byte del cuerpo) segun los headers condicionales y de rango."""
+
+        if served is None:
+            return 404, 0
+        if "if-none-match" in headers:
+            if served.etag in (tag.strip() for tag in headers["if-none-match"].split(",")):
+                return 304, 0
+        elif "if-modified-since" in headers:
+            try:
+                if parsedate_to_datetime(served.last_modified) <= parsedate_to_datetime(headers["if-modified-since"]):
+                    return 304, 0
+            except (TypeError, ValueError):
+                pass
+        match = _BYTE_RANGE.match(headers.get("range", ""))
+        if match is None or headers.get("if-range", served.etag) not in (served.etag, served.last_modified):
+            return 200, 0
+        start = int(match.group(1))
+        if start >= len(served.content):
+            return 416, 0
+        return 206, start
+
+
+def _make_handler(standin: _StandInServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Encabezados y cuerpo salen en dos writes; con Nagle + ACK retardado cada respuesta
+        # en una conexion keep-alive esperaria ~40 ms extra.
+        disable_nagle_algorithm = True
+
+        def do_POST(self) -> None:  # noqa: N802 (nombre impuesto por http.server)
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as exc:
+                self._reply(422, {"detail": f"payload invalido: {exc}"})
+                return
+            self._reply(*standin.serve(self.path.rstrip("/"), payload))
+
+        def do_GET(self) -> None:  # noqa: N802
+            standin.handle_get(self)
+
+        def _reply(self, status: int, body: dict) -> None:
+            blob = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(blob)))
+            self.end_headers()
+            self.wfile.write(blob)
+
+        def log_message(self, format: str, *args) -> None:  # noqa: A002
+            pass
+
+    return Handler
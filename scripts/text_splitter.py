@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import inspect
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+from utils import extract_terms, fingerprint
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", ". ", " "]
+# Segmentacion en oraciones: corte despues de . ! ? o … seguidos de espacio, y entre parrafos.
+# Las oraciones mas largas que MAX_SENTENCE_CHARS (tablas, listas sin puntuacion) se parten
+# en el ultimo espacio antes del limite.
+MAX_SENTENCE_CHARS = 400
+SENTENCE_ABBREVIATIONS = frozenset("p pag pags ej aprox max min num sr sra dr vs".split())
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?\u2026])[\s]+|\n{2,}")
+_WORD_BEFORE_DOT = re.compile(r"(\w+)\.$")
+_ALNUM = re.compile(r"\w")
+_PLAIN_VOWELS = str.maketrans("áéíóú", "aeiou")
+
+
+@dataclass
+class Document:
+    """Reemplazo liviano de ``langchain_core.documents.Document``."""
+
+    page_content: str
+    metadata: dict = field(default_factory=dict)
+
+
+class RecursiveTextSplitter:
+    """Splitter recursivo sin dependencias externas.
+
+    Reproduce los cortes de ``RecursiveCharacterTextSplitter`` de langchain con
+    ``keep_separator=True`` (el separador queda al inicio del fragmento siguiente)
+    y ``strip_whitespace=True``: se prueba cada separador en orden, los fragmentos
+    cortos se fusionan hasta ``chunk_size`` y los largos se vuelven a dividir con
+    el siguiente separador.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        separators: Optional[Sequence[str]] = None,
+        length_function: Callable[[str], int] = len,
+    ):
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"El solapamiento ({chunk_overlap}) no puede ser mayor que el tamanio del chunk ({chunk_size})."
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators or DEFAULT_SEPARATORS)
+        self.length_function = length_function
+        self._patterns = {sep: re.compile(f"({re.escape(sep)})") for sep in self.separators}
+
+    def split_documents(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Divide documentos de forma perezosa; cada chunk copia la metadata de su documento."""
+
+        for doc in documents:
+            for chunk in self.split_text(doc.page_content):
+                yield Document(page_content=chunk, metadata=dict(doc.metadata))
+
+    def split_text(self, text: str) -> List[str]:
+        return self._split_text(text, self.separators)
+
+    def _split_text(self, text: str, separators: List[str]) -> List[str]:
+        separator = separators[-1]
+        remaining: List[str] = []
+        for index, candidate in enumerate(separators):
+            if candidate in text:
+                separator = candidate
+                remaining = separators[index + 1 :]
+                break
+
+        final_chunks: List[str] = []
+        good_splits: List[str] = []
+        for piece in self._split_keeping_separator(text, separator):
+            if self.length_function(piece) < self.chunk_size:
+                good_splits.append(piece)
+                continue
+            if good_splits:
+                final_chunks.extend(self._merge_splits(good_splits))
+                good_splits = []
+            if remaining:
+                final_chunks.extend(self._split_text(piece, remaining))
+            else:
+                final_chunks.append(piece)
+
+        if good_splits:
+            final_chunks.extend(self._merge_splits(good_splits))
+        return final_chunks
+
+    def _split_keeping_separator(self, text: str, separator: str) -> List[str]:
+        pattern = self._patterns.get(separator) or re.compile(f"({re.escape(separator)})")
+        parts = pattern.split(text)
+        # parts = [antes, sep, trozo, sep, trozo, ...]: el separador se antepone al trozo siguiente.
+        splits = [parts[0]] + [parts[i] + parts[i + 1] for i in range(1, len(parts) - 1, 2)]
+        return [piece for piece in splits if piece]
+
+    def _merge_splits(self, splits: List[str]) -> List[str]:
+        # Los separadores ya viajan dentro de cada trozo, por lo que se unen sin separador extra.
+        docs: List[str] = []
+        current: List[str] = []
+        lengths: List[int] = []
+        start = 0
+        total = 0
+        for piece in splits:
+            length = self.length_function(piece)
+            if total + length > self.chunk_size and len(current) > start:
+                doc = "".join(current[start:]).strip()
+                if doc:
+                    docs.append(doc)
+                # Descartar trozos del inicio hasta dejar solo el solapamiento.
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    total -= lengths[start]
+                    start += 1
+            current.append(piece)
+            lengths.append(length)
+            total += length
+
+        doc = "".join(current[start:]).strip()
+        if doc:
+            docs.append(doc)
+        return docs
+
+
+def sentence_bounds(text: str, max_chars: int = MAX_SENTENCE_CHARS) -> List[int]:
+    """Limites de las oraciones de ``text`` como offsets de caracteres: ``[0, ..., len(text)]``.
+
+    La oracion ``i`` es ``text[bounds[i]:bounds[i + 1]]`` (incluye el espacio que la sigue),
+    asi que concatenarlas devuelve el texto original. Un corte despues de una abreviatura
+    (``p. ej.``, ``pag.``) o que dejaria un trozo sin letras ni numeros (el ``. `` con el que
+    empiezan algunos chunks) se omite.
+    """
+
+    bounds = [0]
+    for match in _SENTENCE_BREAK.finditer(text):
+        cut = match.end()
+        if cut >= len(text):
+            break
+        abbreviation = _WORD_BEFORE_DOT.search(text, max(0, match.start() - 8), match.start())
+        if abbreviation and abbreviation.group(1).lower().translate(_PLAIN_VOWELS) in SENTENCE_ABBREVIATIONS:
+            continue
+        if _ALNUM.search(text, bounds[-1], cut):
+            _append_bound(bounds, text, cut, max_chars)
+    if len(text) > bounds[-1] or len(bounds) == 1:
+        _append_bound(bounds, text, len(text), max_chars)
+    return bounds
+
+
+def sentence_terms(text: str, bounds: Sequence[int]) -> List[str]:
+    """Terminos normalizados de cada oracion (``extract_terms``), separados por espacios."""
+
+    return [" ".join(extract_terms(text[start:end])) for start, end in zip(bounds, bounds[1:])]
+
+
+def sentence_fingerprint() -> str:
+    """Hash de las reglas de segmentacion; cambia si se edita el corte o la extraccion de terminos."""
+
+    rules = [sentence_bounds, _append_bound, sentence_terms, extract_terms]
+    return fingerprint(
+        [inspect.getsource(rule) for rule in rules],
+        [pattern.pattern for pattern in (_SENTENCE_BREAK, _WORD_BEFORE_DOT, _ALNUM)],
+        MAX_SENTENCE_CHARS,
+        sorted(SENTENCE_ABBREVIATIONS),
+    )
+
+
+def _append_bound(bounds: List[int], text: str, cut: int, max_chars: int) -> None:
+    start = bounds[-1]
+    while cut - start > max_chars:
+        space = text.rfind(" ", start + max_chars // 2, start + max_chars)
+        start = space + 1 if space > start else start + max_chars
+        bounds.append(start)
+    if cut > start:
+        bounds.append(cut)
@@ -0,0 +1,75 @@
+"""Contadores de tokens locales e intercambiables (chunking y empaquetado de contexto).
+
+``load_tokenizer`` recibe una especificacion de texto:
+
+- ``approx``: sin dependencias. Cuenta palabras y signos de puntuacion; las palabras
+  largas suman un token cada ``chars_per_token`` caracteres, parecido a un BPE en espanol.
+- ``tiktoken:<encoding>``: p. ej. ``tiktoken:cl100k_base`` (requiere ``pip install tiktoken``).
+- ``hf:<tokenizer.json o repo>``: tokenizer de Hugging Face (requiere ``pip install tokenizers``).
+
+Todos exponen ``name`` (se guarda en la metadata y en el manifest de build) y ``count(text)``.
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Protocol
+
+DEFAULT_TOKENIZER = "approx"
+
+
+class Tokenizer(Protocol):
+    name: str
+
+    def count(self, text: str) -> int: ...
+
+
+class ApproxTokenizer:
+    _PIECES = re.compile(r"\w+|[^\w\s]")
+
+    def __init__(self, chars_per_token: int = 4):
+        self.chars_per_token = chars_per_token
+        self.name = DEFAULT_TOKENIZER if chars_per_token == 4 else f"{DEFAULT_TOKENIZER}:{chars_per_token}"
+
+    def count(self, text: str) -> int:
+        size = self.chars_per_token
+        return sum((len(piece) + size - 1) // size for piece in self._PIECES.findall(text))
+
+
+class TiktokenTokenizer:
+    def __init__(self, encoding: str = "cl100k_base"):
+        try:
+            import tiktoken
+        except ImportError as exc:
+            raise RuntimeError("Instala tiktoken para usar --tokenizer tiktoken:<encoding>.") from exc
+        self._encoding = tiktoken.get_encoding(encoding)
+        self.name = f"tiktoken:{encoding}"
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode_ordinary(text))
+
+
+class HFTokenizer:
+    def __init__(self, source: str):
+        try:
+            from tokenizers import Tokenizer as _Tokenizer
+        except ImportError as exc:
+            raise RuntimeError("Instala tokenizers para usar --tokenizer hf:<tokenizer.json o repo>.") from exc
+        path = Path(source)
+        self._tokenizer = _Tokenizer.from_file(str(path)) if path.is_file() else _Tokenizer.from_pretrained(source)
+        self.name = f"hf:{path.name if path.is_file() else source}"
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def load_tokenizer(spec: str = DEFAULT_TOKENIZER) -> Tokenizer:
+    kind, _, option = spec.partition(":")
+    if kind == "approx":
+        return ApproxTokenizer(int(option)) if option else ApproxTokenizer()
+    if kind == "tiktoken":
+        return TiktokenTokenizer(option or "cl100k_base")
+    if kind == "hf" and option:
+        return HFTokenizer(option)
+    raise ValueError(f"Tokenizer desconocido '{spec}'. Usa approx, tiktoken:<encoding> o hf:<tokenizer.json>.")
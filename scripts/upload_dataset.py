@@ -0,0 +1,428 @@
+"""Subida incremental del dataset compilado a Atlas (Nomic).
+
+Compara los chunks compilados con la ultima foto subida (``data/upload/{proyecto}.snapshot.json``,
+un hash de contenido por ``chunk_id``) y envia solo la diferencia: borra los chunks que ya no
+existen o cambiaron y agrega los nuevos o cambiados, en lotes grandes y con pocos requests
+en paralelo. Cada lote terminado queda en ``{proyecto}.checkpoint.json``; si la subida se
+corta, volver a ejecutar el mismo comando retoma desde el primer lote pendiente.
+
+Los requests usan la API JSON de datos de Atlas (``ADD_DATA_PATH``/``DELETE_DATA_PATH`` bajo
+``--endpoint``) con ``chunk_id`` como id unico del proyecto. Con ``--standin`` todo corre
+contra ``AtlasUploadStandIn`` (``standins.py``), sin red ni API key.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import requests
+
+from compact_dataset import CompactDataset, compact_path_for
+from compile_dataset import COMPILED_PATH
+from download_manuals import ThreadLocalSessions
+from standins import ADD_DATA_PATH, DELETE_DATA_PATH, AtlasUploadStandIn
+from token_counter import load_tokenizer
+from utils import (
+    DATA_DIR,
+    ChunkIdAssigner,
+    StageMetrics,
+    add_metrics_arguments,
+    count_items,
+    ensure_directory,
+    fingerprint,
+    iter_jsonl,
+    now_iso,
+)
+
+STAGE = "upload"
+UPLOAD_DIR = DATA_DIR / "upload"
+DEFAULT_ENDPOINT = "https://api-atlas.nomic.ai/v1"
+ID_FIELD = "chunk_id"
+# Campos que cambian en cada build sin que cambie el chunk: no cuentan para el hash.
+VOLATILE_FIELDS = ("generated_at",)
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class DeltaPlan:
+    hashes: Dict[str, str]
+    added: Set[str]
+    changed: Set[str]
+    removed: Set[str]
+
+    @property
+    def to_delete(self) -> Set[str]:
+        return self.removed | self.changed
+
+    @property
+    def to_add(self) -> Set[str]:
+        return self.added | self.changed
+
+
+def content_hash(record: dict) -> str:
+    """Hash del texto y la metadata, sin ``chunk_id`` (es la clave) ni campos volatiles."""
+
+    ignored = (ID_FIELD, *VOLATILE_FIELDS)
+    metadata = {key: value for key, value in record.get("metadata", {}).items() if key not in ignored}
+    payload = json.dumps({"text": record.get("text", ""), "metadata": metadata}, ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def iter_dataset(path: Path) -> Iterator[Tuple[str, dict]]:
+    """``(chunk_id, registro)`` del JSONL compilado o de un directorio ``.compact``, en orden."""
+
+    records = iter(CompactDataset(path)) if path.is_dir() else iter_jsonl(path)
+    fallback_ids = ChunkIdAssigner()
+    for record in records:
+        metadata = record.get("metadata", {})
+        chunk_id = metadata.get(ID_FIELD) or fallback_ids.assign(metadata.get("model_slug", ""), record.get("text", ""))
+        yield chunk_id, record
+
+
+def scan_dataset(path: Path) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """Hash de contenido y tokens de cada chunk (primera pasada; no guarda los textos)."""
+
+    tokenizer = load_tokenizer()
+    hashes: Dict[str, str] = {}
+    tokens: Dict[str, int] = {}
+    for chunk_id, record in iter_dataset(path):
+        if chunk_id in hashes:
+            raise ValueError(f"chunk_id duplicado en {path.name}: {chunk_id}")
+        hashes[chunk_id] = content_hash(record)
+        token_count = record.get("metadata", {}).get("token_count")
+        tokens[chunk_id] = token_count if isinstance(token_count, int) else tokenizer.count(record.get("text", ""))
+    return hashes, tokens
+
+
+def plan_delta(hashes: Dict[str, str], snapshot: Dict[str, str]) -> DeltaPlan:
+    return DeltaPlan(
+        hashes=hashes,
+        added={chunk_id for chunk_id in hashes if chunk_id not in snapshot},
+        changed={chunk_id for chunk_id, digest in hashes.items() if snapshot.get(chunk_id, digest) != digest},
+        removed={chunk_id for chunk_id in snapshot if chunk_id not in hashes},
+    )
+
+
+def read_json(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path: Path, data: dict) -> None:
+    ensure_directory(path)
+    temp_path = path.with_suffix(path.suffix + ".tmp")
+    with temp_path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, sort_keys=True)
+    temp_path.replace(path)
+
+
+class Checkpoint:
+    """Lotes ya enviados de un plan; se reescribe (atomico) despues de cada lote."""
+
+    def __init__(self, path: Path, plan_id: str):
+        self.path = path
+        self.plan_id = plan_id
+        self._lock = threading.Lock()
+        data = read_json(path)
+        self.resumed = data.get("plan") == plan_id
+        self.done: Dict[str, Set[int]] = {"delete": set(), "add": set()}
+        if self.resumed:
+            self.done = {phase: set(data.get(phase, [])) for phase in self.done}
+
+    def mark(self, phase: str, batch: int) -> None:
+        with self._lock:
+            self.done[phase].add(batch)
+            write_json(self.path, {"plan": self.plan_id, **{key: sorted(value) for key, value in self.done.items()}})
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def iter_batches(items: Iterable, batch_size: int, max_bytes: int) -> Iterator[List]:
+    """Lotes de hasta ``batch_size`` elementos y ~``max_bytes`` de JSON cada uno."""
+
+    batch: List = []
+    size = 0
+    for item in items:
+        item_size = len(json.dumps(item, ensure_ascii=False).encode("utf-8")) + 1
+        if batch and (len(batch) >= batch_size or size + item_size > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(item)
+        size += item_size
+    if batch:
+        yield batch
+
+
+def post_with_retries(
+    session: requests.Session,
+    url: str,
+    payload: dict,
+    timeout: float,
+    retries: int,
+    backoff: float,
+) -> requests.Response:
+    """POST con backoff exponencial (con jitter) ante errores de red, 429 y 5xx."""
+
+    attempt = 0
+    while True:
+        try:
+            response = session.post(url, json=payload, timeout=timeout)
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response
+            error: Exception = requests.HTTPError(f"HTTP {response.status_code}", response=response)
+            retry_after = response.headers.get("Retry-After", "")
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            error, retry_after = exc, ""
+        attempt += 1
+        if attempt > retries:
+            raise error
+        delay = float(retry_after) if retry_after.isdigit() else backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.0)
+        time.sleep(delay)
+
+
+def run_batches(
+    phase: str,
+    batches: Iterable[dict],
+    send,
+    checkpoint: Checkpoint,
+    concurrency: int,
+) -> int:
+    """Envia los payloads con a lo sumo ``concurrency`` en vuelo, saltando los del checkpoint."""
+
+    sent = 0
+    pending: Dict[Future, int] = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for number, payload in enumerate(batches):
+                if number in checkpoint.done[phase]:
+                    continue
+                if len(pending) >= concurrency:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    sent += _collect(phase, done, pending, checkpoint)
+                pending[executor.submit(send, payload)] = number
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                sent += _collect(phase, done, pending, checkpoint)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return sent
+
+
+def _collect(phase: str, done, pending: Dict[Future, int], checkpoint: Checkpoint) -> int:
+    count = 0
+    for future in done:
+        number = pending.pop(future)
+        count += future.result()
+        checkpoint.mark(phase, number)
+    return count
+
+
+def upload_delta(
+    dataset_path: Path,
+    plan: DeltaPlan,
+    project_id: str,
+    endpoint: str,
+    sessions: ThreadLocalSessions,
+    checkpoint: Checkpoint,
+    batch_size: int = 1000,
+    max_batch_bytes: int = 8 * 1024 * 1024,
+    concurrency: int = 4,
+    timeout: float = 60,
+    retries: int = 5,
+    backoff: float = 1.0,
+) -> Tuple[int, int]:
+    """Borra ``plan.to_delete`` y luego agrega ``plan.to_add``. Retorna (borrados, agregados).
+
+    Los chunks cambiados se borran y se vuelven a agregar: no depende de que la API
+    reemplace un dato existente con el mismo id. Reenviar un lote es inofensivo.
+    """
+
+    base = endpoint.rstrip("/")
+
+    def send(path: str, payload: dict) -> int:
+        post_with_retries(sessions.get(), base + path, payload, timeout, retries, backoff)
+        return len(payload.get("data") or payload.get("datum_ids"))
+
+    delete_batches = (
+        {"project_id": project_id, "datum_ids": ids}
+        for ids in iter_batches(sorted(plan.to_delete), batch_size, max_batch_bytes)
+    )
+    deleted = run_batches("delete", delete_batches, lambda payload: send(DELETE_DATA_PATH, payload), checkpoint, concurrency)
+
+    to_add = plan.to_add
+    data = (
+        {ID_FIELD: chunk_id, "text": record.get("text", ""), "metadata": record.get("metadata", {})}
+        for chunk_id, record in iter_dataset(dataset_path)
+        if chunk_id in to_add
+    )
+    add_batches = (
+        {"project_id": project_id, "id_field": ID_FIELD, "data": batch}
+        for batch in iter_batches(data, batch_size, max_batch_bytes)
+    )
+    added = run_batches("add", add_batches, lambda payload: send(ADD_DATA_PATH, payload), checkpoint, concurrency)
+    return deleted, added
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Sube a Atlas solo los chunks agregados, cambiados o borrados desde la ultima subida.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--input",
+        type=Path,
+        default=COMPILED_PATH,
+        help="JSONL compilado o directorio .compact (si el JSONL no existe se usa su .compact).",
+    )
+    parser.add_argument("--endpoint", default=DEFAULT_ENDPOINT, help="URL base de la API de Atlas.")
+    parser.add_argument(
+        "--project-id",
+        default=os.getenv("NOMIC_PROJECT_ID"),
+        help="Proyecto (dataset) de Atlas donde subir los chunks; por defecto NOMIC_PROJECT_ID.",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000, help="Chunks por request al agregar.")
+    parser.add_argument("--max-batch-mb", type=float, default=8.0, help="Tamanio maximo de cada request en MB.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests simultaneos.")
+    parser.add_argument("--retries", type=int, default=5, help="Reintentos por request (errores de red, 429 y 5xx).")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Espera base en segundos; se duplica en cada reintento.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Timeout por request en segundos.")
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=None,
+        help="Aborta si los chunks a agregar suman mas tokens que esto (presupuesto de Atlas).",
+    )
+    parser.add_argument("--full", action="store_true", help="Ignora la foto anterior y sube todos los chunks.")
+    parser.add_argument("--dry-run", action="store_true", help="Solo muestra el plan, sin enviar nada.")
+    parser.add_argument(
+        "--standin",
+        action="store_true",
+        help="Sube a un stand-in local (estado en data/upload/standin) en vez de Atlas.",
+    )
+    parser.add_argument(
+        "--standin-failure-rate",
+        type=float,
+        default=0.0,
+        help="Fraccion de requests que el stand-in responde con 503, para probar los reintentos.",
+    )
+    add_metrics_arguments(parser)
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    dataset_path = args.input
+    if not dataset_path.exists() and compact_path_for(dataset_path).exists():
+        dataset_path = compact_path_for(dataset_path)
+    if not dataset_path.exists():
+        print(f"[ERROR] No existe {args.input}; ejecuta compile_dataset.py primero.", file=sys.stderr)
+        return 1
+
+    state_dir = UPLOAD_DIR / "standin" if args.standin else UPLOAD_DIR
+    project_id = args.project_id or ("standin" if args.standin else None)
+    api_key = os.getenv("NOMIC_API_KEY")
+    if not project_id:
+        print("[ERROR] Falta --project-id (o NOMIC_PROJECT_ID).", file=sys.stderr)
+        return 1
+    if not args.standin and not args.dry_run and not api_key:
+        print("[ERROR] Define NOMIC_API_KEY para subir a Atlas (o usa --standin).", file=sys.stderr)
+        return 1
+
+    snapshot_path = state_dir / f"{project_id}.snapshot.json"
+    checkpoint_path = state_dir / f"{project_id}.checkpoint.json"
+    hashes, tokens = scan_dataset(dataset_path)
+    snapshot = {} if args.full else read_json(snapshot_path).get("chunks", {})
+    plan = plan_delta(hashes, snapshot)
+    delta_tokens = sum(tokens[chunk_id] for chunk_id in plan.to_add)
+
+    print(
+        f"[INFO] {len(hashes)} chunks: {len(plan.added)} nuevos, {len(plan.changed)} cambiados, "
+        f"{len(plan.removed)} borrados, {len(hashes) - len(plan.added) - len(plan.changed)} sin cambios"
+    )
+    print(f"[INFO] Tokens a subir: {delta_tokens} (dataset completo: {sum(tokens.values())})")
+    if args.max_tokens is not None and delta_tokens > args.max_tokens:
+        print(f"[ERROR] La subida supera --max-tokens ({delta_tokens} > {args.max_tokens}).", file=sys.stderr)
+        return 1
+    if args.dry_run:
+        return 0
+    if not plan.to_add and not plan.to_delete:
+        print(f"[SKIP] {project_id} ya esta al dia con {dataset_path.name}")
+        return 0
+
+    max_batch_bytes = int(args.max_batch_mb * 1024 * 1024)
+    plan_id = fingerprint(
+        project_id,
+        sorted(plan.to_delete),
+        sorted((chunk_id, hashes[chunk_id]) for chunk_id in plan.to_add),
+        args.batch_size,
+        max_batch_bytes,
+    )
+    checkpoint = Checkpoint(checkpoint_path, plan_id)
+    if checkpoint.resumed:
+        done = sum(len(batches) for batches in checkpoint.done.values())
+        print(f"[INFO] Reanudando subida interrumpida ({done} lotes ya enviados)")
+
+    standin = None
+    endpoint = args.endpoint
+    if args.standin:
+        standin = AtlasUploadStandIn(failure_rate=args.standin_failure_rate, state_path=state_dir / "state.json").start()
+        endpoint = standin.base_url
+    sessions = ThreadLocalSessions({"Authorization": f"Bearer {api_key}"} if api_key and not args.standin else {})
+
+    metrics = StageMetrics.from_args(STAGE, args)
+    started = time.perf_counter()
+    try:
+        with metrics, metrics.manual(project_id):
+            deleted, added = upload_delta(
+                dataset_path,
+                plan,
+                project_id,
+                endpoint,
+                sessions,
+                checkpoint,
+                batch_size=args.batch_size,
+                max_batch_bytes=max_batch_bytes,
+                concurrency=max(1, args.concurrency),
+                timeout=args.timeout,
+                retries=args.retries,
+                backoff=args.backoff,
+            )
+            count_items("deleted", deleted)
+            count_items("added", added)
+            count_items("tokens", delta_tokens)
+    except (requests.RequestException, KeyboardInterrupt) as exc:
+        print(f"[ERROR] Subida interrumpida: {exc or 'Ctrl+C'}", file=sys.stderr)
+        print("[INFO] Ejecuta el mismo comando para retomar desde el ultimo lote confirmado.", file=sys.stderr)
+        return 1
+    finally:
+        if standin is not None:
+            standin.close()
+
+    write_json(snapshot_path, {"project_id": project_id, "uploaded_at": now_iso(), "source": dataset_path.name, "chunks": hashes})
+    checkpoint.clear()
+    print(f"[OK] {project_id}: {added} chunks agregados, {deleted} borrados en {time.perf_counter() - started:.1f}s")
+    if standin is not None:
+        remote = {chunk_id: content_hash(datum) for chunk_id, datum in standin.data(project_id).items()}
+        if remote != hashes:
+            print(f"[ERROR] El stand-in quedo con {len(remote)} chunks distintos del dataset ({len(hashes)}).", file=sys.stderr)
+            return 1
+        print(f"[OK] Stand-in verificado: {len(remote)} chunks, {standin.failures} fallas simuladas reintentadas")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
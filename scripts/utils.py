@@ -1,11 +1,22 @@
 from __future__ import annotations
 
+import argparse
+import cProfile
+import hashlib
 import json
 import os
-from dataclasses import dataclass
+import pstats
+import re
+import sys
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field, fields
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
 
 from slugify import slugify
 
@@ -13,6 +24,31 @@ from slugify import slugify
 REPO_ROOT = Path(__file__).resolve().parents[1]
 DEFAULT_CONFIG_PATH = REPO_ROOT / "config" / "manuals.json"
 EXAMPLE_CONFIG_PATH = REPO_ROOT / "config" / "manuals.example.json"
+DATA_DIR = REPO_ROOT / "data"
+BUILD_MANIFEST_PATH = DATA_DIR / "build_manifest.json"
+METRICS_PATH = DATA_DIR / "metrics" / "metrics.jsonl"
+
+# Mismas stopwords que server/src/routes/chat.ts (extractTerms/hasOverlap).
+STOPWORDS = frozenset(
+    """
+    el la los las un una unos unas de del y o u a en por para con se que cual cuales como cuando
+    donde porque sobre sin al su sus mi mis tu tus es son ser esta este estos estas lo ya si no
+    """.split()
+)
+# Campos de la cita de un chunk (CITATION_FIELDS de server/src/services/nomicClient.ts).
+# dedup_chunks.py los guarda por modelo en ``appears_in`` y chat_retrieval.py los restaura.
+CITATION_FIELDS = (
+    "model_key",
+    "model_slug",
+    "model_name",
+    "document_title",
+    "source_file",
+    "page_start",
+    "page_end",
+    "source_pages",
+)
+_COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
 
 
 @dataclass(frozen=True)
@@ -27,22 +63,62 @@ class ManualConfig:
     source_url: Optional[str]
     language: str
     region: Optional[str]
+    # Root of the data/ tree for this manual; benchmarks point it at a scratch directory.
+    data_dir: Path = field(default=DATA_DIR, compare=False, repr=False)
 
     @property
     def raw_pdf_path(self) -> Path:
-        return REPO_ROOT / "data" / "raw" / f"{self.slug}.pdf"
+        return self.data_dir / "raw" / f"{self.slug}.pdf"
+
+    @property
+    def raw_http_meta_path(self) -> Path:
+        return self.data_dir / "raw" / f"{self.slug}.pdf.http.json"
+
+    @property
+    def intermediate_pages_path(self) -> Path:
+        return self.data_dir / "intermediate" / f"{self.slug}.pages.jsonl"
+
+    @property
+    def intermediate_index_path(self) -> Path:
+        return self.data_dir / "intermediate" / f"{self.slug}.pages.idx"
 
     @property
     def intermediate_json_path(self) -> Path:
-        return REPO_ROOT / "data" / "intermediate" / f"{self.slug}.json"
+        # Legacy single-JSON format; only read as a fallback when no .pages.jsonl exists.
+        return self.data_dir / "intermediate" / f"{self.slug}.json"
 
     @property
     def intermediate_txt_path(self) -> Path:
-        return REPO_ROOT / "data" / "intermediate" / f"{self.slug}.txt"
+        return self.data_dir / "intermediate" / f"{self.slug}.txt"
+
+    @property
+    def raw_journal_path(self) -> Path:
+        # Raw page text written as each page finishes under the extraction watchdog (resume point).
+        return self.data_dir / "intermediate" / f"{self.slug}.raw.jsonl"
+
+    @property
+    def quarantine_path(self) -> Path:
+        return self.data_dir / "intermediate" / f"{self.slug}.quarantine.json"
 
     @property
     def processed_jsonl_path(self) -> Path:
-        return REPO_ROOT / "data" / "processed" / f"{self.slug}.jsonl"
+        return self.data_dir / "processed" / f"{self.slug}.jsonl"
+
+    @property
+    def chunk_graph_path(self) -> Path:
+        return self.data_dir / "processed" / f"{self.slug}.graph"
+
+    @property
+    def sentence_index_path(self) -> Path:
+        return self.data_dir / "processed" / f"{self.slug}.sentences"
+
+    @property
+    def deduped_jsonl_path(self) -> Path:
+        return self.data_dir / "deduped" / f"{self.slug}.jsonl"
+
+    @property
+    def bm25_index_path(self) -> Path:
+        return self.data_dir / "index" / "bm25" / f"{self.slug}.bm25"
 
 
 def load_manuals_config(path: Optional[Path] = None) -> List[ManualConfig]:
@@ -126,12 +202,42 @@ def normalize_identifier(value: str) -> str:
     return slugify(value, separator="_")
 
 
+def normalize_plain(value: str) -> str:
+    """NFD without combining marks, lowercased (``normalizePlain`` in chat.ts)."""
+
+    return _COMBINING_MARKS.sub("", unicodedata.normalize("NFD", value)).lower()
+
+
+def to_words(value: str) -> List[str]:
+    """Alphanumeric words of 3+ chars after :func:`normalize_plain` (``toWords`` in chat.ts)."""
+
+    return [word for word in _NON_ALNUM.split(normalize_plain(value)) if len(word) >= 3]
+
+
+def extract_terms(question: str) -> List[str]:
+    """Unique non-stopword query terms, in order of appearance (``extractTerms`` in chat.ts)."""
+
+    return list(dict.fromkeys(word for word in to_words(question) if word not in STOPWORDS))
+
+
 def now_iso() -> str:
     """Return current timestamp in ISO format (UTC)."""
 
     return datetime.now(timezone.utc).isoformat()
 
 
+def build_timestamp() -> str:
+    """Timestamp stamped on generated datasets.
+
+    Honours ``SOURCE_DATE_EPOCH`` (reproducible-builds convention) so that rebuilding the
+    same inputs yields byte-identical files; falls back to :func:`now_iso`.
+    """
+
+    if epoch := os.getenv("SOURCE_DATE_EPOCH"):
+        return datetime.fromtimestamp(int(epoch), timezone.utc).isoformat()
+    return now_iso()
+
+
 def ensure_directory(path: Path) -> None:
     """Ensure directory exists."""
 
@@ -164,3 +270,412 @@ def read_headers_from_env_or_file(headers_file: Optional[str] = None) -> Dict[st
     header_dict.setdefault("Referer", "https://www.tesla.com/ownersmanual")
 
     return header_dict
+
+
+def iter_intermediate_pages(path: Path, read_size: int = 64 * 1024) -> Iterator[dict]:
+    """Yield the ``pages`` of an intermediate JSON one at a time without loading the file.
+
+    The document is decoded incrementally with ``json.JSONDecoder.raw_decode``: top-level
+    keys other than ``pages`` (e.g. ``metadata``) are parsed and discarded, and each page
+    object is yielded as soon as it is complete.
+    """
+
+    with path.open(encoding="utf-8") as f:
+        stream = _JsonStream(f, read_size)
+        stream.expect("{")
+        while not stream.consume("}"):
+            stream.consume(",")
+            key = stream.decode_value()
+            stream.expect(":")
+            if key != "pages":
+                stream.decode_value()
+                continue
+            stream.expect("[")
+            while not stream.consume("]"):
+                stream.consume(",")
+                yield stream.decode_value()
+
+
+class _JsonStream:
+    """Minimal buffered tokenizer used by :func:`iter_intermediate_pages`."""
+
+    def __init__(self, handle: TextIO, read_size: int):
+        self.handle = handle
+        self.read_size = read_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        chunk = self.handle.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def _skip_whitespace(self) -> None:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return
+
+    def consume(self, token: str) -> bool:
+        self._skip_whitespace()
+        if self.buffer.startswith(token, self.pos):
+            self.pos += len(token)
+            return True
+        if self.pos >= len(self.buffer) and self.eof:
+            raise ValueError("JSON intermedio truncado.")
+        return False
+
+    def expect(self, token: str) -> None:
+        if not self.consume(token):
+            raise ValueError(f"JSON intermedio invalido: se esperaba '{token}' en la posicion {self.pos}.")
+
+    def decode_value(self) -> Any:
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Un numero o literal al final del buffer podria estar cortado: exigir un delimitador.
+            if end >= len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def compute_chunk_id(model_slug: str, text: str, occurrence: int = 0) -> str:
+    """Stable 64-bit chunk id (16 hex chars) derived from the manual slug and the chunk text.
+
+    ``occurrence`` disambiguates identical texts repeated inside the same manual.
+    """
+
+    payload = f"{model_slug}\x00{text}" if occurrence == 0 else f"{model_slug}\x00{text}\x00{occurrence}"
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class ChunkIdAssigner:
+    """Hands out :func:`compute_chunk_id` ids, bumping ``occurrence`` on collisions."""
+
+    def __init__(self) -> None:
+        self._seen: set = set()
+
+    def assign(self, model_slug: str, text: str) -> str:
+        occurrence = 0
+        while True:
+            chunk_id = compute_chunk_id(model_slug, text, occurrence)
+            if chunk_id not in self._seen:
+                self._seen.add(chunk_id)
+                return chunk_id
+            occurrence += 1
+
+
+def iter_jsonl(path: Path) -> Iterator[dict]:
+    """Yield the records of a JSONL file one line at a time, skipping blank lines."""
+
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def sha256_file(path: Path, block_size: int = 1024 * 1024) -> str:
+    """Return the sha256 hex digest of a file, read in blocks."""
+
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable sha256 over JSON-serializable parts (dict keys are sorted)."""
+
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def manual_fingerprint(manual: ManualConfig) -> str:
+    """Fingerprint of every ManualConfig field that ends up in the outputs (not ``data_dir``)."""
+
+    return fingerprint({item.name: getattr(manual, item.name) for item in fields(manual) if item.compare})
+
+
+class BuildManifest:
+    """Content-addressed record of what each stage built for each manual.
+
+    Layout: ``{stage: {slug: {"inputs": <fingerprint>, "outputs": {path: sha256}}}}``.
+    A stage can skip a manual when its input fingerprint matches the recorded one
+    and every recorded output still exists with the same content.
+    """
+
+    def __init__(self, path: Path = BUILD_MANIFEST_PATH, entries: Optional[Dict[str, Dict[str, dict]]] = None):
+        self.path = path
+        self.entries: Dict[str, Dict[str, dict]] = entries or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path = BUILD_MANIFEST_PATH) -> "BuildManifest":
+        if not path.exists():
+            return cls(path)
+        with path.open(encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    def is_fresh(self, stage: str, slug: str, inputs: str) -> bool:
+        entry = self.entries.get(stage, {}).get(slug)
+        if not entry or entry.get("inputs") != inputs:
+            return False
+        for output, digest in entry.get("outputs", {}).items():
+            output_path = REPO_ROOT / output
+            if not output_path.exists() or sha256_file(output_path) != digest:
+                return False
+        return True
+
+    def output_digest(self, stage: str, slug: str, output: Path) -> Optional[str]:
+        """Digest recorded for an output, used as input fingerprint by the next stage."""
+
+        entry = self.entries.get(stage, {}).get(slug) or {}
+        return entry.get("outputs", {}).get(_manifest_key(output))
+
+    def record(self, stage: str, slug: str, inputs: str, outputs: Iterable[Path]) -> None:
+        digests = {_manifest_key(path): sha256_file(path) for path in outputs if path.exists()}
+        with self._lock:
+            self.entries.setdefault(stage, {})[slug] = {"inputs": inputs, "outputs": digests}
+            self.save()
+
+    def save(self) -> None:
+        ensure_directory(self.path)
+        temp_path = self.path.with_suffix(".tmp")
+        with temp_path.open("w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2, sort_keys=True)
+        temp_path.replace(self.path)
+
+
+def _manifest_key(path: Path) -> str:
+    try:
+        return path.resolve().relative_to(REPO_ROOT).as_posix()
+    except ValueError:
+        return path.resolve().as_posix()
+
+
+# Functions whose profile stats are always copied into the metrics record when --profile is on.
+PROFILE_HOT_FUNCTIONS = frozenset({"extract_text", "clean_text", "split_documents", "write_jsonl"})
+PROFILE_TOP_FUNCTIONS = 10
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where ``resource`` is unavailable)."""
+
+    try:
+        # VmHWM honours reset_peak_rss(); ru_maxrss is a lifetime maximum.
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark (Linux only) so the next peak covers one block."""
+
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+@dataclass
+class ManualMetrics:
+    """Measurements of one stage for one manual (or output file)."""
+
+    slug: str
+    status: str = "ok"
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    peak_rss_mb: Optional[float] = None
+    items: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+    profile_path: Optional[str] = None
+    hot_functions: List[dict] = field(default_factory=list)
+
+    def count(self, name: str, value: int) -> None:
+        self.items[name] = self.items.get(name, 0) + value
+
+
+_ACTIVE_METRICS: ContextVar[Optional[ManualMetrics]] = ContextVar("active_metrics", default=None)
+
+
+def count_items(name: str, value: int) -> None:
+    """Add ``value`` to the item counter ``name`` of the manual being measured in this thread, if any."""
+
+    record = _ACTIVE_METRICS.get()
+    if record is not None:
+        record.count(name, value)
+
+
+def add_metrics_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--metrics-file",
+        type=Path,
+        default=METRICS_PATH,
+        help="JSONL donde se agrega una linea con las metricas de esta ejecucion.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Perfila cada manual con cProfile (.prof junto al archivo de metricas).",
+    )
+
+
+class StageMetrics:
+    """Wall time, CPU time, peak RSS and item counts of a stage run, per manual.
+
+    Wrap the work for each manual in ``with metrics.manual(slug) as record:``; code
+    deeper in the call stack reports counts through ``count_items``. CPU time is the
+    measuring thread's (process pool workers are not included). Peak RSS is reset per
+    manual on Linux; elsewhere it is the process high-water mark so far. ``save`` (also
+    called when leaving a ``with`` block) appends one JSON line for the run to ``path``.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        path: Optional[Path] = None,
+        profile: bool = False,
+        run_id: Optional[str] = None,
+    ):
+        self.stage = stage
+        self.path = path
+        self.profile = profile
+        self.run_id = run_id or time.strftime("%Y%m%dT%H%M%S")
+        self.manuals: List[ManualMetrics] = []
+        self._lock = threading.Lock()
+        self._started_at = now_iso()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._peak: Optional[float] = None
+
+    @classmethod
+    def from_args(cls, stage: str, args: argparse.Namespace, run_id: Optional[str] = None) -> "StageMetrics":
+        return cls(stage, path=args.metrics_file, profile=args.profile, run_id=run_id)
+
+    def __enter__(self) -> "StageMetrics":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.save()
+
+    @contextmanager
+    def manual(self, slug: str) -> Iterator[ManualMetrics]:
+        record = ManualMetrics(slug)
+        token = _ACTIVE_METRICS.set(record)
+        profiler = self._start_profiler(slug)
+        reset_peak_rss()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        except BaseException as exc:
+            record.status = "error"
+            record.error = str(exc) or type(exc).__name__
+            raise
+        finally:
+            record.wall_s = round(time.perf_counter() - wall, 4)
+            record.cpu_s = round(time.thread_time() - cpu, 4)
+            record.peak_rss_mb = _round_mb(peak_rss_mb())
+            if profiler is not None:
+                profiler.disable()
+                self._save_profile(profiler, record)
+            _ACTIVE_METRICS.reset(token)
+            with self._lock:
+                self.manuals.append(record)
+                if record.peak_rss_mb is not None:
+                    self._peak = max(self._peak or 0.0, record.peak_rss_mb)
+
+    def skip(self, slug: str) -> None:
+        with self._lock:
+            self.manuals.append(ManualMetrics(slug, status="skip"))
+
+    def to_dict(self) -> dict:
+        peaks = [value for value in (self._peak, _round_mb(peak_rss_mb())) if value is not None]
+        return {
+            "run_id": self.run_id,
+            "stage": self.stage,
+            "started_at": self._started_at,
+            "argv": sys.argv[1:],
+            "wall_s": round(time.perf_counter() - self._wall, 4),
+            "cpu_s": round(time.process_time() - self._cpu, 4),
+            "peak_rss_mb": max(peaks) if peaks else None,
+            "manuals": [asdict(record) for record in self.manuals],
+        }
+
+    def save(self) -> Optional[Path]:
+        if self.path is None:
+            return None
+        ensure_directory(self.path)
+        line = json.dumps(self.to_dict(), ensure_ascii=False)
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        return self.path
+
+    def _start_profiler(self, slug: str) -> Optional[cProfile.Profile]:
+        if not self.profile:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows a single active profiler; another thread is already profiling.
+            print(f"[WARN] {self.stage}/{slug}: no se pudo perfilar (otro perfilador activo)", file=sys.stderr)
+            return None
+        return profiler
+
+    def _save_profile(self, profiler: cProfile.Profile, record: ManualMetrics) -> None:
+        directory = (self.path or METRICS_PATH).parent / "profiles"
+        directory.mkdir(parents=True, exist_ok=True)
+        profile_path = directory / f"{self.run_id}-{self.stage}-{record.slug}.prof"
+        profiler.dump_stats(str(profile_path))
+        record.profile_path = _manifest_key(profile_path)
+        record.hot_functions = profile_hot_functions(pstats.Stats(profiler))
+
+
+def profile_hot_functions(stats: pstats.Stats, limit: int = PROFILE_TOP_FUNCTIONS) -> List[dict]:
+    """The known hot functions plus the top ``limit`` functions by own time, as plain dicts."""
+
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():  # type: ignore[attr-defined]
+        rows.append(
+            {
+                "function": f"{Path(filename).name}:{line}({name})",
+                "name": name,
+                "calls": calls,
+                "tottime_s": round(own, 4),
+                "cumtime_s": round(cumulative, 4),
+            }
+        )
+    rows.sort(key=lambda row: row["tottime_s"], reverse=True)
+    selected = rows[:limit]
+    selected += [row for row in rows[limit:] if row["name"] in PROFILE_HOT_FUNCTIONS]
+    return selected
+
+
+def _round_mb(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
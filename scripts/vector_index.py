@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from bm25_index import SearchHit
+from utils import ensure_directory, iter_jsonl, to_words
+
+# Layout del indice denso (un directorio):
+#   index.json        dim, dtype, particiones {model_slug: [inicio, fin]}, chunk_ids y chunk_index por fila,
+#                     secciones {model_slug: [{"path": [...], "rows": [[inicio, fin], ...]}]} (marcadores del PDF)
+#   vectors.f16.npy   matriz N x dim en float16, filas normalizadas (L2) y agrupadas por model_slug
+#   vectors.i8.npy    (opcional) la misma matriz cuantizada a int8 por fila ...
+#   scales.f32.npy    ... con su escala por fila: vector ~= int8 * escala
+# Todas las matrices se abren con np.load(mmap_mode="r"): solo se leen las filas de la particion consultada.
+INDEX_FILENAME = "index.json"
+F16_FILENAME = "vectors.f16.npy"
+I8_FILENAME = "vectors.i8.npy"
+SCALES_FILENAME = "scales.f32.npy"
+BLOCK_ROWS = 16384
+
+
+class HashingEmbedder:
+    """Embedder local y determinista (hashing trick) para pruebas sin servicio remoto.
+
+    Cada palabra normalizada (y cada bigrama) suma +-1 en una dimension elegida por hash;
+    el vector final se normaliza en L2, asi que el producto punto es similitud coseno.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = to_words(text)
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                matrix[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+        return normalize_rows(matrix)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def load_embeddings(path: Path) -> Dict[str, np.ndarray]:
+    """Lee embeddings por chunk_id desde ``.npz`` (arreglos ``ids`` y ``embeddings``) o JSONL."""
+
+    if path.suffix == ".npz":
+        with np.load(path, allow_pickle=False) as data:
+            ids = [str(chunk_id) for chunk_id in data["ids"]]
+            matrix = np.asarray(data["embeddings"], dtype=np.float32)
+        if len(ids) != len(matrix):
+            raise ValueError(f"{path.name}: {len(ids)} ids para {len(matrix)} embeddings.")
+        return dict(zip(ids, matrix))
+
+    return {
+        record["chunk_id"]: np.asarray(record["embedding"], dtype=np.float32)
+        for record in iter_jsonl(path)
+    }
+
+
+def write_dense_index(
+    directory: Path,
+    partitions: Mapping[str, Tuple[Sequence[str], Sequence[int], np.ndarray]],
+    quantize_int8: bool = False,
+    sections: Optional[Mapping[str, Sequence[Sequence[str]]]] = None,
+) -> int:
+    """Escribe el indice denso. ``partitions``: model_slug -> (chunk_ids, chunk_indexes, matriz).
+
+    ``sections`` (opcional): model_slug -> ``section_path`` de cada fila de la particion.
+    """
+
+    ensure_directory(directory / INDEX_FILENAME)
+    dims = {matrix.shape[1] for _, _, matrix in partitions.values() if len(matrix)}
+    if len(dims) > 1:
+        raise ValueError(f"Dimensiones de embedding inconsistentes: {sorted(dims)}")
+    dim = dims.pop() if dims else 0
+
+    layout: Dict[str, List[int]] = {}
+    section_layout: Dict[str, List[dict]] = {}
+    chunk_ids: List[str] = []
+    chunk_indexes: List[int] = []
+    blocks: List[np.ndarray] = []
+    for slug, (ids, indexes, matrix) in partitions.items():
+        layout[slug] = [len(chunk_ids), len(chunk_ids) + len(ids)]
+        if sections and slug in sections:
+            section_layout[slug] = section_ranges(sections[slug], len(chunk_ids))
+        chunk_ids.extend(ids)
+        chunk_indexes.extend(int(index) for index in indexes)
+        blocks.append(normalize_rows(matrix.reshape(len(ids), dim)))
+
+    vectors = np.concatenate(blocks) if blocks else np.zeros((0, dim), dtype=np.float32)
+    np.save(directory / F16_FILENAME, vectors.astype(np.float16))
+
+    if quantize_int8:
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        np.save(directory / I8_FILENAME, quantized)
+        np.save(directory / SCALES_FILENAME, scales.astype(np.float32))
+    else:
+        for name in (I8_FILENAME, SCALES_FILENAME):
+            (directory / name).unlink(missing_ok=True)
+
+    meta = {
+        "dim": dim,
+        "dtype": "int8" if quantize_int8 else "float16",
+        "partitions": layout,
+        "chunk_ids": chunk_ids,
+        "chunk_indexes": chunk_indexes,
+        "sections": section_layout,
+    }
+    with (directory / INDEX_FILENAME).open("w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return len(chunk_ids)
+
+
+def section_ranges(paths: Sequence[Sequence[str]], offset: int = 0) -> List[dict]:
+    """Agrupa filas consecutivas con la misma seccion en rangos ``[inicio, fin)`` (desde ``offset``)."""
+
+    entries: Dict[Tuple[str, ...], List[List[int]]] = {}
+    for row, path in enumerate(paths, start=offset):
+        ranges = entries.setdefault(tuple(path), [])
+        if ranges and ranges[-1][1] == row:
+            ranges[-1][1] = row + 1
+        else:
+            ranges.append([row, row + 1])
+    return [{"path": list(path), "rows": ranges} for path, ranges in entries.items() if path]
+
+
+def section_matches(path: Sequence[str], section: Union[str, Sequence[str]]) -> bool:
+    """Un titulo suelto coincide en cualquier nivel; una ruta, como prefijo (incluye subsecciones)."""
+
+    if isinstance(section, str):
+        return any(part.casefold() == section.casefold() for part in path)
+    return len(path) >= len(section) and all(a.casefold() == b.casefold() for a, b in zip(path, section))
+
+
+class DenseIndex:
+    """Top-k por producto punto sobre matrices mapeadas en memoria, filtrado por particion.
+
+    Las consultas se procesan en lote (``Q @ M.T``) por bloques de filas. Con la matriz
+    int8 se puntua de forma aproximada y, si ``rescore``, los ``k * oversample`` mejores
+    candidatos se vuelven a puntuar con los vectores float16.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        with (directory / INDEX_FILENAME).open(encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim: int = meta["dim"]
+        self.dtype: str = meta["dtype"]
+        self.partitions: Dict[str, Tuple[int, int]] = {slug: tuple(bounds) for slug, bounds in meta["partitions"].items()}
+        self.chunk_ids: List[str] = meta["chunk_ids"]
+        self.chunk_indexes: List[int] = meta["chunk_indexes"]
+        self.sections: Dict[str, List[Tuple[Tuple[str, ...], List[Tuple[int, int]]]]] = {
+            slug: [(tuple(entry["path"]), [tuple(bounds) for bounds in entry["rows"]]) for entry in entries]
+            for slug, entries in meta.get("sections", {}).items()
+        }
+        self._f16 = np.load(directory / F16_FILENAME, mmap_mode="r")
+        self._i8: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        if self.dtype == "int8":
+            self._i8 = np.load(directory / I8_FILENAME, mmap_mode="r")
+            self._scales = np.load(directory / SCALES_FILENAME, mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def section_paths(self, model_slug: str) -> List[Tuple[str, ...]]:
+        return [path for path, _ in self.sections.get(model_slug, [])]
+
+    def candidate_rows(
+        self,
+        model_slug: Optional[str] = None,
+        section: Optional[Union[str, Sequence[str]]] = None,
+    ) -> np.ndarray:
+        """Filas de un manual y/o seccion, ordenadas, para ``search(candidate_rows=...)``.
+
+        ``section`` es un titulo (coincide en cualquier nivel) o una ruta de titulos, que
+        tambien incluye sus subsecciones. Sin secciones en el indice no hay coincidencias.
+        """
+
+        if section is None:
+            start, stop = self.partitions[model_slug] if model_slug is not None else (0, len(self.chunk_ids))
+            return np.arange(start, stop, dtype=np.int64)
+        slugs = [model_slug] if model_slug is not None else list(self.sections)
+        ranges = [
+            bounds
+            for slug in slugs
+            for path, rows in self.sections.get(slug, [])
+            if section_matches(path, section)
+            for bounds in rows
+        ]
+        if not ranges:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate([np.arange(start, stop, dtype=np.int64) for start, stop in ranges]))
+
+    def search(
+        self,
+        queries: Union[np.ndarray, Sequence[float]],
+        model_slug: Optional[str] = None,
+        k: int = 6,
+        rescore: bool = True,
+        oversample: int = 4,
+        candidate_rows: Optional[Iterable[int]] = None,
+        section: Optional[Union[str, Sequence[str]]] = None,
+    ) -> List[List[SearchHit]]:
+        """Top-k para un lote de consultas (una fila por consulta, ya embebidas).
+
+        ``model_slug`` restringe la busqueda a la particion del manual; ``candidate_rows``
+        restringe aun mas a filas concretas y ``section`` a las de una seccion del PDF
+        (ver ``candidate_rows()``).
+        """
+
+        if section is not None:
+            section_rows = self.candidate_rows(model_slug, section)
+            if candidate_rows is not None:
+                section_rows = np.intersect1d(section_rows, np.fromiter(candidate_rows, dtype=np.int64))
+            candidate_rows = section_rows
+
+        matrix_queries = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if matrix_queries.shape[1] != self.dim:
+            raise ValueError(f"Dimension de consulta {matrix_queries.shape[1]} != {self.dim} del indice.")
+
+        start, stop = self.partitions[model_slug] if model_slug is not None else (0, len(self.chunk_ids))
+        rows = None
+        if candidate_rows is not None:
+            rows = np.fromiter(candidate_rows, dtype=np.int64)
+            rows = rows[(rows >= start) & (rows < stop)]
+            if rows.size == 0:
+                return [[] for _ in range(len(matrix_queries))]
+
+        quantized = self._i8 is not None
+        depth = k * max(1, oversample) if quantized and rescore else k
+        scores, candidates = self._top_candidates(matrix_queries, start, stop, rows, depth, quantized)
+
+        if quantized and rescore:
+            exact = np.einsum(
+                "qd,qcd->qc",
+                matrix_queries,
+                np.asarray(self._f16[candidates.ravel()], dtype=np.float32).reshape(*candidates.shape, self.dim),
+            )
+            scores = np.where(candidates >= 0, exact, -np.inf)
+
+        results: List[List[SearchHit]] = []
+        for query_scores, query_rows in zip(scores, candidates):
+            order = np.argsort(-query_scores, kind="stable")[:k]
+            results.append(
+                [
+                    SearchHit(self.chunk_ids[row], self.chunk_indexes[row], float(query_scores[position]))
+                    for position in order
+                    if (row := int(query_rows[position])) >= 0
+                ]
+            )
+        return results
+
+    def _top_candidates(
+        self,
+        queries: np.ndarray,
+        start: int,
+        stop: int,
+        rows: Optional[np.ndarray],
+        depth: int,
+        quantized: bool,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        positions = rows if rows is not None else np.arange(start, stop)
+
+        for offset in range(0, len(positions), BLOCK_ROWS):
+            block_rows = positions[offset : offset + BLOCK_ROWS]
+            if rows is None:
+                block_slice = slice(int(block_rows[0]), int(block_rows[-1]) + 1)
+                block = self._i8[block_slice] if quantized else self._f16[block_slice]
+                scales = self._scales[block_slice] if quantized else None
+            else:
+                block = self._i8[block_rows] if quantized else self._f16[block_rows]
+                scales = self._scales[block_rows] if quantized else None
+
+            block_scores = queries @ np.asarray(block, dtype=np.float32).T
+            if scales is not None:
+                block_scores *= np.asarray(scales, dtype=np.float32)[None, :]
+
+            merged_scores = np.concatenate([best_scores, block_scores], axis=1)
+            merged_rows = np.concatenate([best_rows, np.broadcast_to(block_rows, block_scores.shape)], axis=1)
+            if merged_scores.shape[1] > depth:
+                keep = np.argpartition(-merged_scores, depth - 1, axis=1)[:, :depth]
+                merged_scores = np.take_along_axis(merged_scores, keep, axis=1)
+                merged_rows = np.take_along_axis(merged_rows, keep, axis=1)
+            best_scores, best_rows = merged_scores, merged_rows
+
+        if best_rows.shape[1] == 0:
+            best_rows = np.full((len(queries), 1), -1, dtype=np.int64)
+            best_scores = np.full((len(queries), 1), -np.inf, dtype=np.float32)
+        return best_scores, best_rows
@@ -4,6 +4,7 @@ loadEnv();
 const envSchema = z.object({
     PORT: z.string().optional(),
     NOMIC_API_KEY: z.string().min(1, "NOMIC_API_KEY es obligatorio"),
+    NOMIC_BASE_URL: z.string().url().default("https://api-atlas.nomic.ai/v1"),
     NOMIC_PROJECTION_ID: z.string().uuid("NOMIC_PROJECTION_ID debe ser un UUID válido"),
     NOMIC_K: z
         .string()
@@ -25,6 +26,7 @@ const env = parsed.data;
 export const appConfig = {
     port: env.PORT ? Number(env.PORT) : 3000,
     nomic: {
+        baseUrl: env.NOMIC_BASE_URL.replace(/\/$/, ""),
         apiKey: env.NOMIC_API_KEY,
         projectionId: env.NOMIC_PROJECTION_ID,
         k: env.NOMIC_K ?? 6,
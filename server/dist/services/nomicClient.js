@@ -5,7 +5,7 @@ const VECTOR_SEARCH_PATH = "/query/topk";
 export class NomicClient {
     constructor() {
         this.http = axios.create({
-            baseURL: "https://api-atlas.nomic.ai/v1",
+            baseURL: appConfig.nomic.baseUrl,
             headers: {
                 Authorization: `Bearer ${appConfig.nomic.apiKey}`,
                 "Content-Type": "application/json",
@@ -73,7 +73,9 @@ export class NomicClient {
         })
             .filter((item) => item !== null);
         const filtered = modelSlug
-            ? mapped.filter((item) => item.metadata.model_slug === modelSlug || item.metadata.model_key === modelSlug)
+            ? mapped
+                .map((item) => forModel(item, modelSlug))
+                .filter((item) => item !== null)
             : mapped;
         const selected = (filtered.length > 0 ? filtered : mapped).slice(0, desiredK);
         return selected;
@@ -124,4 +126,34 @@ export class NomicClient {
         return metadataSource;
     }
 }
+// Los chunks deduplicados (scripts/dedup_chunks.py) listan todos los modelos donde aparecen.
+// Si el chunk entra por otro modelo, la cita (manual y paginas) sale de su aparicion en ese modelo.
+const CITATION_FIELDS = [
+    "model_key",
+    "model_slug",
+    "model_name",
+    "document_title",
+    "source_file",
+    "page_start",
+    "page_end",
+    "source_pages",
+];
+function forModel(item, modelSlug) {
+    const { model_slug, model_key, model_slugs, appears_in } = item.metadata;
+    if (model_slug === modelSlug || model_key === modelSlug)
+        return item;
+    if (!Array.isArray(model_slugs) || !model_slugs.includes(modelSlug))
+        return null;
+    const occurrence = Array.isArray(appears_in)
+        ? appears_in.find((entry) => entry?.model_slug === modelSlug)
+        : undefined;
+    if (!occurrence)
+        return item;
+    const metadata = { ...item.metadata };
+    for (const field of CITATION_FIELDS) {
+        if (occurrence[field] != null)
+            metadata[field] = occurrence[field];
+    }
+    return { ...item, metadata };
+}
 export const nomicClient = new NomicClient();
@@ -42,7 +42,7 @@ export class NomicClient {
 
   constructor() {
     this.http = axios.create({
-      baseURL: "https://api-atlas.nomic.ai/v1",
+      baseURL: appConfig.nomic.baseUrl,
       headers: {
         Authorization: `Bearer ${appConfig.nomic.apiKey}`,
         "Content-Type": "application/json",
@@ -117,7 +117,9 @@ export class NomicClient {
       .filter((item): item is RetrievedChunk => item !== null);
 
     const filtered = modelSlug
-      ? mapped.filter((item) => item.metadata.model_slug === modelSlug || item.metadata.model_key === modelSlug)
+      ? mapped
+          .map((item) => forModel(item, modelSlug))
+          .filter((item): item is RetrievedChunk => item !== null)
       : mapped;
 
     const selected = (filtered.length > 0 ? filtered : mapped).slice(0, desiredK);
@@ -172,4 +174,34 @@ export class NomicClient {
   }
 }
 
+// Los chunks deduplicados (scripts/dedup_chunks.py) listan todos los modelos donde aparecen.
+// Si el chunk entra por otro modelo, la cita (manual y paginas) sale de su aparicion en ese modelo.
+const CITATION_FIELDS = [
+  "model_key",
+  "model_slug",
+  "model_name",
+  "document_title",
+  "source_file",
+  "page_start",
+  "page_end",
+  "source_pages",
+] as const;
+
+function forModel(item: RetrievedChunk, modelSlug: string): RetrievedChunk | null {
+  const { model_slug, model_key, model_slugs, appears_in } = item.metadata;
+  if (model_slug === modelSlug || model_key === modelSlug) return item;
+  if (!Array.isArray(model_slugs) || !model_slugs.includes(modelSlug)) return null;
+
+  const occurrence = Array.isArray(appears_in)
+    ? (appears_in as Array<Record<string, unknown>>).find((entry) => entry?.model_slug === modelSlug)
+    : undefined;
+  if (!occurrence) return item;
+
+  const metadata: Record<string, unknown> = { ...item.metadata };
+  for (const field of CITATION_FIELDS) {
+    if (occurrence[field] != null) metadata[field] = occurrence[field];
+  }
+  return { ...item, metadata: metadata as RetrievedChunk["metadata"] };
+}
+
 export const nomicClient = new NomicClient();